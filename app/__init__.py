@@ -1,7 +1,9 @@
 # app/__init__.py
+import os
+
 from flask import Flask
 from .config import get_config
-from .extensions import db
+from .extensions import db, migrate
 
 
 def create_app():
@@ -18,13 +20,68 @@ def create_app():
     # DB
     if not app.config.get("SQLALCHEMY_DATABASE_URI"):
         app.logger.error("Falta SQLALCHEMY_DATABASE_URI: define DATABASE_URL en Railway.")
+    from . import dbpool
+    dbpool.init_app(app)  # pool, timeouts y application_name desde DB_*
+    # Bajo gunicorn -k gevent: psycopg2 cede al hub (ver gunicorn.conf.py)
+    from . import cooperativo
+    cooperativo.init_app(app)
     db.init_app(app)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), "migrations"))
 
     # Importa modelos para que SQLAlchemy los registre (evita circulares)
     with app.app_context():
         from . import models  # noqa: F401
 
-    # Healthcheck MUY ligero (no toca DB ni Dropbox)
+    # Tiempos por request, consultas SQL, storage; /metrics y Server-Timing
+    from . import metricas
+    metricas.init_app(app)
+
+    # Cola de subidas en segundo plano (los hilos arrancan en post_worker_init
+    # de gunicorn.conf.py, o con el primer registro)
+    from .storage import spool
+    spool.init_app(app)
+
+    # Caché de links de comprobantes (LRU en memoria o backend compartido)
+    from .storage import linkcache
+    linkcache.init_app(app)
+
+    # CLI: flask storage gc (almacenamiento direccionado por contenido)
+    from .storage import cas
+    cas.init_app(app)
+
+    # CLI del buscador (flask search explain)
+    from . import search
+    search.init_app(app)
+
+    # CLI: flask export-depositos
+    from . import export
+    export.init_app(app)
+
+    # CLI: flask resumen rebuild|check
+    from . import resumen
+    resumen.init_app(app)
+
+    # CLI: flask particiones estado|crear|archivar|restaurar (Postgres)
+    from . import particiones
+    particiones.init_app(app)
+
+    # CLI: flask cambios prune (lápidas del feed de cambios)
+    from . import cambios
+    cambios.init_app(app)
+
+    # CLI: flask conciliar (estados de cuenta; también en /admin/conciliacion)
+    from . import conciliacion
+    conciliacion.init_app(app)
+
+    # Caché de opciones de factura por usuario
+    from . import facturas
+    facturas.init_app(app)
+
+    # CLI: flask miniaturas backfill
+    from . import miniaturas
+    miniaturas.init_app(app)
+
+    # Healthcheck MUY ligero (no toca DB ni Dropbox); readiness en /readyz
     @app.get("/healthz")
     def healthz():
         return "ok", 200
@@ -34,13 +91,26 @@ def create_app():
     app.register_blueprint(public.bp)
     app.register_blueprint(admin.bp)
 
-    # CLI: initdb (¡hace drop_all + create_all!)
+    # Warmup opcional (WARMUP=1), /readyz y CLI profile-imports; al final,
+    # con todo registrado
+    from . import warmup
+    warmup.init_app(app)
+
+    # CLI: initdb (¡borra todo!) y crea el esquema aplicando las migraciones
+    # desde cero; para una BD con datos se usa `flask db upgrade`
     @app.cli.command("initdb")
     def initdb():
         from click import echo
+        from flask_migrate import upgrade
+        from sqlalchemy import text
         with app.app_context():
+            if db.engine.dialect.name == "postgresql":
+                with db.engine.begin() as conn:  # meses archivados (fuera de db.metadata)
+                    conn.execute(text("DROP SCHEMA IF EXISTS archivo CASCADE"))
             db.drop_all()
-            db.create_all()
+            with db.engine.begin() as conn:
+                conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            upgrade()
             echo("OK: Base de datos inicializada.")
 
     return app
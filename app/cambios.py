@@ -0,0 +1,119 @@
+# app/cambios.py
+"""
+Feed de cambios de depósitos para el grid admin.
+
+En lugar de recargar la lista, el grid pide cada pocos segundos
+GET /admin/api/depositos/changes?since=<watermark>&<filtros> y parcha sus filas:
+  - rows:    depósitos con updated_at posterior (y que cumplen los filtros);
+  - removed: ids borrados (lápidas en depositos_borrados) o que ya no cumplen
+             los filtros.
+
+updated_at lo pone la app antes del commit, así que no sirve de orden: una
+transacción larga hace commit con un updated_at anterior al último poll. En
+Postgres cada fila (y lápida) guarda el xid de la transacción que la escribió
+(cambio_xid, migración 0012) y el watermark lleva el xmin del snapshot: toda
+transacción con xid menor ya terminó, y las que seguían abiertas o empiezan
+después tienen xid >= xmin, así que el siguiente poll (cambio_xid >= xmin) las
+ve sin importar cuánto tarden en hacer commit. Sin Postgres (o con un
+watermark viejo, sin xmin) se cae a updated_at retrocediendo CHANGES_OVERLAP
+segundos. Repetir filas es inofensivo (el parche es idempotente). Si el
+watermark es más viejo que CHANGES_RETENTION_HOURS, o hay demasiados cambios,
+se responde reset y el grid recarga completo.
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, text
+
+from . import particiones
+from .extensions import db
+from .models import Deposito, DepositoBorrado
+from .search import apply_filters
+
+CHANGES_MAX = 1000
+
+
+class Watermark(NamedTuple):
+    ts: datetime        # reloj de la app: sólo para la retención
+    xmin: int | None    # Postgres: xmin del snapshot al tomar el watermark
+
+    def __str__(self) -> str:
+        # opaco para el grid: "<iso>" o "<iso>/<xmin>"
+        return self.ts.isoformat() + (f"/{self.xmin}" if self.xmin is not None else "")
+
+
+def watermark() -> Watermark:
+    xmin = None
+    if particiones.es_postgres():
+        xmin = db.session.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+    return Watermark(datetime.utcnow(), xmin)
+
+
+def parse_since(raw: str | None) -> Watermark:
+    if not raw:
+        raise ValueError("since es obligatorio")
+    ts, _, xmin = raw.partition("/")
+    if xmin and not xmin.isdigit():
+        raise ValueError(f"watermark inválido: {raw!r}")
+    return Watermark(datetime.fromisoformat(ts.replace("Z", "")).replace(tzinfo=None),
+                     int(xmin) if xmin else None)
+
+
+def registrar_borrados(ids) -> None:
+    """Lápidas de los depósitos `ids` (misma transacción que el DELETE)."""
+    if ids:
+        db.session.execute(insert(DepositoBorrado), [{"deposito_id": i} for i in ids])
+
+
+def _cambiados_desde(since: Watermark):
+    """Predicados "cambió después de `since`" para (depósitos, lápidas)."""
+    if since.xmin is not None and particiones.es_postgres():
+        return Deposito.cambio_xid >= since.xmin, DepositoBorrado.cambio_xid >= since.xmin
+    desde = since.ts - timedelta(seconds=current_app.config["CHANGES_OVERLAP"])
+    return Deposito.updated_at > desde, DepositoBorrado.deleted_at > desde
+
+
+def delta(rows_query, since: Watermark, filtros: dict) -> dict | None:
+    """
+    Cambios desde `since`: {"rows": [...], "removed": [...]}; None si hay que
+    recargar completo. `rows_query` es la proyección del grid (sin filtros).
+    """
+    if since.ts < datetime.utcnow() - timedelta(hours=current_app.config["CHANGES_RETENTION_HOURS"]):
+        return None
+    dep_cambio, lapida_cambio = _cambiados_desde(since)
+
+    rows = (apply_filters(rows_query, filtros)
+            .filter(dep_cambio)
+            .order_by(Deposito.id.desc())
+            .limit(CHANGES_MAX + 1)
+            .all())
+    if len(rows) > CHANGES_MAX:
+        return None
+    cambiados = {cid for (cid,) in (db.session.query(Deposito.id)
+                                    .filter(dep_cambio)
+                                    .limit(CHANGES_MAX * 2))}
+    borrados = {did for (did,) in (db.session.query(DepositoBorrado.deposito_id)
+                                   .filter(lapida_cambio))}
+    # cambiaron pero ya no cumplen los filtros -> el grid los quita
+    fuera = cambiados - {r.id for r in rows}
+    return {"rows": rows, "removed": sorted(fuera | borrados)}
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("cambios", help="Feed de cambios del grid.")
+
+
+@cli.command("prune")
+def prune_cmd():
+    """Borra lápidas más viejas que CHANGES_RETENTION_HOURS."""
+    limite = datetime.utcnow() - timedelta(hours=current_app.config["CHANGES_RETENTION_HOURS"])
+    res = db.session.execute(delete(DepositoBorrado).where(DepositoBorrado.deleted_at < limite))
+    db.session.commit()
+    click.echo(f"OK: {res.rowcount} lápidas eliminadas.")
+
+
+def init_app(app):
+    app.cli.add_command(cli)
@@ -0,0 +1,481 @@
+# app/conciliacion.py
+"""
+Conciliación de estados de cuenta contra depósitos.
+
+Se sube el estado de cuenta de un banco (CSV, OFX o XLSX) y cada abono se
+empareja con un depósito "registrado" del mismo banco:
+  1. por referencia: un folio/autorización/referencia del depósito aparece
+     en el movimiento (columnas o concepto), con el mismo importe y fecha
+     dentro de la ventana (CONCILIACION_VENTANA_DIAS);
+  2. por importe: mismo importe con fecha dentro de la ventana, sólo si hay
+     un único depósito posible; si hay varios (p.ej. dos depósitos de $100
+     el mismo día) el abono queda como sugerencia y no se marca nada.
+Las dos pasadas buscan en dicts (token -> depósitos, (importe, fecha) ->
+depósitos), así que el costo es lineal en movimientos + depósitos, sin
+comparar todos contra todos. Los emparejados pasan a "conciliado" con
+UPDATEs por lotes (updated_at incluido, para el feed de cambios) y el
+resumen diario se ajusta en la misma transacción. El reporte lista las
+sugerencias y lo que quedó sin pareja de cada lado.
+
+Sólo se concilian meses calientes: archivo.depositos (particiones, Postgres)
+es de sólo lectura. Para conciliar un mes archivado primero se restaura con
+`flask particiones restaurar`.
+
+Encabezados de CSV/XLSX: ver ALIAS (un layout nuevo de banco se agrega ahí).
+"""
+import csv
+import io
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update
+
+from . import resumen
+from .extensions import db
+from .models import BANCOS, Deposito
+
+ESTATUS_ORIGEN = "registrado"
+ESTATUS_CONCILIADO = "conciliado"
+LOTE = 5000
+LIMITE_REPORTE = 1000   # filas por lado en el reporte (los conteos son completos)
+LIMITE_ERRORES = 50
+LIMITE_SUGERENCIA = 5   # depósitos posibles que se listan por abono ambiguo
+FILAS_ENCABEZADO = 30   # los bancos ponen datos de la cuenta antes de la tabla
+
+# Encabezados normalizados (minúsculas, sin acentos ni signos) -> campo
+ALIAS = {
+    "fecha": ("fecha", "fecha operacion", "fecha de operacion", "fecha movimiento",
+              "fecha valor", "fecha aplicacion", "dia", "date"),
+    "importe": ("importe", "monto", "abono", "abonos", "deposito", "depositos",
+                "deposito abono", "depositos abonos", "credito", "creditos", "amount"),
+    "cargo": ("cargo", "cargos", "retiro", "retiros", "debito", "debitos"),
+    "referencia": ("referencia", "ref", "referencia numerica", "referencia alfanumerica",
+                   "clave de rastreo", "rastreo", "numero de referencia"),
+    "folio": ("folio", "folio movimiento", "movimiento", "no movimiento", "numero de movimiento"),
+    "autorizacion": ("autorizacion", "no autorizacion", "numero de autorizacion"),
+    "concepto": ("concepto", "descripcion", "detalle", "leyenda", "memo", "concepto referencia"),
+}
+_CAMPO = {alias: campo for campo, aliases in ALIAS.items() for alias in aliases}
+
+MESES = {"ENE": 1, "FEB": 2, "MAR": 3, "ABR": 4, "MAY": 5, "JUN": 6,
+         "JUL": 7, "AGO": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DIC": 12}
+FORMATOS_FECHA = ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y", "%d.%m.%Y")
+
+_TOKEN_RE = re.compile(r"[A-Z0-9]+")
+
+
+class Movimiento:
+    __slots__ = ("linea", "fecha", "cents", "tokens", "referencia", "concepto")
+
+    def __init__(self, linea, fecha, cents, tokens, referencia, concepto):
+        self.linea = linea
+        self.fecha = fecha
+        self.cents = cents
+        self.tokens = tokens
+        self.referencia = referencia
+        self.concepto = concepto
+
+    def as_dict(self) -> dict:
+        return {"linea": self.linea, "fecha": self.fecha.isoformat(),
+                "importe": f"{Decimal(self.cents) / 100:.2f}",
+                "referencia": self.referencia, "concepto": self.concepto}
+
+
+# ---------------------------- Normalización ----------------------------
+def _norm_header(value) -> str:
+    s = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z0-9]+", s.lower()))
+
+
+def tokens(texto) -> set[str]:
+    """Referencias comparables: alfanuméricos con algún dígito, sin ceros a la izquierda."""
+    out = set()
+    for t in _TOKEN_RE.findall(str(texto or "").upper()):
+        t = t.lstrip("0")
+        if len(t) >= 3 and any(c.isdigit() for c in t):
+            out.add(t)
+    return out
+
+
+def _campo_tokens(valor) -> set[str]:
+    """Una columna de referencia completa (p.ej. 'REF-00123') más sus partes."""
+    todo = "".join(_TOKEN_RE.findall(str(valor or "").upper()))
+    return tokens(valor) | tokens(todo)
+
+
+def _cents(value) -> int | None:
+    """Importe -> centavos; None si vacío. '$1,234.50', '(12.00)' y '-12' aceptados."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        d = Decimal(str(value))
+    else:
+        s = str(value).strip().replace("$", "").replace(",", "").replace(" ", "")
+        if not s:
+            return None
+        negativo = s.startswith("(") and s.endswith(")")
+        try:
+            d = Decimal(s.strip("()"))
+        except InvalidOperation:
+            raise ValueError(f"importe inválido {value!r}")
+        if negativo:
+            d = -d
+    return int((d * 100).to_integral_value())
+
+
+def _parse_fecha(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    s = str(value or "").strip()
+    m = re.match(r"(\d{1,2})[-/ ]([A-Za-z]{3})[A-Za-z]*[-/ ](\d{4}|\d{2})\b", s)  # 05-ENE-2024
+    if m and m.group(2).upper() in MESES:
+        y = int(m.group(3))
+        return date(y + 2000 if y < 100 else y, MESES[m.group(2).upper()], int(m.group(1)))
+    s = s.split(" ")[0].split("T")[0]  # sin hora
+    for fmt in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    if re.fullmatch(r"\d{8}", s):  # OFX: YYYYMMDD
+        return date(int(s[:4]), int(s[4:6]), int(s[6:]))
+    raise ValueError(f"fecha inválida {value!r}")
+
+
+class _Lector:
+    """Acumula movimientos, ignorados y errores (con tope) de un archivo."""
+
+    def __init__(self):
+        self.movimientos: list[Movimiento] = []
+        self.ignorados = 0
+        self.n_errores = 0
+        self.errores: list[str] = []
+        self._fechas: dict = {}
+
+    def error(self, linea: int, msg: str) -> None:
+        self.n_errores += 1
+        if len(self.errores) < LIMITE_ERRORES:
+            self.errores.append(f"línea {linea}: {msg}")
+
+    def fecha(self, value) -> date:
+        key = value if isinstance(value, (str, date)) else str(value)
+        f = self._fechas.get(key)
+        if f is None:
+            f = self._fechas[key] = _parse_fecha(value)
+        return f
+
+    def agregar(self, linea, fecha, importe, cargo=None, referencia="", folio="",
+                autorizacion="", concepto="") -> None:
+        try:
+            cents = _cents(importe)
+            if not cents and _cents(cargo):
+                self.ignorados += 1  # cargo: no es un depósito
+                return
+            if cents is None or cents <= 0:
+                self.ignorados += 1
+                return
+            f = self.fecha(fecha)
+        except ValueError as e:
+            self.error(linea, str(e))
+            return
+        toks = _campo_tokens(referencia) | _campo_tokens(folio) | _campo_tokens(autorizacion) | tokens(concepto)
+        ref = " ".join(str(v).strip() for v in (referencia, folio, autorizacion) if v not in (None, ""))
+        self.movimientos.append(Movimiento(linea, f, cents, toks, ref, str(concepto or "").strip()[:200]))
+
+
+# ---------------------------- Lectura de archivos ----------------------------
+def _mapear(row) -> dict | None:
+    cols = {}
+    for i, value in enumerate(row):
+        campo = _CAMPO.get(_norm_header(value))
+        if campo and campo not in cols:
+            cols[campo] = i
+    return cols if "fecha" in cols and "importe" in cols else None
+
+
+def _leer_tabla(rows, lector: _Lector) -> None:
+    """Filas (CSV o XLSX): busca el encabezado y convierte cada fila."""
+    cols = None
+    for n, row in enumerate(rows, start=1):
+        if cols is None:
+            cols = _mapear(row)
+            if cols is None and n >= FILAS_ENCABEZADO:
+                raise ValueError("No se encontraron columnas de fecha e importe en el encabezado "
+                                 f"(ver ALIAS en app/conciliacion.py).")
+            continue
+        if not any(v not in (None, "") for v in row):
+            continue
+        get = lambda campo: row[cols[campo]] if campo in cols and cols[campo] < len(row) else None  # noqa: E731
+        if get("fecha") in (None, ""):
+            lector.ignorados += 1  # saldos, totales, pies de página
+            continue
+        lector.agregar(n, get("fecha"), get("importe"), get("cargo"), get("referencia"),
+                       get("folio"), get("autorizacion"), get("concepto"))
+    if cols is None:
+        raise ValueError("El archivo no tiene encabezado con columnas de fecha e importe.")
+
+
+def _leer_csv(data: bytes, lector: _Lector) -> None:
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    # El separador es el que deja ver el encabezado; Sniffer se confunde con
+    # las líneas de datos de la cuenta que van antes de la tabla.
+    inicio = text.splitlines()[:FILAS_ENCABEZADO]
+    delim = ","
+    for d in ",;\t|":
+        if any(_mapear(row) for row in csv.reader(inicio, delimiter=d)):
+            delim = d
+            break
+    _leer_tabla(csv.reader(io.StringIO(text), delimiter=delim), lector)
+
+
+def _leer_xlsx(data: bytes, lector: _Lector) -> None:
+    try:
+        from openpyxl import load_workbook  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("Leer XLSX requiere el paquete 'openpyxl'.") from e
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        _leer_tabla(wb.worksheets[0].iter_rows(values_only=True), lector)
+    finally:
+        wb.close()
+
+
+def _leer_ofx(data: bytes, lector: _Lector) -> None:
+    """OFX 1.x (SGML, sin cierres) o 2.x (XML): un movimiento por <STMTTRN>."""
+    text = data.decode("latin-1")
+    bloques = re.findall(r"<STMTTRN>(.*?)(?=</STMTTRN>|<STMTTRN>|</BANKTRANLIST>)", text, re.S | re.I)
+    if not bloques:
+        raise ValueError("El OFX no tiene movimientos (<STMTTRN>).")
+    for n, bloque in enumerate(bloques, start=1):
+        tags = {k.upper(): v.strip() for k, v in re.findall(r"<(\w+)>([^<\r\n]*)", bloque)}
+        lector.agregar(n, tags.get("DTPOSTED", "")[:8], tags.get("TRNAMT"),
+                       referencia=tags.get("REFNUM") or tags.get("CHECKNUM") or "",
+                       concepto=" ".join(filter(None, (tags.get("NAME"), tags.get("MEMO")))))
+
+
+def leer(nombre: str, data: bytes) -> _Lector:
+    """Movimientos de un estado de cuenta; el formato sale de la extensión o del contenido."""
+    ext = os.path.splitext(nombre or "")[1].lower()
+    lector = _Lector()
+    if ext == ".xlsx" or data[:2] == b"PK":
+        _leer_xlsx(data, lector)
+    elif ext in (".ofx", ".qfx") or b"<OFX" in data[:4096].upper():
+        _leer_ofx(data, lector)
+    else:
+        _leer_csv(data, lector)
+    return lector
+
+
+# ---------------------------- Emparejamiento ----------------------------
+def candidatos(banco: str, desde: date, hasta: date) -> list:
+    """Depósitos por conciliar del banco en el rango (sólo columnas necesarias; sin el archivo)."""
+    q = (select(Deposito.id, Deposito.fecha_operacion, Deposito.importe, Deposito.numero_usuario,
+                Deposito.referencia, Deposito.folio, Deposito.autorizacion)
+         .where(Deposito.banco == banco,
+                Deposito.estatus == ESTATUS_ORIGEN,
+                Deposito.fecha_operacion.between(desde, hasta))
+         .order_by(Deposito.id))
+    return db.session.execute(q).all()
+
+
+def emparejar(movs: list[Movimiento], deps: list, ventana: int):
+    """
+    -> (pares [(mov, índice en deps, método)],
+        sugerencias [(mov, [índices en deps])], movimientos sin depósito).
+    Un depósito se usa a lo más una vez. Por importe sólo se empareja si no
+    hay duda: el abono tiene un único depósito posible y ningún otro abono lo
+    reclama; si no, queda como sugerencia para revisarla a mano.
+    """
+    cents = [int(d.importe * 100) for d in deps]
+    por_token = defaultdict(list)
+    por_dia = defaultdict(list)
+    for i, d in enumerate(deps):
+        for tok in _campo_tokens(d.referencia) | _campo_tokens(d.folio) | _campo_tokens(d.autorizacion):
+            por_token[tok].append(i)
+        por_dia[(cents[i], d.fecha_operacion)].append(i)
+
+    usado = set()
+    pares, pendientes = [], []
+    # 1) referencia + importe, fecha más cercana
+    for m in movs:
+        mejor = None
+        for tok in m.tokens:
+            for i in por_token.get(tok, ()):
+                if i in usado or cents[i] != m.cents:
+                    continue
+                dias = abs((deps[i].fecha_operacion - m.fecha).days)
+                if dias <= ventana and (mejor is None or (dias, i) < mejor):
+                    mejor = (dias, i)
+        if mejor is None:
+            pendientes.append(m)
+        else:
+            usado.add(mejor[1])
+            pares.append((m, mejor[1], "referencia"))
+
+    # 2) importe + fecha dentro de la ventana: primero el mismo día, luego
+    #    depósitos anteriores al abono (el banco aplica después), luego posteriores
+    offsets = [0] + [o for d in range(1, ventana + 1) for o in (-d, d)]
+    posibles = []
+    reclamos = defaultdict(int)
+    for m in pendientes:
+        cand = []
+        for off in offsets:
+            for i in por_dia.get((m.cents, m.fecha + timedelta(days=off)), ()):
+                if i not in usado:
+                    cand.append(i)
+                    reclamos[i] += 1
+                    if len(cand) == LIMITE_SUGERENCIA:
+                        break
+            if len(cand) == LIMITE_SUGERENCIA:
+                break
+        posibles.append((m, cand))
+
+    sugerencias, sin_deposito = [], []
+    for m, cand in posibles:
+        if not cand:
+            sin_deposito.append(m)
+        elif len(cand) == 1 and reclamos[cand[0]] == 1:
+            usado.add(cand[0])
+            pares.append((m, cand[0], "importe"))
+        else:
+            sugerencias.append((m, cand))
+    return pares, sugerencias, sin_deposito
+
+
+def marcar_conciliados(ids: list[int]) -> int:
+    """UPDATE por lotes (sólo los que siguen 'registrado') + delta del resumen. Sin commit."""
+    cols = [getattr(Deposito, d) for d in resumen.DIMS]
+    now = datetime.utcnow()
+    antes, despues = [], []
+    for start in range(0, len(ids), LOTE):
+        res = db.session.execute(
+            update(Deposito)
+            .where(Deposito.id.in_(ids[start:start + LOTE]), Deposito.estatus == ESTATUS_ORIGEN)
+            .values(estatus=ESTATUS_CONCILIADO, updated_at=now)
+            .returning(*cols, Deposito.importe),
+            execution_options={"synchronize_session": False},
+        )
+        for r in res:
+            key = tuple(r[:-1])
+            despues.append((key, r[-1]))
+            antes.append((key[:-1] + (ESTATUS_ORIGEN,), r[-1]))
+    resumen.aplicar(resumen.diff(antes, despues))
+    return len(despues)
+
+
+def _dep_dict(d) -> dict:
+    return {"id": d.id, "fecha_operacion": d.fecha_operacion.isoformat(),
+            "importe": str(d.importe), "numero_usuario": f"{d.numero_usuario:05d}",
+            "referencia": " ".join(filter(None, (d.referencia, d.folio, d.autorizacion)))}
+
+
+def conciliar(banco: str, nombre: str, data: bytes, ventana: int | None = None,
+              aplicar: bool = True) -> dict:
+    """Lee, empareja y (si `aplicar`) marca conciliados. Regresa el reporte."""
+    if banco not in BANCOS:
+        raise ValueError(f"Banco inválido: {banco}")
+    if ventana is None:
+        ventana = current_app.config.get("CONCILIACION_VENTANA_DIAS", 3)
+    ms = {}
+    t0 = time.perf_counter()
+    lector = leer(nombre, data)
+    movs = lector.movimientos
+    ms["lectura"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    reporte = {"banco": banco, "archivo": nombre, "ventana_dias": ventana, "aplicado": False,
+               "movimientos": len(movs), "ignorados": lector.ignorados,
+               "n_errores": lector.n_errores, "errores": lector.errores,
+               "conciliados": 0, "por_referencia": 0, "por_importe": 0,
+               "n_sugerencias": 0, "sugerencias": [],
+               "n_sin_deposito": 0, "sin_deposito": [], "n_sin_movimiento": 0, "sin_movimiento": []}
+    if not movs:
+        reporte["ms"] = ms
+        return reporte
+
+    t0 = time.perf_counter()
+    desde = min(m.fecha for m in movs)
+    hasta = max(m.fecha for m in movs)
+    deps = candidatos(banco, desde - timedelta(days=ventana), hasta + timedelta(days=ventana))
+    ms["consulta"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    t0 = time.perf_counter()
+    pares, sugerencias, sin_deposito = emparejar(movs, deps, ventana)
+    usados = {i for _, i, _ in pares}
+    # sin movimiento: sólo los del periodo que cubre el estado de cuenta
+    sin_movimiento = [d for i, d in enumerate(deps)
+                      if i not in usados and desde <= d.fecha_operacion <= hasta]
+    ms["emparejar"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    reporte.update(
+        conciliados=len(pares),
+        por_referencia=sum(1 for p in pares if p[2] == "referencia"),
+        por_importe=sum(1 for p in pares if p[2] == "importe"),
+        n_sugerencias=len(sugerencias),
+        sugerencias=[dict(m.as_dict(), depositos=[_dep_dict(deps[i]) for i in cand])
+                     for m, cand in sugerencias[:LIMITE_REPORTE]],
+        n_sin_deposito=len(sin_deposito),
+        sin_deposito=[m.as_dict() for m in sin_deposito[:LIMITE_REPORTE]],
+        n_sin_movimiento=len(sin_movimiento),
+        sin_movimiento=[_dep_dict(d) for d in sin_movimiento[:LIMITE_REPORTE]],
+    )
+
+    if aplicar and pares:
+        t0 = time.perf_counter()
+        reporte["conciliados"] = marcar_conciliados(sorted(deps[i].id for i in usados))
+        db.session.commit()
+        reporte["aplicado"] = True
+        ms["actualizar"] = round((time.perf_counter() - t0) * 1000, 1)
+    reporte["ms"] = ms
+    return reporte
+
+
+# ---------------------------- CLI ----------------------------
+@click.command("conciliar")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--banco", required=True, type=click.Choice(BANCOS))
+@click.option("--ventana", type=int, default=None, help="Días de tolerancia (default: CONCILIACION_VENTANA_DIAS).")
+@click.option("--dry-run", is_flag=True, help="Sólo reporta; no marca conciliados.")
+@click.option("--json", "as_json", is_flag=True, help="Imprime el reporte completo en JSON.")
+@with_appcontext
+def conciliar_cmd(archivo, banco, ventana, dry_run, as_json):
+    """
+    Concilia un estado de cuenta (CSV/OFX/XLSX) contra los depósitos registrados.
+
+    No ve meses archivados (flask particiones archivar): sus abonos quedan sin
+    depósito. Restaura el mes antes (flask particiones restaurar).
+    """
+    import json
+
+    with open(archivo, "rb") as fh:
+        data = fh.read()
+    try:
+        rep = conciliar(banco, os.path.basename(archivo), data, ventana, aplicar=not dry_run)
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    if as_json:
+        click.echo(json.dumps(rep, ensure_ascii=False, indent=2))
+        return
+    click.echo(f"{rep['movimientos']} abonos leídos ({rep['ignorados']} ignorados, {rep['n_errores']} con error).")
+    click.echo(f"{'Conciliados' if rep['aplicado'] else 'Se conciliarían'}: {rep['conciliados']} "
+               f"({rep['por_referencia']} por referencia, {rep['por_importe']} por importe).")
+    click.echo(f"Ambiguos (sugerencias, no se marcan): {rep['n_sugerencias']}.")
+    click.echo(f"Sin depósito: {rep['n_sin_deposito']}; depósitos sin movimiento: {rep['n_sin_movimiento']}.")
+    for err in rep["errores"][:10]:
+        click.echo(f"  {err}", err=True)
+
+
+def init_app(app):
+    app.cli.add_command(conciliar_cmd)
@@ -1,6 +1,7 @@
 # app/config.py
 import os
 import re
+import tempfile
 from dotenv import load_dotenv
 
 # En local carga .env; en Railway las vars ya vienen del entorno
@@ -20,6 +21,8 @@ def _normalize_db_url(url: str | None) -> str | None:
     # Asegurar esquema correcto para SQLAlchemy/psycopg2
     url = re.sub(r'^postgres://', 'postgresql+psycopg2://', url)
     url = re.sub(r'^postgresql://', 'postgresql+psycopg2://', url)
+    if not url.startswith("postgresql"):
+        return url  # p.ej. SQLite local (benchmarks/pruebas)
 
     # ¿Es interno de Railway?
     is_internal = ".railway.internal" in url
@@ -44,10 +47,107 @@ class Config:
         os.getenv("DATABASE_URL") or os.getenv("RAILWAY_DATABASE_URL")
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool/conexión a Postgres (app/dbpool.py arma SQLALCHEMY_ENGINE_OPTIONS)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # espera por conexión libre
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 = sin límite
+    # Para `flask db upgrade`, `flask resumen rebuild`, etc. (con DB_PGBOUNCER=0)
+    DB_STATEMENT_TIMEOUT_MS_CLI = int(os.getenv("DB_STATEMENT_TIMEOUT_MS_CLI", "0"))
+    DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "multisaldo")
+    DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+    DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))  # SQL compilado
+
+    # Arranque pre-calentado (app/warmup.py); compatible con gunicorn --preload
+    WARMUP = os.getenv("WARMUP", "0") == "1"
+    WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "2"))
+    WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))  # /readyz tras un fallo
 
     # Almacenamiento de comprobantes
-    STORAGE_PROVIDER = os.getenv("STORAGE_PROVIDER", "dropbox")  # 'dropbox' (actual)
+    STORAGE_PROVIDER = os.getenv("STORAGE_PROVIDER", "dropbox")  # 'dropbox' | 'local' | 'memory'
+    LOCAL_STORAGE_DIR = os.getenv(
+        "LOCAL_STORAGE_DIR", os.path.join(os.getcwd(), "instance", "comprobantes")
+    )
+    # STORAGE_PROVIDER=memory (benchmarks): latencia simulada por operación
+    MEMORY_STORAGE_LATENCY_MS = float(os.getenv("MEMORY_STORAGE_LATENCY_MS", "0"))
+    MEMORY_STORAGE_JITTER_MS = float(os.getenv("MEMORY_STORAGE_JITTER_MS", "0"))
+    # Con un proxy (nginx) delante, send_file delega la lectura con X-Sendfile
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
     DROPBOX_TOKEN = os.getenv("DROPBOX_TOKEN")
+    # Claves por SHA-256 (sha256/ab/<hash>.ext): el mismo archivo se guarda una vez
+    STORAGE_CONTENT_ADDRESSED = os.getenv("STORAGE_CONTENT_ADDRESSED", "1") == "1"
+    # Cliente Dropbox compartido: conexiones HTTP en el pool y timeouts (segundos)
+    DROPBOX_POOL_SIZE = int(os.getenv("DROPBOX_POOL_SIZE", "8"))
+    DROPBOX_TIMEOUT = float(os.getenv("DROPBOX_TIMEOUT", "60"))
+    DROPBOX_CONNECT_TIMEOUT = float(os.getenv("DROPBOX_CONNECT_TIMEOUT", "10"))
+    # Archivos más grandes que esto se suben con upload sessions (trozos de este tamaño)
+    DROPBOX_CHUNK_SIZE = int(os.getenv("DROPBOX_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+    # Caché en disco de los bytes de comprobantes (app/storage/diskcache.py): LRU con
+    # write-through delante del proveedor; 0 = sin caché. Ignorada con STORAGE_PROVIDER=local
+    STORAGE_CACHE_DIR = os.getenv(
+        "STORAGE_CACHE_DIR", os.path.join(os.getcwd(), "instance", "cache-comprobantes")
+    )
+    STORAGE_CACHE_MAX_MB = int(os.getenv("STORAGE_CACHE_MAX_MB", "512"))
+
+    # Caché de links de comprobantes (temporales de Dropbox duran ~4h)
+    LINK_CACHE_URL = os.getenv("LINK_CACHE_URL")  # p.ej. redis://... (opcional)
+    LINK_CACHE_SIZE = int(os.getenv("LINK_CACHE_SIZE", "2048"))
+    LINK_CACHE_TEMP_TTL = int(os.getenv("LINK_CACHE_TEMP_TTL", str(3 * 3600 + 50 * 60)))
+    # Opciones de factura por usuario (mismo backend; los fiscales invalidan)
+    FACTURA_CACHE_SIZE = int(os.getenv("FACTURA_CACHE_SIZE", "4096"))
+    FACTURA_CACHE_TTL = int(os.getenv("FACTURA_CACHE_TTL", "300"))
+
+    # Cola de subidas: el registro escribe a un spool local y un pool de hilos
+    # sube al proveedor en segundo plano (UPLOAD_ASYNC=0 -> subida síncrona)
+    UPLOAD_ASYNC = os.getenv("UPLOAD_ASYNC", "1") == "1"
+    UPLOAD_SPOOL_DIR = os.getenv(
+        "UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "multisaldo-spool")
+    )
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+    UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+    UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "2"))  # segundos, se duplica
+    # Un "subiendo" más viejo que esto se da por abandonado (el proceso murió) y se reintenta
+    UPLOAD_CLAIM_TTL = int(os.getenv("UPLOAD_CLAIM_TTL", "900"))
+    # Tope por comprobante; MAX_CONTENT_LENGTH deja margen para los campos del form
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+    MAX_CONTENT_LENGTH = UPLOAD_MAX_BYTES + 1024 * 1024
+
+    # Normalización de fotos (app/imagenes.py; requiere Pillow)
+    IMAGE_NORMALIZE = os.getenv("IMAGE_NORMALIZE", "1") == "1"
+    IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2000"))
+    IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG")  # JPEG | WEBP
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+    # Miniaturas para el grid admin (app/miniaturas.py; PDFs requieren PyMuPDF)
+    THUMB_DIR = os.getenv("THUMB_DIR", os.path.join(os.getcwd(), "instance", "miniaturas"))
+    THUMB_SIZE = int(os.getenv("THUMB_SIZE", "320"))
+    # Descargas simultáneas para generar miniaturas faltantes (preview del grid)
+    THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+
+    # Feed de cambios del grid (app/cambios.py)
+    CHANGES_OVERLAP = int(os.getenv("CHANGES_OVERLAP", "5"))  # segundos; sólo sin Postgres
+    CHANGES_RETENTION_HOURS = int(os.getenv("CHANGES_RETENTION_HOURS", "24"))
+    CHANGES_POLL_SECONDS = int(os.getenv("CHANGES_POLL_SECONDS", "5"))
+
+    # Conciliación de estados de cuenta (app/conciliacion.py): tolerancia de fechas
+    CONCILIACION_VENTANA_DIAS = int(os.getenv("CONCILIACION_VENTANA_DIAS", "3"))
+
+    # Particiones mensuales de depositos (app/particiones.py; sólo Postgres):
+    # meses creados por adelantado y meses que `flask particiones archivar` deja calientes
+    PARTICIONES_MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+    PARTICIONES_MESES_CALIENTES = int(os.getenv("PARTICIONES_MESES_CALIENTES", "12"))
+
+    # Duplicados al registrar: mismo archivo (SHA-256) -> rechazar (1) o sólo marcar (0)
+    DUPLICADOS_RECHAZAR_EXACTOS = os.getenv("DUPLICADOS_RECHAZAR_EXACTOS", "1") == "1"
+
+    # Métricas (app/metricas.py): header Server-Timing y token de /metrics
+    # (sin METRICS_TOKEN, /metrics responde 404 fuera de debug/testing)
+    METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "1") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
     # Admin simple
     ADMIN_USER = os.getenv("ADMIN_USER", "admin")
@@ -0,0 +1,81 @@
+# app/cooperativo.py
+"""
+Workers cooperativos (GUNICORN_WORKER_CLASS=gevent, ver gunicorn.conf.py).
+
+El worker gevent de gunicorn parchea la stdlib (socket, ssl, threading, time,
+queue) antes de cargar la app. Con eso Dropbox (requests/urllib3), Redis, la
+cola de subidas, el pool de SQLAlchemy y los locks ceden el control mientras
+esperan, y un solo proceso atiende cientos de requests en vuelo. Faltan dos
+piezas, que cubre este módulo:
+  - psycopg2 habla con Postgres desde C (libpq) y no usa el socket parchado:
+    sin un wait callback cada consulta congela el worker completo. instalar()
+    registra uno que espera con gevent (lo mismo que hace psycogreen);
+  - el trabajo de CPU (normalizar fotos con Pillow, miniaturas con PyMuPDF)
+    nunca cede. en_hilo() lo corre en el threadpool de gevent (hilos reales)
+    para que el hub siga atendiendo, healthchecks incluidos.
+Sin gevent ambos son no-op y en_hilo() llama directo.
+"""
+import contextvars
+
+EXT_KEY = "cooperativo"
+
+
+def activo() -> bool:
+    """¿Corre bajo gevent con la stdlib parchada?"""
+    try:
+        from gevent import monkey  # type: ignore
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def _gevent_wait(conn, timeout=None):
+    """Wait callback de psycopg2: cede al hub mientras libpq espera el socket."""
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write  # type: ignore
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Estado inesperado de poll(): {state!r}")
+
+
+def instalar() -> bool:
+    """Registra el wait callback de psycopg2 si hay gevent (idempotente)."""
+    if not activo():
+        return False
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return True
+    if extensions.get_wait_callback() is not _gevent_wait:
+        extensions.set_wait_callback(_gevent_wait)
+    return True
+
+
+def en_hilo(fn, *args, **kw):
+    """
+    Corre `fn` fuera del hub de gevent (CPU pesado) y espera su resultado.
+    Conserva el contexto (current_app, logger). `fn` no debe usar la BD: las
+    conexiones de psycopg2 quedan ligadas al hub de su greenlet.
+    """
+    if not activo():
+        return fn(*args, **kw)
+    import gevent  # type: ignore
+
+    ctx = contextvars.copy_context()
+    return gevent.get_hub().threadpool.apply(ctx.run, (fn, *args), kw)
+
+
+def init_app(app):
+    modo = "gevent" if instalar() else "hilos"
+    app.extensions[EXT_KEY] = modo
+    if modo == "gevent":
+        app.logger.info("Workers cooperativos (gevent): psycopg2 con wait callback.")
@@ -0,0 +1,127 @@
+# app/dbpool.py
+"""
+Opciones del engine de SQLAlchemy para Postgres y métricas del pool.
+
+Todo sale de variables DB_* (ver Config):
+  - pool: tamaño, overflow, timeout de espera, recycle y pre_ping (evita los
+    500 por conexiones que Railway/TLS cerró mientras estaban ociosas);
+  - conexión: connect_timeout, application_name y statement_timeout. Los
+    comandos `flask ...` (migraciones, resumen rebuild, particiones, scan)
+    usan DB_STATEMENT_TIMEOUT_MS_CLI (0 = sin límite): recorren tablas
+    completas y el límite es para los requests;
+  - DB_PGBOUNCER=1: sin parámetros de arranque (`options`), que PgBouncer en
+    modo transaction rechaza. El statement_timeout se define entonces en el
+    rol (ALTER ROLE ... SET statement_timeout).
+El pool mide cuánto esperan los hilos por una conexión (ver pool_stats).
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class _WaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float, timeout: bool = False) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.timeouts += timeout
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que registra el tiempo de espera de cada checkout."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.wait_stats = _WaitStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats  # dispose() no reinicia las métricas
+        return pool
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.observe(time.perf_counter() - t0, timeout=True)
+            raise
+        self.wait_stats.observe(time.perf_counter() - t0)
+        return conn
+
+
+def en_cli() -> bool:
+    """¿Proceso del CLI de Flask? (lo marca FlaskGroup antes de cargar la app; gunicorn no)."""
+    return os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+
+
+def engine_options(config, cli: bool = False) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS según el dialecto de la URI (`cli`: timeout del CLI)."""
+    uri = config.get("SQLALCHEMY_DATABASE_URI") or ""
+    opts = {"query_cache_size": config["DB_QUERY_CACHE_SIZE"]}
+    if not uri.startswith("postgresql"):
+        return opts
+
+    connect_args = {
+        "connect_timeout": config["DB_CONNECT_TIMEOUT"],
+        "application_name": config["DB_APPLICATION_NAME"],
+    }
+    timeout = config["DB_STATEMENT_TIMEOUT_MS_CLI" if cli else "DB_STATEMENT_TIMEOUT_MS"]
+    if not config["DB_PGBOUNCER"] and timeout:
+        connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    opts.update(
+        poolclass=TimedQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+        pool_pre_ping=config["DB_POOL_PRE_PING"],
+        connect_args=connect_args,
+    )
+    return opts
+
+
+def pool_stats(engine) -> dict:
+    """Estado del pool: conexiones en uso/libres, overflow y espera acumulada."""
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(),
+                     checked_in=pool.checkedin(), overflow=max(0, pool.overflow()))
+    wait = getattr(pool, "wait_stats", None)
+    if wait is not None:
+        stats.update(checkouts=wait.count, wait_seconds_total=round(wait.total, 6),
+                     wait_seconds_max=round(wait.max, 6), timeouts=wait.timeouts)
+    return stats
+
+
+def soltar_conexion(*objs) -> None:
+    """
+    Antes de esperar al proveedor de storage: saca `objs` de la sesión (conservan
+    lo ya cargado) y cierra la transacción, para que la conexión regrese al pool
+    en vez de quedar ociosa toda la llamada. Confirma lo pendiente en la sesión.
+    """
+    from .extensions import db
+
+    for obj in objs:
+        db.session.expunge(obj)
+    db.session.commit()
+
+
+def init_app(app):
+    """Antes de db.init_app: respeta SQLALCHEMY_ENGINE_OPTIONS explícitas."""
+    opts = engine_options(app.config, cli=en_cli())
+    opts.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opts
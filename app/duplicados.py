@@ -0,0 +1,87 @@
+# app/duplicados.py
+"""
+Detección de comprobantes re-enviados, antes de subir nada al almacenamiento.
+
+- Exacto: ya existe un depósito cuyo comprobante tiene el mismo SHA-256
+  (idx_comprobantes_checksum).
+- Por referencia: mismo banco + folio/autorización (BBVA practicaja/caja) o
+  mismo banco + referencia + fecha (resto), vía idx_depositos_banco_folio_aut /
+  idx_depositos_banco_ref_fecha.
+Con particiones (Postgres) las dos búsquedas incluyen archivo.depositos: un
+comprobante de un mes archivado sigue siendo duplicado (mismos índices ahí).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+from . import particiones
+from .extensions import db
+from .models import Comprobante, Deposito
+
+
+def referencias(form) -> dict:
+    """bbva_tipo/folio/autorizacion/referencia del formulario de registro."""
+    refs = {"bbva_tipo": None, "folio": None, "autorizacion": None, "referencia": None}
+    if form.get("banco") == "BBVA" and form.get("forma_pago") == "Deposito":
+        t = form["bbva_tipo"]; refs["bbva_tipo"] = t
+        if t == "practicaja":
+            refs["folio"] = form["folio_practicaja"]
+            refs["autorizacion"] = form["autorizacion"]
+        else:
+            refs["folio"] = form["folio_movimiento"]
+    else:
+        refs["referencia"] = form["folio_unico"]
+    return refs
+
+
+def _primero(consulta) -> int | None:
+    """Menor id de `consulta(modelo)` en depositos y, si existe, archivo.depositos."""
+    modelos = [Deposito]
+    if particiones.hay_archivo():
+        modelos.append(particiones.DepositoArchivo)
+    ids = [consulta(m).order_by(m.id).limit(1).scalar() for m in modelos]
+    return min((i for i in ids if i is not None), default=None)
+
+
+def por_checksum(checksum: str) -> int | None:
+    """Id del primer depósito cuyo comprobante tiene el mismo SHA-256."""
+    return _primero(lambda m: (db.session.query(m.id)
+                               .join(Comprobante, m.comprobante_id == Comprobante.id)
+                               .filter(Comprobante.checksum_sha256 == checksum)))
+
+
+def por_referencia(banco: str, fecha: date, refs: dict) -> int | None:
+    """Id del primer depósito con las mismas referencias (ver módulo)."""
+    if refs.get("autorizacion"):
+        filtro = lambda m: (m.folio == refs["folio"], m.autorizacion == refs["autorizacion"])  # noqa: E731
+    elif refs.get("folio"):
+        filtro = lambda m: (m.folio == refs["folio"], m.fecha_operacion == fecha)  # noqa: E731
+    elif refs.get("referencia"):
+        filtro = lambda m: (m.referencia == refs["referencia"], m.fecha_operacion == fecha)  # noqa: E731
+    else:
+        return None
+    return _primero(lambda m: db.session.query(m.id).filter(m.banco == banco, *filtro(m)))
+
+
+def comprobante_existente(checksum: str) -> Comprobante | None:
+    """
+    Comprobante ya almacenado (o en la cola) con el mismo contenido, para no
+    volver a subirlo. Los "error" y "faltante" no cuentan: reenviar el archivo
+    es justo lo que los repara.
+    """
+    return (db.session.query(Comprobante)
+            .filter(Comprobante.checksum_sha256 == checksum,
+                    Comprobante.storage_status.in_(("operativo", "pendiente", "subiendo")))
+            .order_by(Comprobante.id)
+            .first())
+
+
+def soltar(ids) -> None:
+    """Quita duplicado_de_id que apunte a los depósitos `ids` (antes de borrarlos; sin commit)."""
+    if ids:
+        db.session.execute(
+            update(Deposito)
+            .where(Deposito.duplicado_de_id.in_(list(ids)))
+            .values(duplicado_de_id=None, updated_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        )
@@ -0,0 +1,188 @@
+# app/export.py
+"""
+Exportación de depósitos para contabilidad (CSV / XLSX).
+
+Las filas salen de un cursor del lado del servidor (yield_per -> named cursor
+en psycopg2) y se escriben por trozos, así que la memoria no depende del
+número de filas. Acepta los mismos filtros que el grid (app/search.py).
+"""
+import calendar
+import csv
+import io
+import os
+import sys
+import tempfile
+import zlib
+from datetime import date
+
+import click
+from flask.cli import with_appcontext
+
+from .extensions import db
+from .models import Deposito, FacturaOpcion, Comprobante
+from .search import parse_filters, apply_filters
+
+YIELD_PER = 1000
+CSV_FLUSH_ROWS = 500
+
+HEADER = [
+    "id", "fecha_operacion", "banco", "forma_pago", "producto", "numero_usuario",
+    "importe", "bbva_tipo", "folio", "autorizacion", "referencia",
+    "requiere_factura", "factura_titulo", "factura_rfc", "factura_email",
+    "estatus", "observaciones", "comprobante",
+]
+
+
+def export_query(filtros: dict, modelo=Deposito):
+    """Deposito ⟕ FacturaOpcion ⟕ Comprobante, sólo columnas exportadas."""
+    D = modelo
+    q = (db.session.query(
+            D.id, D.fecha_operacion, D.banco, D.forma_pago,
+            D.producto, D.numero_usuario, D.importe,
+            D.bbva_tipo, D.folio, D.autorizacion, D.referencia,
+            D.requiere_factura, FacturaOpcion.titulo, FacturaOpcion.rfc,
+            FacturaOpcion.email, D.estatus, D.observaciones,
+            D.comprobante_id, Comprobante.shared_url)
+         .outerjoin(FacturaOpcion, D.factura_opcion_id == FacturaOpcion.id)
+         .outerjoin(Comprobante, D.comprobante_id == Comprobante.id))
+    return apply_filters(q, filtros, D).order_by(D.id).yield_per(YIELD_PER)
+
+
+def iter_rows(filtros: dict, base_url: str, modelo=Deposito):
+    """Filas listas para escribir; el link es el compartido o el del admin."""
+    base_url = base_url.rstrip("/")
+    for r in export_query(filtros, modelo):
+        link = r.shared_url or f"{base_url}/admin/comprobante/{r.comprobante_id}/link"
+        yield [
+            r.id, r.fecha_operacion.isoformat() if r.fecha_operacion else "",
+            r.banco, r.forma_pago, r.producto, f"{r.numero_usuario:05d}",
+            str(r.importe), r.bbva_tipo or "", r.folio or "", r.autorizacion or "",
+            r.referencia or "", "si" if r.requiere_factura else "no",
+            r.titulo or "", r.rfc or "", r.email or "",
+            r.estatus or "", r.observaciones or "", link,
+        ]
+
+
+def iter_csv(rows):
+    """Genera el CSV (str) en trozos de CSV_FLUSH_ROWS filas."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # BOM: Excel abre UTF-8 con acentos correctos
+    writer.writerow(HEADER)
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n % CSV_FLUSH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Comprime en streaming (formato gzip) una secuencia de str/bytes."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+
+def write_xlsx(rows, fh) -> None:
+    """XLSX en modo write_only (openpyxl vuelca filas a disco, no a memoria)."""
+    try:
+        from openpyxl import Workbook  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("Exportar XLSX requiere el paquete 'openpyxl'.") from e
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("depositos")
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(fh)
+
+
+def xlsx_tempfile(rows) -> str:
+    """Escribe el XLSX a un archivo temporal y regresa su ruta."""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write_xlsx(rows, fh)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_file(path: str, chunk_size: int = 64 * 1024, remove: bool = True):
+    try:
+        with open(path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
+
+
+def periodo(dia: str | None, mes: str | None) -> dict:
+    """--dia YYYY-MM-DD / --mes YYYY-MM -> fecha_desde/fecha_hasta."""
+    if dia:
+        return {"fecha_desde": dia, "fecha_hasta": dia}
+    if mes:
+        y, m = (int(x) for x in mes.split("-"))
+        last = calendar.monthrange(y, m)[1]
+        return {"fecha_desde": date(y, m, 1).isoformat(), "fecha_hasta": date(y, m, last).isoformat()}
+    return {}
+
+
+# ---------------------------- CLI ----------------------------
+@click.command("export-depositos")
+@click.option("--format", "fmt", type=click.Choice(["csv", "xlsx"]), default="csv", show_default=True)
+@click.option("--out", "-o", default="-", help="Archivo destino ('-' = stdout; .gz comprime CSV).")
+@click.option("--dia", help="Día YYYY-MM-DD.")
+@click.option("--mes", help="Mes YYYY-MM.")
+@click.option("--banco")
+@click.option("--forma-pago")
+@click.option("--estatus")
+@click.option("--numero-usuario")
+@click.option("--base-url", default=lambda: os.getenv("PUBLIC_BASE_URL", ""),
+              help="URL pública para los links del admin (default: $PUBLIC_BASE_URL).")
+@with_appcontext
+def export_cmd(fmt, out, dia, mes, banco, forma_pago, estatus, numero_usuario, base_url):
+    """Exporta depósitos (con factura y link de comprobante) a CSV/XLSX."""
+    try:
+        args = periodo(dia, mes)
+        args.update({k: v for k, v in {"banco": banco, "forma_pago": forma_pago, "estatus": estatus,
+                                       "numero_usuario": numero_usuario}.items() if v})
+        filtros = parse_filters(args)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    rows = iter_rows(filtros, base_url)
+    if fmt == "xlsx":
+        if out == "-":
+            raise click.BadParameter("XLSX requiere --out <archivo>.")
+        with open(out, "wb") as fh:
+            write_xlsx(rows, fh)
+        click.echo(f"OK: {out}", err=True)
+        return
+
+    chunks = iter_csv(rows)
+    if out == "-":
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        return
+    if out.endswith(".gz"):
+        with open(out, "wb") as fh:
+            for data in gzip_chunks(chunks):
+                fh.write(data)
+    else:
+        with open(out, "w", encoding="utf-8", newline="") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+    click.echo(f"OK: {out}", err=True)
+
+
+def init_app(app):
+    app.cli.add_command(export_cmd)
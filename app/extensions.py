@@ -1,23 +1,51 @@
 # app/extensions.py
 import os
-import dropbox
+import threading
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
 # Extensión de base de datos
 db = SQLAlchemy()
+# Migraciones (Alembic): `flask db upgrade`; scripts en migrations/
+migrate = Migrate()
+
+_dropbox_lock = threading.Lock()
+
 
 # Cliente Dropbox (usa refresh token en vez de access token temporal)
-def get_dropbox():
+def create_dropbox(pool_size: int = 8, timeout: float = 60, connect_timeout: float = 10):
     """
-    Retorna un cliente de Dropbox que se auto-refresca usando el refresh token.
+    Construye un cliente de Dropbox que se auto-refresca usando el refresh token.
     Debes haber definido en .env:
       DROPBOX_APP_KEY
       DROPBOX_APP_SECRET
       DROPBOX_REFRESH_TOKEN
     """
+    import dropbox  # perezoso: el SDK pesa y sólo se usa con STORAGE_PROVIDER=dropbox
+
     return dropbox.Dropbox(
         app_key=os.environ["DROPBOX_APP_KEY"],
         app_secret=os.environ["DROPBOX_APP_SECRET"],
         oauth2_refresh_token=os.environ["DROPBOX_REFRESH_TOKEN"],
-        timeout=60,
+        timeout=(connect_timeout, timeout),
+        session=dropbox.create_session(max_connections=pool_size),
     )
+
+
+def get_dropbox(app):
+    """
+    Cliente compartido por app: un solo pool HTTP (keep-alive/TLS reutilizado)
+    y un access token cacheado que el SDK refresca sólo cerca de expirar.
+    """
+    client = app.extensions.get("dropbox")
+    if client is None:
+        with _dropbox_lock:
+            client = app.extensions.get("dropbox")
+            if client is None:
+                client = create_dropbox(
+                    pool_size=app.config.get("DROPBOX_POOL_SIZE", 8),
+                    timeout=app.config.get("DROPBOX_TIMEOUT", 60),
+                    connect_timeout=app.config.get("DROPBOX_CONNECT_TIMEOUT", 10),
+                )
+                app.extensions["dropbox"] = client
+    return client
@@ -0,0 +1,65 @@
+# app/facturas.py
+"""
+Opciones de facturación (FacturaOpcion) por número de usuario, con caché
+read-through.
+
+El registro y /api/opciones_factura leen de aquí; los handlers de
+/admin/fiscales invalidan la entrada del usuario al crear/editar/borrar.
+Se guarda el JSON ya serializado (el mismo que responde la API), con TTL
+FACTURA_CACHE_TTL. El backend es el de linkcache: LRU en memoria por proceso,
+o Redis con LINK_CACHE_URL. En memoria, otros workers pueden ver datos viejos
+hasta que expire el TTL.
+"""
+import hashlib
+import json
+
+from flask import current_app
+
+from .extensions import db
+from .models import FacturaOpcion
+from .storage.linkcache import MemoryLRU, RedisCache
+
+EXT_KEY = "factura_cache"
+
+
+def init_app(app):
+    url = app.config.get("LINK_CACHE_URL")
+    backend = None
+    if url:
+        try:
+            backend = RedisCache(url, prefix="multisaldo:factura:")
+        except Exception as e:
+            app.logger.warning("LINK_CACHE_URL ignorado para facturas (%s); se usa LRU en memoria.", e)
+    app.extensions[EXT_KEY] = backend or MemoryLRU(app.config.get("FACTURA_CACHE_SIZE", 4096))
+
+
+def _cache():
+    return current_app.extensions[EXT_KEY]
+
+
+def opciones_json(numero_usuario: int) -> str:
+    """JSON [{id, titulo, rfc, email}] del usuario (cacheado)."""
+    key = str(numero_usuario)
+    payload = _cache().get(key)
+    if payload is None:
+        rows = (db.session.query(FacturaOpcion.id, FacturaOpcion.titulo,
+                                 FacturaOpcion.rfc, FacturaOpcion.email)
+                .filter(FacturaOpcion.numero_usuario == numero_usuario)
+                .order_by(FacturaOpcion.id)
+                .all())
+        payload = json.dumps([{"id": r.id, "titulo": r.titulo, "rfc": r.rfc, "email": r.email}
+                              for r in rows], ensure_ascii=False)
+        _cache().set(key, payload, current_app.config.get("FACTURA_CACHE_TTL", 300))
+    return payload
+
+
+def opciones(numero_usuario: int) -> list[dict]:
+    return json.loads(opciones_json(numero_usuario))
+
+
+def etag(payload: str) -> str:
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def invalidar(numero_usuario: int) -> None:
+    _cache().delete(str(numero_usuario))
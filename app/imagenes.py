@@ -0,0 +1,88 @@
+# app/imagenes.py
+"""
+Normalización de comprobantes tipo imagen (fotos de celular).
+
+Antes de guardarla en el proveedor, la imagen se orienta según EXIF y se
+descartan sus metadatos. Después se limita su lado mayor a IMAGE_MAX_SIDE y
+se re-codifica a IMAGE_FORMAT (JPEG/WEBP) con IMAGE_QUALITY. Los PDF no se
+tocan. El checksum del Comprobante sigue siendo el del archivo recibido, así
+que la detección de duplicados no cambia.
+
+Requiere Pillow; sin él (o con IMAGE_NORMALIZE=0) las imágenes se guardan
+tal cual.
+"""
+import os
+import tempfile
+
+from flask import current_app
+
+FORMATOS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "WEBP": (".webp", "image/webp"),
+}
+MIMES_ENTRADA = ("image/jpeg", "image/png")
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageOps  # type: ignore
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def aplica(mime: str, app=None) -> bool:
+    """¿Se normaliza un archivo con este mime (ya detectado por firma)?"""
+    app = app or current_app
+    return bool(app.config["IMAGE_NORMALIZE"]) and mime in MIMES_ENTRADA and _pil() is not None
+
+
+def destino(app=None) -> tuple[str, str]:
+    """(extensión, mime) del archivo normalizado."""
+    app = app or current_app
+    fmt = app.config["IMAGE_FORMAT"].upper()
+    if fmt not in FORMATOS:
+        raise RuntimeError(f"IMAGE_FORMAT no soportado: {fmt}")
+    return FORMATOS[fmt]
+
+
+def normalizar(src: str, dst: str, app=None) -> bool:
+    """
+    Escribe en `dst` (atómico) la versión normalizada de `src`.
+    Regresa False, sin escribir nada, si conviene guardar el original: no se
+    pudo decodificar o ya estaba en el formato/tamaño destino y sin EXIF.
+    """
+    app = app or current_app
+    Image, ImageOps = _pil()
+    fmt = app.config["IMAGE_FORMAT"].upper()
+    max_side = app.config["IMAGE_MAX_SIDE"]
+
+    try:
+        with Image.open(src) as im:
+            if (im.format == fmt and max(im.size) <= max_side
+                    and not im.getexif() and "icc_profile" not in im.info):
+                return False
+            im = ImageOps.exif_transpose(im)
+            im.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            if im.mode not in ("RGB", "L"):
+                # JPEG no tiene alfa: se aplana sobre blanco
+                fondo = Image.new("RGB", im.size, "white")
+                im = im.convert("RGBA")
+                fondo.paste(im, mask=im.getchannel("A"))
+                im = fondo
+
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".norm-")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    im.save(fh, fmt, quality=app.config["IMAGE_QUALITY"], optimize=True)
+                os.replace(tmp, dst)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+    except (OSError, Image.DecompressionBombError) as e:
+        app.logger.warning("No se pudo normalizar %s; se guarda el original: %s", src, e)
+        return False
+    return True
@@ -0,0 +1,289 @@
+# app/metricas.py
+"""
+Instrumentación de requests: tiempos, consultas SQL y llamadas a storage.
+
+Por request se acumula en `g`:
+  - db:      consultas y su tiempo (eventos de cursor de SQLAlchemy);
+  - storage: llamadas al proveedor (get_storage regresa un proxy medido);
+  - tpl:     render de plantillas (señales de Flask);
+  - tramos con `medir("recv")` (p.ej. recepción + SHA-256 del comprobante).
+Se devuelve en el header Server-Timing (METRICS_SERVER_TIMING) y se agrega a
+contadores/histogramas que /metrics expone en formato de texto de Prometheus
+(exige `Authorization: Bearer <METRICS_TOKEN>`; sin METRICS_TOKEN responde
+404, salvo en debug/testing).
+
+Las métricas viven en memoria del proceso: con varios workers de gunicorn
+cada uno reporta las suyas.
+Las respuestas en streaming (grid NDJSON, exportaciones) se miden hasta que
+sale el primer byte; las consultas del resto del stream cuentan sólo en los
+totales.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .extensions import db
+
+EXT_KEY = "metricas"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+AYUDA = {
+    "http_requests_total": ("counter", "Requests atendidos."),
+    "http_request_duration_seconds": ("histogram", "Duración del request."),
+    "db_queries_per_request": ("histogram", "Consultas SQL por request (N+1)."),
+    "db_queries_total": ("counter", "Consultas SQL ejecutadas."),
+    "db_query_seconds_total": ("counter", "Tiempo total en consultas SQL."),
+    "storage_calls_total": ("counter", "Llamadas al proveedor de almacenamiento."),
+    "storage_errors_total": ("counter", "Llamadas al proveedor que fallaron."),
+    "storage_call_duration_seconds": ("histogram", "Duración de llamadas al proveedor."),
+    "storage_cache_total": ("counter", "Lecturas de la caché en disco de comprobantes (hit/miss/corrupt)."),
+    "storage_cache_evictions_total": ("counter", "Copias borradas por la poda LRU de la caché en disco."),
+    "storage_cache_bytes": ("gauge", "Bytes en la caché en disco de comprobantes (según este proceso)."),
+    "span_duration_seconds": ("histogram", "Tramos medidos con medir()."),
+}
+
+
+class Registro:
+    """Contadores e histogramas con etiquetas; thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = defaultdict(float)
+        self._hists: dict[tuple, list] = {}
+
+    @staticmethod
+    def _key(name, labels) -> tuple:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, labels: dict | None = None, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def observe(self, name: str, value: float, labels: dict | None = None, buckets=BUCKETS) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [buckets, [0] * len(buckets), 0.0, 0]
+            i = bisect_left(h[0], value)
+            if i < len(h[1]):
+                h[1][i] += 1
+            h[2] += value
+            h[3] += 1
+
+    def render(self, extra: dict | None = None) -> str:
+        """Texto de exposición de Prometheus (0.0.4). `extra`: gauges {nombre: valor}."""
+        def fmt(labels, more=()):
+            pairs = list(labels) + list(more)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in pairs) + "}"
+
+        lines, vistos = [], set()
+
+        def head(name):
+            if name not in vistos:
+                vistos.add(name)
+                tipo, ayuda = AYUDA.get(name, ("gauge", name))
+                lines.append(f"# HELP {name} {ayuda}")
+                lines.append(f"# TYPE {name} {tipo}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            hists = sorted((k, (b, list(c), s, n)) for k, (b, c, s, n) in self._hists.items())
+        for (name, labels), value in counters:
+            head(name)
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), (buckets, counts, total, n) in hists:
+            head(name)
+            acc = 0
+            for le, c in zip(buckets, counts):
+                acc += c
+                lines.append(f"{name}_bucket{fmt(labels, [('le', f'{le:g}')])} {acc}")
+            lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {n}")
+            lines.append(f"{name}_sum{fmt(labels)} {total:.6f}")
+            lines.append(f"{name}_count{fmt(labels)} {n}")
+        for name, value in sorted((extra or {}).items()):
+            head(name)
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registro = Registro()
+
+
+# ---------------------------- Acumulado por request ----------------------------
+def _acumular(tramo: str, seconds: float, n: int = 1) -> None:
+    if has_request_context() and "timings" in g:
+        t = g.timings[tramo]
+        t[0] += seconds
+        t[1] += n
+
+
+@contextmanager
+def medir(tramo: str):
+    """Mide un tramo del request (Server-Timing + histograma span_duration_seconds)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        _acumular(tramo, dt)
+        registro.observe("span_duration_seconds", dt, {"span": tramo})
+
+
+# ---------------------------- SQLAlchemy ----------------------------
+_hooks_lock = threading.Lock()
+_hooks_on = False
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metricas_t0 = time.perf_counter()
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "_metricas_t0", None)
+    if t0 is None:
+        return
+    dt = time.perf_counter() - t0
+    registro.inc("db_queries_total")
+    registro.inc("db_query_seconds_total", value=dt)
+    _acumular("db", dt)
+
+
+def _install_sql_hooks() -> None:
+    global _hooks_on
+    with _hooks_lock:
+        if not _hooks_on:
+            event.listen(Engine, "before_cursor_execute", _before_cursor)
+            event.listen(Engine, "after_cursor_execute", _after_cursor)
+            _hooks_on = True
+
+
+# ---------------------------- Storage ----------------------------
+STORAGE_OPS = ("upload", "put", "download", "get_shared_link", "get_temporary_link",
+               "delete", "stat", "warm")
+
+
+class InstrumentedProvider:
+    """Proxy de un Provider: mide cada operación y cuenta errores."""
+
+    def __init__(self, inner, name: str):
+        self._inner = inner
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._inner, attr)
+        if attr not in STORAGE_OPS or not callable(value):
+            return value
+
+        def medido(*args, **kw):
+            labels = {"provider": self._name, "op": attr}
+            t0 = time.perf_counter()
+            try:
+                return value(*args, **kw)
+            except Exception:
+                registro.inc("storage_errors_total", labels)
+                raise
+            finally:
+                dt = time.perf_counter() - t0
+                registro.inc("storage_calls_total", labels)
+                registro.observe("storage_call_duration_seconds", dt, labels)
+                _acumular("storage", dt)
+
+        return medido
+
+
+def instrumentar(provider, name: str):
+    return InstrumentedProvider(provider, name)
+
+
+# ---------------------------- Flask ----------------------------
+def _gauges(app) -> dict:
+    from .dbpool import pool_stats
+
+    out = {}
+    try:
+        with app.app_context():
+            stats = pool_stats(db.engine)
+    except Exception:
+        return out
+    for k in ("size", "checked_out", "checked_in", "overflow", "checkouts", "timeouts"):
+        if k in stats:
+            out[f"db_pool_{k}"] = stats[k]
+    if "wait_seconds_total" in stats:
+        out["db_pool_wait_seconds_total"] = stats["wait_seconds_total"]
+        out["db_pool_wait_seconds_max"] = stats["wait_seconds_max"]
+    queue = app.extensions.get("upload_queue")
+    if queue is not None:
+        out["upload_queue_depth"] = queue._q.qsize()
+    cache = getattr(app.extensions.get("storage"), "cache", None)  # app/storage/diskcache.py
+    if cache is not None:
+        out["storage_cache_bytes"] = cache.size_bytes
+    return out
+
+
+def init_app(app):
+    _install_sql_hooks()
+
+    def _tpl_start(sender, template, context, **extra):
+        if has_request_context() and "timings" in g:
+            g.tpl_t0 = time.perf_counter()
+
+    def _tpl_end(sender, template, context, **extra):
+        t0 = g.pop("tpl_t0", None) if has_request_context() else None
+        if t0 is not None:
+            _acumular("tpl", time.perf_counter() - t0)
+
+    before_render_template.connect(_tpl_start, app, weak=False)
+    template_rendered.connect(_tpl_end, app, weak=False)
+
+    @app.before_request
+    def _metricas_inicio():
+        g.req_t0 = time.perf_counter()
+        g.timings = defaultdict(lambda: [0.0, 0])
+
+    @app.after_request
+    def _metricas_fin(resp):
+        t0 = g.get("req_t0")
+        if t0 is None:
+            return resp
+        dur = time.perf_counter() - t0
+        endpoint = request.endpoint or "404"
+        if endpoint == "metrics":
+            return resp
+        labels = {"endpoint": endpoint, "method": request.method, "status": resp.status_code}
+        registro.inc("http_requests_total", labels)
+        registro.observe("http_request_duration_seconds", dur, {"endpoint": endpoint})
+        db_t, db_n = g.timings.get("db", (0.0, 0))
+        registro.observe("db_queries_per_request", db_n, {"endpoint": endpoint}, buckets=COUNT_BUCKETS)
+
+        if app.config.get("METRICS_SERVER_TIMING"):
+            parts = [f"app;dur={dur * 1000:.1f}"]
+            for tramo, (secs, n) in g.timings.items():
+                desc = f';desc="{n} q"' if tramo == "db" else ""
+                parts.append(f"{tramo};dur={secs * 1000:.1f}{desc}")
+            resp.headers.add("Server-Timing", ", ".join(parts))
+        return resp
+
+    @app.get("/metrics")
+    def metrics():
+        token = app.config.get("METRICS_TOKEN")
+        if not token:
+            if not (app.debug or app.testing):
+                return abort(404)  # sin token no se exponen rutas, tiempos ni conteos
+        elif not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return abort(401)
+        return Response(registro.render(_gauges(app)),
+                        mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    app.extensions[EXT_KEY] = registro
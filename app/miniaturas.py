@@ -0,0 +1,199 @@
+# app/miniaturas.py
+"""
+Miniaturas de comprobantes para el grid admin.
+
+Una miniatura JPEG por contenido (clave = checksum_sha256) en THUMB_DIR, de
+lado mayor THUMB_SIZE. Para las imágenes se reduce el archivo y para los PDF
+se usa la primera página (requiere PyMuPDF). Se generan:
+  - al registrar, con el archivo local justo después de subirlo (cola de
+    subidas o UPLOAD_ASYNC=0);
+  - si /admin/comprobante/<id>/preview no la encuentra: responde 404 de
+    inmediato y un hilo la genera desde el proveedor (una descarga por
+    contenido, a lo más THUMB_WORKERS a la vez); la siguiente vista ya la ve;
+  - en lote con `flask miniaturas backfill`.
+Como el contenido de una clave no cambia, el endpoint las sirve con caché
+de larga duración.
+"""
+import os
+import tempfile
+import threading
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from . import cooperativo
+from .extensions import db
+from .models import Comprobante
+
+EXT_KEY = "miniaturas"
+
+
+def thumb_path(checksum: str, app=None) -> str:
+    app = app or current_app
+    return os.path.join(app.config["THUMB_DIR"], checksum[:2], f"{checksum}.jpg")
+
+
+def _abrir(src: str, mime: str):
+    """Imagen PIL del archivo (primera página si es PDF) o None si no se puede."""
+    from PIL import Image  # type: ignore
+
+    if mime == "application/pdf":
+        try:
+            import pymupdf as fitz  # type: ignore
+        except ImportError:
+            try:
+                import fitz  # type: ignore  # PyMuPDF < 1.24
+            except ImportError:
+                return None
+        with fitz.open(src) as doc:
+            if not doc.page_count:
+                return None
+            page = doc[0]
+            zoom = current_app.config["THUMB_SIZE"] / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return Image.open(src)
+
+
+def generar(src: str, mime: str, checksum: str) -> bool:
+    """Genera la miniatura de `src` (atómico). False si no se pudo."""
+    try:
+        from PIL import Image, ImageOps  # type: ignore
+    except ImportError:
+        return False
+
+    dst = thumb_path(checksum)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        im = _abrir(src, mime)
+        if im is None:
+            return False
+        with im:
+            im = ImageOps.exif_transpose(im)
+            size = current_app.config["THUMB_SIZE"]
+            im.thumbnail((size, size))
+            if im.mode != "RGB":
+                im = im.convert("RGB")
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    im.save(fh, "JPEG", quality=70, optimize=True)
+                os.replace(tmp, dst)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+    except Exception as e:
+        current_app.logger.warning("Miniatura de %s falló: %s", checksum, e)
+        return False
+    return True
+
+
+def desde_archivo(src: str, mime: str, checksum: str) -> None:
+    """Miniatura desde un archivo local recién subido (spool), si aún no existe."""
+    if os.path.exists(src) and not os.path.exists(thumb_path(checksum)):
+        cooperativo.en_hilo(generar, src, mime, checksum)
+
+
+def _desde_proveedor(storage_path: str, mime: str, checksum: str) -> bool:
+    """Descarga `storage_path` a un temporal y genera su miniatura."""
+    from .storage.base import get_storage
+
+    dst = thumb_path(checksum)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".src-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            get_storage().download(storage_path, fh)
+        return cooperativo.en_hilo(generar, tmp, mime, checksum)
+    finally:
+        os.remove(tmp)
+
+
+def asegurar(comp: Comprobante) -> str | None:
+    """Ruta de la miniatura de `comp`; si falta, la genera desde el proveedor (bloquea)."""
+    dst = thumb_path(comp.checksum_sha256)
+    if os.path.exists(dst):
+        return dst
+    if comp.storage_status != "operativo":
+        return None
+    return dst if _desde_proveedor(comp.storage_path, comp.mime, comp.checksum_sha256) else None
+
+
+class Generador:
+    """Hilos daemon que generan las miniaturas que faltaron en un preview."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._en_curso: set[str] = set()
+        self._cupo = threading.BoundedSemaphore(max(1, app.config["THUMB_WORKERS"]))
+
+    def encolar(self, storage_path: str, mime: str, checksum: str) -> None:
+        with self._lock:
+            if checksum in self._en_curso:
+                return  # otro preview del mismo contenido ya la está generando
+            self._en_curso.add(checksum)
+        threading.Thread(target=self._run, args=(storage_path, mime, checksum),
+                         name=f"miniatura-{checksum[:8]}", daemon=True).start()
+
+    def _run(self, storage_path: str, mime: str, checksum: str) -> None:
+        try:
+            with self._cupo, self.app.app_context():
+                if not os.path.exists(thumb_path(checksum)):
+                    _desde_proveedor(storage_path, mime, checksum)
+        except Exception as e:
+            self.app.logger.warning("Miniatura de %s falló: %s", checksum, e)
+        finally:
+            with self._lock:
+                self._en_curso.discard(checksum)
+
+
+def buscar(comp: Comprobante) -> str | None:
+    """
+    Ruta de la miniatura de `comp` sin esperar al proveedor: si falta, se
+    encola su generación y regresa None.
+    """
+    dst = thumb_path(comp.checksum_sha256)
+    if os.path.exists(dst):
+        return dst
+    if comp.storage_status == "operativo":  # pendiente: la genera la cola de subidas
+        current_app.extensions[EXT_KEY].encolar(comp.storage_path, comp.mime, comp.checksum_sha256)
+    return None
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("miniaturas", help="Miniaturas de comprobantes.")
+
+
+@cli.command("backfill")
+@click.option("--limit", default=0, help="Máximo de comprobantes (0 = todos).")
+def backfill_cmd(limit: int):
+    """Genera las miniaturas que falten (descarga del proveedor)."""
+    q = (db.session.query(Comprobante)
+         .filter(Comprobante.storage_status == "operativo")
+         .order_by(Comprobante.id))
+    hechas = fallidas = 0
+    vistos = set()
+    for comp in q.yield_per(500):
+        if comp.checksum_sha256 in vistos or os.path.exists(thumb_path(comp.checksum_sha256)):
+            continue
+        vistos.add(comp.checksum_sha256)
+        try:
+            ok = asegurar(comp) is not None
+        except Exception as e:
+            click.echo(f"comprobante #{comp.id}: {e}", err=True)
+            ok = False
+        hechas += ok
+        fallidas += not ok
+        if limit and hechas + fallidas >= limit:
+            break
+    click.echo(f"OK: {hechas} miniaturas generadas; {fallidas} sin miniatura.")
+
+
+def init_app(app):
+    app.extensions[EXT_KEY] = Generador(app)
+    app.cli.add_command(cli)
@@ -24,6 +24,7 @@ class Comprobante(db.Model, TimestampMixin):
     """
     Archivo del comprobante (imagen/pdf) almacenado en Dropbox.
     - storage_path: nombre/clave con la que se guardó en /comprobantes/ de Dropbox.
+    - storage_status: "pendiente" mientras la cola de subidas no lo envía.
     """
     __tablename__ = "comprobantes"
 
@@ -38,14 +39,35 @@ class Comprobante(db.Model, TimestampMixin):
     checksum_sha256 = db.Column(db.String(64), nullable=False)
 
     storage_path = db.Column(db.String(512), nullable=False)  # p.ej. "e7b2...df3.pdf"
+    # "pendiente" (en spool local) -> "subiendo" -> "operativo" | "error";
+    # "faltante" si el escáner de integridad no lo encuentra en el proveedor
     storage_status = db.Column(db.String(32), default="operativo", nullable=False)
+    storage_attempts = db.Column(db.Integer, default=0, nullable=False)
+    storage_error = db.Column(db.Text)
+    # Link compartido permanente (cacheado; evita llamadas a la API al abrirlo)
+    shared_url = db.Column(db.String(1024))
+    # content_hash de Dropbox del objeto almacenado (lo llena `flask storage scan`)
+    content_hash = db.Column(db.String(64))
 
     # Índices
     __table_args__ = (
         Index("idx_comprobantes_created_at", "created_at"),
+        Index("idx_comprobantes_storage_status", "storage_status"),
+        Index("idx_comprobantes_checksum", "checksum_sha256"),
+        # Conteo de referencias por objeto (almacenamiento direccionado por contenido)
+        Index("idx_comprobantes_storage_path", "storage_path"),
     )
 
 
+class StorageCursor(db.Model):
+    """Cursor de listado incremental del proveedor (ver app/storage/integridad.py)."""
+    __tablename__ = "storage_cursores"
+
+    nombre = db.Column(db.String(128), primary_key=True)
+    cursor = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 class FacturaOpcion(db.Model, TimestampMixin):
     """
     Opciones de facturación por número de usuario (5 dígitos).
@@ -121,6 +143,15 @@ class Deposito(db.Model, TimestampMixin):
     estatus = db.Column(db.String(32), default="registrado", nullable=False)
     observaciones = db.Column(db.Text)
 
+    # Posible duplicado (mismo comprobante o misma referencia) de otro depósito.
+    # Sin FK: en Postgres la tabla está particionada por mes (PK id+fecha, ver
+    # migrations/); al borrar se limpia con duplicados.soltar().
+    duplicado_de_id = db.Column(db.Integer, nullable=True)
+
+    # Transacción (xid de Postgres) que escribió la fila por última vez; la
+    # pone un trigger (migración 0012), NULL en SQLite. Ver app/cambios.py.
+    cambio_xid = db.Column(db.BigInteger, nullable=True)
+
     __table_args__ = (
         # 5 dígitos reforzado a nivel BD
         CheckConstraint("numero_usuario >= 0 AND numero_usuario <= 99999",
@@ -130,4 +161,48 @@ class Deposito(db.Model, TimestampMixin):
         # Índices compuestos útiles para filtros en admin
         Index("idx_depositos_banco_forma", "banco", "forma_pago"),
         Index("idx_depositos_estado_fecha", "estatus", "fecha_operacion"),
+        # Filtros del grid (ver app/search.py)
+        Index("idx_depositos_importe", "importe"),
+        Index("idx_depositos_producto_fecha", "producto", "fecha_operacion"),
+        Index("idx_depositos_referencia_prefix", "referencia",
+              postgresql_ops={"referencia": "varchar_pattern_ops"}),
+        Index("idx_depositos_folio_prefix", "folio",
+              postgresql_ops={"folio": "varchar_pattern_ops"}),
+        # Detección de duplicados al registrar (ver app/duplicados.py)
+        Index("idx_depositos_banco_folio_aut", "banco", "folio", "autorizacion"),
+        Index("idx_depositos_banco_ref_fecha", "banco", "referencia", "fecha_operacion"),
+        # Feed de cambios del grid (ver app/cambios.py)
+        Index("idx_depositos_updated_at", "updated_at"),
+        Index("idx_depositos_cambio_xid", "cambio_xid"),
     )
+
+
+class DepositoBorrado(db.Model):
+    """
+    Lápida de un depósito eliminado, para que el grid lo quite en el siguiente
+    poll de cambios (ver app/cambios.py). Se depuran con `flask cambios prune`.
+    """
+    __tablename__ = "depositos_borrados"
+
+    id = db.Column(db.Integer, primary_key=True)
+    deposito_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    cambio_xid = db.Column(db.BigInteger, nullable=True, index=True)  # DEFAULT en Postgres (0012)
+
+
+class ResumenDiario(db.Model):
+    """
+    Totales materializados de depósitos por día × banco × forma × producto × estatus.
+    Se mantiene incrementalmente (ver app/resumen.py); la PK empieza por la fecha
+    para que los rangos de fechas del dashboard sean por índice.
+    """
+    __tablename__ = "resumen_diario"
+
+    fecha_operacion = db.Column(db.Date, primary_key=True)
+    banco = db.Column(db.String(32), primary_key=True)
+    forma_pago = db.Column(db.String(32), primary_key=True)
+    producto = db.Column(db.String(64), primary_key=True)
+    estatus = db.Column(db.String(32), primary_key=True)
+
+    n = db.Column(db.Integer, default=0, nullable=False)
+    total_importe = db.Column(db.Numeric(14, 2), default=0, nullable=False)
@@ -0,0 +1,277 @@
+# app/particiones.py
+"""
+Particiones mensuales de depósitos y archivo de meses cerrados (Postgres).
+
+Desde la migración 0010 `depositos` está particionada por mes de
+fecha_operacion (depositos_pAAAA_MM, más depositos_pdefault para lo que caiga
+fuera de rango). Todo el admin consulta `depositos`, que sólo contiene los
+meses "calientes": archivar un mes lo desprende (DETACH) y lo cuelga (ATTACH)
+de archivo.depositos, sin copiar filas. Así el grid, los filtros y los índices
+sólo recorren los meses recientes aunque la historia crezca sin límite.
+  - el grid busca en el archivo con ?archivo=1 (sólo lectura, DepositoArchivo);
+  - resumen_diario conserva los totales de los meses archivados y
+    `flask resumen rebuild|check` los recalcula de ambas tablas.
+
+    flask particiones estado
+    flask particiones crear [--meses N]                 (cron mensual)
+    flask particiones archivar [--meses-calientes N | --antes-de AAAA-MM] [--forzar] [--dry-run]
+    flask particiones restaurar AAAA-MM
+
+Un mes con depósitos aún "registrado" (sin conciliar) no se archiva sin --forzar.
+En SQLite (desarrollo, bench) no hay particiones y los comandos sólo avisan.
+"""
+import re
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Column, MetaData, Table, text
+from sqlalchemy.orm import aliased
+
+from .extensions import db
+from .models import Deposito
+
+EXT_KEY = "particiones"
+ESQUEMA_ARCHIVO = "archivo"
+DEFAULT = "depositos_pdefault"
+LOCK_TIMEOUT = "5s"  # DETACH/ATTACH esperan a lo más esto por el lock de depositos
+
+# archivo.depositos: mismas columnas que depositos, fuera de db.metadata
+# (create_all no la crea; la crea la migración). Sin FKs: sólo se lee.
+ARCHIVO = Table(
+    "depositos", MetaData(schema=ESQUEMA_ARCHIVO),
+    *(Column(c.name, c.type, primary_key=c.primary_key) for c in Deposito.__table__.c),
+)
+# Deposito sobre archivo.depositos: DepositoArchivo.banco, .id, ... en las mismas consultas
+DepositoArchivo = aliased(Deposito, ARCHIVO, adapt_on_names=True, name="depositos_archivo")
+
+_BOUND_RE = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+def nombre(mes: date) -> str:
+    return f"depositos_p{mes:%Y_%m}"
+
+
+def mes_siguiente(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def mes_anterior(d: date, n: int = 1) -> date:
+    total = d.year * 12 + d.month - 1 - n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def parse_mes(value: str) -> date:
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise click.BadParameter(f"mes inválido {value!r} (AAAA-MM)")
+
+
+def es_postgres() -> bool:
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def hay_archivo() -> bool:
+    """¿La BD tiene archivo.depositos (migración 0010 en Postgres)? Se cachea por app."""
+    ok = current_app.extensions.get(EXT_KEY)
+    if ok is None:
+        ok = es_postgres() and db.session.execute(
+            text("SELECT to_regclass('archivo.depositos') IS NOT NULL")).scalar()
+        current_app.extensions[EXT_KEY] = bool(ok)
+    return ok
+
+
+def listar() -> list[dict]:
+    """Particiones calientes y archivadas: esquema, nombre, rango y filas estimadas."""
+    rows = db.session.execute(text("""
+        SELECT n.nspname, c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+          JOIN pg_namespace n ON n.oid = c.relnamespace
+         WHERE i.inhparent IN ('public.depositos'::regclass, 'archivo.depositos'::regclass)
+         ORDER BY c.relname
+    """)).all()
+    out = []
+    for esquema, rel, bound, filas in rows:
+        m = _BOUND_RE.search(bound or "")
+        out.append({
+            "esquema": esquema, "nombre": rel, "archivada": esquema == ESQUEMA_ARCHIVO,
+            "desde": date.fromisoformat(m.group(1)) if m else None,
+            "hasta": date.fromisoformat(m.group(2)) if m else None,
+            "filas": max(int(filas), 0),  # reltuples: -1 si nunca se analizó
+        })
+    return out
+
+
+def _exec(sql: str, **params) -> None:
+    db.session.execute(text(sql), params)
+
+
+def _limites_tx() -> None:
+    """
+    Espera acotada por locks, pero sin statement_timeout (DB_STATEMENT_TIMEOUT_MS):
+    mover filas de la default y validar el CHECK de _attach recorren meses enteros.
+    """
+    _exec(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    _exec("SET LOCAL statement_timeout = 0")
+
+
+def _rango(mes: date) -> str:
+    return f"FROM ('{mes.isoformat()}') TO ('{mes_siguiente(mes).isoformat()}')"
+
+
+def _attach(padre: str, tabla: str, mes: date) -> None:
+    """ATTACH con un CHECK previo igual al rango: Postgres no vuelve a escanear la tabla."""
+    check = f"{tabla.rsplit('.', 1)[-1]}_rango"
+    _exec(f"ALTER TABLE {tabla} ADD CONSTRAINT {check} CHECK "
+          f"(fecha_operacion >= '{mes.isoformat()}' AND fecha_operacion < '{mes_siguiente(mes).isoformat()}')")
+    _exec(f"ALTER TABLE {padre} ATTACH PARTITION {tabla} FOR VALUES {_rango(mes)}")
+    _exec(f"ALTER TABLE {tabla} DROP CONSTRAINT {check}")
+
+
+def _mover_de_default(mes: date, tabla: str) -> int:
+    """Filas de `mes` que cayeron en depositos_pdefault -> `tabla` (default desprendida)."""
+    params = {"d": mes, "h": mes_siguiente(mes)}
+    res = db.session.execute(text(
+        f"WITH m AS (DELETE FROM {DEFAULT} WHERE fecha_operacion >= :d AND fecha_operacion < :h "
+        f"RETURNING *) INSERT INTO {tabla} SELECT * FROM m"), params)
+    return res.rowcount
+
+
+def crear(hasta: date) -> list[str]:
+    """Crea las particiones que falten desde el mes actual hasta `hasta` (commit por mes)."""
+    existentes = {p["desde"] for p in listar() if p["desde"]}
+    creadas = []
+    mes = date.today().replace(day=1)
+    while mes <= hasta:
+        if mes not in existentes:
+            _limites_tx()
+            en_default = db.session.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE fecha_operacion >= :d AND fecha_operacion < :h)"),
+                {"d": mes, "h": mes_siguiente(mes)}).scalar()
+            if en_default:
+                # Postgres no deja crear el rango si la default ya tiene filas de ese mes
+                _exec(f"ALTER TABLE depositos DETACH PARTITION {DEFAULT}")
+                _exec(f"CREATE TABLE {nombre(mes)} PARTITION OF depositos FOR VALUES {_rango(mes)}")
+                _mover_de_default(mes, nombre(mes))
+                _exec(f"ALTER TABLE depositos ATTACH PARTITION {DEFAULT} DEFAULT")
+            else:
+                _exec(f"CREATE TABLE {nombre(mes)} PARTITION OF depositos FOR VALUES {_rango(mes)}")
+            db.session.commit()
+            creadas.append(nombre(mes))
+        mes = mes_siguiente(mes)
+    return creadas
+
+
+def pendientes(tabla: str) -> int:
+    return db.session.execute(
+        text(f"SELECT count(*) FROM {tabla} WHERE estatus = 'registrado'")).scalar()
+
+
+def archivar_mes(mes: date) -> None:
+    """depositos_pAAAA_MM: depositos -> archivo.depositos (sólo metadatos; con commit)."""
+    tabla = nombre(mes)
+    _limites_tx()
+    _exec(f"ALTER TABLE depositos DETACH PARTITION {tabla}")
+    _exec(f"ALTER TABLE {tabla} SET SCHEMA {ESQUEMA_ARCHIVO}")
+    _attach(f"{ESQUEMA_ARCHIVO}.depositos", f"{ESQUEMA_ARCHIVO}.{tabla}", mes)
+    db.session.commit()
+
+
+def restaurar_mes(mes: date) -> int:
+    """Regresa un mes archivado a depositos (p.ej. para corregirlo); con commit."""
+    tabla = nombre(mes)
+    _limites_tx()
+    _exec(f"ALTER TABLE {ESQUEMA_ARCHIVO}.depositos DETACH PARTITION {ESQUEMA_ARCHIVO}.{tabla}")
+    _exec(f"ALTER TABLE {ESQUEMA_ARCHIVO}.{tabla} SET SCHEMA public")
+    # Lo registrado para ese mes mientras estuvo archivado quedó en la default
+    _exec(f"ALTER TABLE depositos DETACH PARTITION {DEFAULT}")
+    movidas = _mover_de_default(mes, tabla)
+    _attach("depositos", tabla, mes)
+    _exec(f"ALTER TABLE depositos ATTACH PARTITION {DEFAULT} DEFAULT")
+    db.session.commit()
+    return movidas
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("particiones", help="Particiones mensuales de depósitos y archivo (Postgres).")
+
+
+def _requiere_particiones():
+    if not hay_archivo():
+        raise click.ClickException(
+            "Requiere Postgres con la migración de particiones (`flask db upgrade`).")
+
+
+@cli.command("estado")
+def estado_cmd():
+    """Lista particiones calientes y archivadas con filas estimadas."""
+    _requiere_particiones()
+    for p in listar():
+        rango = f"{p['desde']:%Y-%m}" if p["desde"] else "default"
+        click.echo(f"{'archivo ' if p['archivada'] else 'caliente'}  {rango:8}  {p['filas']:>10}  {p['nombre']}")
+
+
+@cli.command("crear")
+@click.option("--meses", type=int, default=None,
+              help="Meses por adelantado (default: PARTICIONES_MESES_ADELANTE).")
+def crear_cmd(meses):
+    """Crea las particiones del mes actual y los siguientes."""
+    _requiere_particiones()
+    meses = current_app.config["PARTICIONES_MESES_ADELANTE"] if meses is None else meses
+    hasta = date.today().replace(day=1)
+    for _ in range(meses):
+        hasta = mes_siguiente(hasta)
+    creadas = crear(hasta)
+    click.echo(f"OK: {len(creadas)} particiones creadas{': ' + ', '.join(creadas) if creadas else ''}.")
+
+
+@cli.command("archivar")
+@click.option("--meses-calientes", type=int, default=None,
+              help="Meses que se quedan en depositos (default: PARTICIONES_MESES_CALIENTES).")
+@click.option("--antes-de", "antes_de", default=None, help="Archiva los meses anteriores a AAAA-MM.")
+@click.option("--forzar", is_flag=True, help="Archiva aunque haya depósitos sin conciliar.")
+@click.option("--dry-run", is_flag=True, help="Sólo muestra lo que se archivaría.")
+def archivar_cmd(meses_calientes, antes_de, forzar, dry_run):
+    """Mueve los meses cerrados a archivo.depositos (DETACH/ATTACH, sin copiar filas)."""
+    _requiere_particiones()
+    if antes_de:
+        corte = parse_mes(antes_de)
+    else:
+        n = current_app.config["PARTICIONES_MESES_CALIENTES"] if meses_calientes is None else meses_calientes
+        corte = mes_anterior(date.today().replace(day=1), max(n - 1, 0))
+
+    archivados = 0
+    for p in listar():
+        if p["archivada"] or not p["desde"] or p["hasta"] > corte:
+            continue
+        n_pend = pendientes(p["nombre"])
+        if n_pend and not forzar:
+            click.echo(f"omitido {p['nombre']}: {n_pend} depósitos sin conciliar (usa --forzar)")
+            continue
+        if dry_run:
+            click.echo(f"se archivaría {p['nombre']} (~{p['filas']} filas)")
+            continue
+        archivar_mes(p["desde"])
+        archivados += 1
+        click.echo(f"archivado {p['nombre']}")
+    if not dry_run:
+        click.echo(f"OK: {archivados} meses archivados (anteriores a {corte:%Y-%m}).")
+
+
+@cli.command("restaurar")
+@click.argument("mes")
+def restaurar_cmd(mes):
+    """Regresa el mes AAAA-MM del archivo a depositos."""
+    _requiere_particiones()
+    m = parse_mes(mes)
+    if not any(p["archivada"] and p["desde"] == m for p in listar()):
+        raise click.ClickException(f"{nombre(m)} no está en el archivo.")
+    movidas = restaurar_mes(m)
+    click.echo(f"OK: {nombre(m)} restaurada ({movidas} filas recuperadas de la default).")
+
+
+def init_app(app):
+    app.cli.add_command(cli)
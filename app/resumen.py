@@ -0,0 +1,180 @@
+# app/resumen.py
+"""
+Resumen diario materializado de depósitos (tabla resumen_diario).
+
+Una fila por día × banco × forma_pago × producto × estatus con el número de
+depósitos y la suma de importe. Se mantiene de forma incremental dentro de la
+misma transacción que modifica `depositos`:
+
+    antes = snapshot(ids)      # antes del UPDATE/DELETE
+    ...cambios...
+    aplicar(diff(antes, snapshot(ids)))
+
+y se puede reconstruir/verificar completo con `flask resumen rebuild|check`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select, text, union_all
+
+from . import particiones
+from .extensions import db
+from .models import Deposito, ResumenDiario
+
+DIMS = ("fecha_operacion", "banco", "forma_pago", "producto", "estatus")
+
+
+def key_of(obj) -> tuple:
+    return tuple(getattr(obj, d) for d in DIMS)
+
+
+def snapshot(ids) -> list[tuple[tuple, Decimal]]:
+    """
+    [(clave, importe)] de los depósitos `ids` tal como están en la transacción.
+    Bloquea las filas (FOR UPDATE, en orden de id): dos ediciones concurrentes
+    de las mismas filas no pueden partir del mismo "antes" y aplicar el delta
+    dos veces.
+    """
+    if not ids:
+        return []
+    cols = [getattr(Deposito, d) for d in DIMS]
+    rows = (db.session.query(*cols, Deposito.importe)
+            .filter(Deposito.id.in_(list(ids)))
+            .order_by(Deposito.id)
+            .with_for_update()
+            .all())
+    return [(tuple(r[:-1]), r[-1]) for r in rows]
+
+
+def diff(antes=(), despues=()) -> dict:
+    """Delta por clave: {clave: [n, importe]} (negativo lo que sale, positivo lo que entra)."""
+    delta = defaultdict(lambda: [0, Decimal("0")])
+    for key, importe in antes:
+        delta[key][0] -= 1
+        delta[key][1] -= Decimal(importe)
+    for key, importe in despues:
+        delta[key][0] += 1
+        delta[key][1] += Decimal(importe)
+    return {k: v for k, v in delta.items() if v[0] or v[1]}
+
+
+def _upsert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Resumen: dialecto no soportado: {dialect}")
+    stmt = dialect_insert(ResumenDiario)
+    return stmt.on_conflict_do_update(
+        index_elements=list(DIMS),
+        set_={
+            "n": ResumenDiario.n + stmt.excluded.n,
+            "total_importe": ResumenDiario.total_importe + stmt.excluded.total_importe,
+        },
+    )
+
+
+def aplicar(delta: dict) -> None:
+    """Suma el delta en resumen_diario (upsert atómico; no hace commit)."""
+    if not delta:
+        return
+    # Siempre en el mismo orden: dos transacciones que tocan las mismas claves no se cruzan
+    rows = [dict(zip(DIMS, key), n=n, total_importe=total)
+            for key, (n, total) in sorted(delta.items(), key=lambda kv: str(kv[0]))]
+    db.session.execute(_upsert(), rows)
+
+
+def _fuente():
+    """depositos y, con particiones, también archivo.depositos (el resumen cubre ambos)."""
+    t = Deposito.__table__
+    if not particiones.hay_archivo():
+        return t
+    nombres = list(DIMS) + ["id", "importe"]
+    return union_all(select(*(t.c[n] for n in nombres)),
+                     select(*(particiones.ARCHIVO.c[n] for n in nombres))).subquery("d")
+
+
+def recompute_select():
+    src = _fuente()
+    cols = [src.c[d] for d in DIMS]
+    return (select(*cols, func.count(src.c.id), func.coalesce(func.sum(src.c.importe), 0))
+            .group_by(*cols))
+
+
+def rebuild() -> int:
+    """Recalcula resumen_diario completo desde depositos (no hace commit)."""
+    if particiones.es_postgres():
+        # recorre todos los depósitos: sin el statement_timeout de la app (dbpool)
+        db.session.execute(text("SET LOCAL statement_timeout = 0"))
+    db.session.execute(delete(ResumenDiario))
+    res = db.session.execute(
+        insert(ResumenDiario).from_select(list(DIMS) + ["n", "total_importe"], recompute_select())
+    )
+    return res.rowcount
+
+
+def check() -> list[tuple]:
+    """Diferencias (clave, (n, total) resumen, (n, total) recalculado)."""
+    esperado = {tuple(r[:-2]): (r[-2], Decimal(r[-1])) for r in db.session.execute(recompute_select())}
+    cols = [getattr(ResumenDiario, d) for d in DIMS]
+    actual = {
+        tuple(r[:-2]): (r[-2], Decimal(r[-1]))
+        for r in db.session.query(*cols, ResumenDiario.n, ResumenDiario.total_importe)
+        .filter(ResumenDiario.n != 0)
+    }
+    diffs = []
+    for key in sorted(set(esperado) | set(actual), key=str):
+        a = actual.get(key, (0, Decimal("0")))
+        e = esperado.get(key, (0, Decimal("0")))
+        if a != e:
+            diffs.append((key, a, e))
+    return diffs
+
+
+def consultar(filtros: dict, agrupar: list[str]):
+    """Totales desde resumen_diario, filtrados y agrupados por `agrupar` ⊆ DIMS."""
+    cols = [getattr(ResumenDiario, d) for d in agrupar]
+    q = db.session.query(*cols, func.sum(ResumenDiario.n).label("n"),
+                         func.sum(ResumenDiario.total_importe).label("total_importe"))
+    for d in ("banco", "forma_pago", "producto", "estatus"):
+        if d in filtros:
+            q = q.filter(getattr(ResumenDiario, d) == filtros[d])
+    if "fecha_desde" in filtros:
+        q = q.filter(ResumenDiario.fecha_operacion >= filtros["fecha_desde"])
+    if "fecha_hasta" in filtros:
+        q = q.filter(ResumenDiario.fecha_operacion <= filtros["fecha_hasta"])
+    q = q.filter(ResumenDiario.n != 0)
+    if cols:
+        q = q.group_by(*cols).order_by(*cols)
+    return q.all()
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("resumen", help="Resumen diario materializado de depósitos.")
+
+
+@cli.command("rebuild")
+def rebuild_cmd():
+    """Recalcula resumen_diario desde cero."""
+    n = rebuild()
+    db.session.commit()
+    click.echo(f"OK: {n} filas en resumen_diario.")
+
+
+@cli.command("check")
+def check_cmd():
+    """Compara resumen_diario contra un recálculo completo."""
+    diffs = check()
+    for key, actual, esperado in diffs[:50]:
+        click.echo(f"{key}: resumen={actual} recalculado={esperado}")
+    if diffs:
+        raise click.ClickException(f"{len(diffs)} diferencias; corre `flask resumen rebuild`.")
+    click.echo("OK: resumen_diario consistente.")
+
+
+def init_app(app):
+    app.cli.add_command(cli)
@@ -1,16 +1,21 @@
 # app/routes/admin.py
 from flask import (
     Blueprint, render_template, request, redirect, url_for,
-    flash, jsonify, session, current_app, abort
+    flash, jsonify, session, current_app, abort, Response, stream_with_context, send_file
 )
 from hmac import compare_digest
 from decimal import Decimal, InvalidOperation
 from datetime import date, datetime
+from sqlalchemy import update, delete
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..extensions import db
-from ..models import Deposito, Comprobante, FacturaOpcion
+from ..models import Deposito, Comprobante, FacturaOpcion, BANCOS
 from ..storage.base import get_storage
+from ..storage import diskcache, linkcache, spool
+from ..search import parse_filters, apply_filters
+from .. import export, resumen, miniaturas, facturas, dbpool, cambios, conciliacion, duplicados, particiones
+import os
 import re
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
@@ -60,64 +65,269 @@ def logout():
 def registros():
     if not _is_authed():
         return redirect(url_for("admin.login"))
-    return render_template("admin/registros.html")
+    # con caché en disco el comprobante se sirve desde aquí; si no, link del proveedor
+    accion = "archivo" if diskcache.activa() else "link"
+    return render_template("admin/registros.html", comprobante_accion=accion)
 
 
 # ---------------------------- Serializadores ----------------------------
-def _serialize_dep_row(dep: Deposito, fo: FacturaOpcion | None) -> dict:
-    """Deposito + (opción fiscal) -> dict para el grid."""
+# Sólo las columnas que necesita el grid (sin construir entidades ORM por fila)
+_DEP_FIELDS = (
+    "id", "fecha_operacion", "banco", "forma_pago",
+    "producto", "numero_usuario", "importe",
+    "bbva_tipo", "folio", "autorizacion", "referencia",
+    "requiere_factura", "estatus", "observaciones",
+    "comprobante_id", "factura_opcion_id", "duplicado_de_id",
+)
+_FACTURA_COLUMNS = (
+    FacturaOpcion.titulo.label("factura_titulo"),
+    FacturaOpcion.rfc.label("factura_rfc"),
+    FacturaOpcion.email.label("factura_email"),
+)
+
+# Paginación keyset del grid
+PAGE_SIZE_DEFAULT = 200
+PAGE_SIZE_MAX = 1000
+
+
+def _dep_rows_query(modelo=Deposito):
+    """SELECT proyectado Deposito ⟕ FacturaOpcion (filas, no entidades)."""
+    return (db.session.query(*(getattr(modelo, f) for f in _DEP_FIELDS), *_FACTURA_COLUMNS)
+            .outerjoin(FacturaOpcion, modelo.factura_opcion_id == FacturaOpcion.id))
+
+
+def _modelo():
+    """Deposito, o DepositoArchivo con ?archivo=1 (meses archivados, sólo lectura)."""
+    if request.args.get("archivo") != "1":
+        return Deposito
+    if not particiones.hay_archivo():
+        raise ValueError("archivo: requiere Postgres con particiones (flask db upgrade)")
+    return particiones.DepositoArchivo
+
+
+def _serialize_dep_row(row) -> dict:
+    """Fila proyectada (ver _DEP_FIELDS) -> dict para el grid."""
     return {
-        "id": dep.id,
-        "fecha_operacion": dep.fecha_operacion.isoformat() if dep.fecha_operacion else "",
-        "banco": dep.banco,
-        "forma_pago": dep.forma_pago,
-        "producto": dep.producto,
-        "numero_usuario": dep.numero_usuario,
-        "importe": str(dep.importe) if dep.importe is not None else "0.00",
-        "bbva_tipo": dep.bbva_tipo or "",
-        "folio": dep.folio or "",
-        "autorizacion": dep.autorizacion or "",
-        "referencia": dep.referencia or "",
-        "requiere_factura": bool(dep.requiere_factura),
-        "estatus": dep.estatus or "registrado",
-        "observaciones": dep.observaciones or "",
-        "comprobante_id": dep.comprobante_id,
-        "factura_opcion_id": dep.factura_opcion_id,
+        "id": row.id,
+        "fecha_operacion": row.fecha_operacion.isoformat() if row.fecha_operacion else "",
+        "banco": row.banco,
+        "forma_pago": row.forma_pago,
+        "producto": row.producto,
+        "numero_usuario": row.numero_usuario,
+        "importe": str(row.importe) if row.importe is not None else "0.00",
+        "bbva_tipo": row.bbva_tipo or "",
+        "folio": row.folio or "",
+        "autorizacion": row.autorizacion or "",
+        "referencia": row.referencia or "",
+        "requiere_factura": bool(row.requiere_factura),
+        "estatus": row.estatus or "registrado",
+        "observaciones": row.observaciones or "",
+        "comprobante_id": row.comprobante_id,
+        "factura_opcion_id": row.factura_opcion_id,
+        "duplicado_de_id": row.duplicado_de_id,
         # extras visibles en el grid
-        "factura_titulo": (fo.titulo if fo else None),
-        "factura_rfc": (fo.rfc if fo else None),
-        "factura_email": (fo.email if fo else None),
+        "factura_titulo": row.factura_titulo,
+        "factura_rfc": row.factura_rfc,
+        "factura_email": row.factura_email,
     }
 
 
+def _wants_ndjson() -> bool:
+    if (request.args.get("format") or "").lower() == "ndjson":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def _stream_rows(rows, ndjson: bool):
+    """Genera el cuerpo por trozos: NDJSON (una fila por línea) o arreglo JSON."""
+    dumps = current_app.json.dumps
+    try:
+        if ndjson:
+            for row in rows:
+                yield dumps(_serialize_dep_row(row)) + "\n"
+            return
+        yield "["
+        first = True
+        for row in rows:
+            yield ("" if first else ",") + dumps(_serialize_dep_row(row))
+            first = False
+        yield "]"
+    finally:
+        # `rows` usa la sesión del view, que su teardown ya quitó del registro:
+        # al iterar tomó otra conexión que nadie más devolvería al pool.
+        rows.session.close()
+
+
 # ---------------------------- API: listar ----------------------------
 @bp.get("/api/depositos")
 def api_depositos_list():
     if not _is_authed():
         return abort(401)
 
-    q_banco = (request.args.get("banco") or "").strip()
-    q_forma = (request.args.get("forma_pago") or "").strip()
-    q_usuario = (request.args.get("numero_usuario") or "").strip()
+    # Cursor keyset sobre Deposito.id desc: ?after_id=<último id recibido>&limit=N
+    try:
+        limit = int(request.args.get("limit") or PAGE_SIZE_DEFAULT)
+        after_id = int(request.args["after_id"]) if request.args.get("after_id") else None
+        filtros = parse_filters(request.args)
+        D = _modelo()
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    limit = max(1, min(limit, PAGE_SIZE_MAX))
 
     # LEFT JOIN para traer la razón social (si existe)
-    query = (db.session.query(Deposito, FacturaOpcion)
-             .outerjoin(FacturaOpcion, Deposito.factura_opcion_id == FacturaOpcion.id))
-
-    if q_banco:
-        query = query.filter(Deposito.banco == q_banco)
-    if q_forma:
-        query = query.filter(Deposito.forma_pago == q_forma)
-    if q_usuario:
-        # permite prefijos; si sólo quieres exacto, cambia por ==
-        query = query.filter(Deposito.numero_usuario.like(f"%{q_usuario}%"))
-
-    rows = query.order_by(Deposito.id.desc()).all()
-    data = [_serialize_dep_row(dep, fo) for dep, fo in rows]
-    return jsonify(data)
+    query = apply_filters(_dep_rows_query(D), filtros, D)
+    if after_id is not None:
+        query = query.filter(D.id < after_id)
+
+    rows = (query.order_by(D.id.desc())
+            .limit(limit)
+            .yield_per(PAGE_SIZE_DEFAULT))
+
+    ndjson = _wants_ndjson()
+    resp = Response(
+        stream_with_context(_stream_rows(rows, ndjson)),
+        mimetype="application/x-ndjson" if ndjson else "application/json",
+    )
+    resp.headers["X-Page-Limit"] = str(limit)
+    resp.headers["X-Watermark"] = str(cambios.watermark())  # para /api/depositos/changes
+    return resp
+
+
+# ---------------------------- API: cambios (poll del grid) ----------------------------
+@bp.get("/api/depositos/changes")
+def api_depositos_changes():
+    """Filas cambiadas/eliminadas desde ?since=<watermark> con los filtros del grid."""
+    if not _is_authed():
+        return abort(401)
+    try:
+        since = cambios.parse_since(request.args.get("since"))
+        filtros = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+
+    wm = cambios.watermark()  # antes de consultar: lo que cambie después sale en el próximo poll
+    if request.args.get("archivo") == "1":  # el archivo no se edita
+        return jsonify({"watermark": str(wm), "rows": [], "removed": []})
+    res = cambios.delta(_dep_rows_query(), since, filtros)
+    if res is None:
+        return jsonify({"reset": True, "watermark": str(wm)})
+    return jsonify({
+        "watermark": str(wm),
+        "rows": [_serialize_dep_row(r) for r in res["rows"]],
+        "removed": res["removed"],
+    })
+
+
+# ---------------------------- API: exportar (contabilidad) ----------------------------
+@bp.get("/api/depositos/export")
+def api_depositos_export():
+    """CSV (chunked, gzip si el cliente lo acepta) o XLSX con los filtros del grid."""
+    if not _is_authed():
+        return abort(401)
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        return jsonify({"error": "format debe ser csv o xlsx"}), 400
+    try:
+        args = export.periodo(request.args.get("dia"), request.args.get("mes"))
+        args.update(request.args.to_dict())
+        filtros = parse_filters(args)
+        D = _modelo()
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    rows = export.iter_rows(filtros, request.host_url, D)
+
+    if fmt == "xlsx":
+        try:
+            path = export.xlsx_tempfile(rows)
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 400
+        resp = Response(
+            export.iter_file(path),
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        resp.headers["Content-Length"] = str(os.path.getsize(path))
+        resp.headers["Content-Disposition"] = f'attachment; filename="depositos_{stamp}.xlsx"'
+        return resp
+
+    chunks = export.iter_csv(rows)
+    gzipped = "gzip" in (request.headers.get("Accept-Encoding") or "")
+    if gzipped:
+        chunks = export.gzip_chunks(chunks)
+    resp = Response(stream_with_context(chunks), mimetype="text/csv")
+    if gzipped:
+        resp.headers["Content-Encoding"] = "gzip"
+        resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Content-Disposition"] = f'attachment; filename="depositos_{stamp}.csv"'
+    return resp
 
 
 # ---------------------------- API: actualizar (edición real) ----------------------------
+EDITABLE_FIELDS = {
+    "fecha_operacion", "banco", "forma_pago", "producto",
+    "numero_usuario", "importe", "bbva_tipo", "folio",
+    "autorizacion", "referencia", "requiere_factura",
+    "estatus", "observaciones",
+    # si más adelante permites elegir explícitamente la opción fiscal:
+    # "factura_opcion_id",
+}
+
+# Campos que mueven el resumen diario (dimensiones + importe)
+RESUMEN_FIELDS = set(resumen.DIMS) | {"importe"}
+
+# Tope de cambios/ids por petición en las APIs bulk
+BULK_MAX = 5000
+
+
+def _normalize_field(field, value):
+    """Valida el campo y normaliza el valor (ValueError/InvalidOperation si no aplica)."""
+    if not isinstance(field, str) or field not in EDITABLE_FIELDS:
+        raise ValueError(f"Campo no editable: {field}")
+    # Sólo escalares JSON: bulk_update agrupa por (campo, valor) y una lista u
+    # objeto ni siquiera se puede usar como clave
+    if isinstance(value, (list, dict)):
+        raise ValueError(f"Valor inválido para {field}: se esperaba un valor simple")
+    # Normalizaciones de tipo
+    if field == "numero_usuario":
+        value = None if value in (None, "", "None") else int(value)
+    elif field == "requiere_factura":
+        value = True if value in (True, "true", "True", "1", 1, "on") else False
+    elif field == "importe":
+        # admite "145,00" o "145.00"
+        s = str(value or "0").replace(",", ".")
+        value = Decimal(s)
+    elif field == "fecha_operacion" and isinstance(value, str) and value:
+        value = date.fromisoformat(value)
+    # elif field == "factura_opcion_id":
+    #     value = None if not value else int(value)
+    return value
+
+
+def _parse_id(raw) -> int:
+    """Id de un depósito: entero JSON o texto de dígitos; 1.9, true o "1.0" no."""
+    if isinstance(raw, int) and not isinstance(raw, bool):
+        return raw
+    if isinstance(raw, str) and raw.strip().isdigit():
+        return int(raw)
+    raise ValueError(f"id inválido: {raw!r}")
+
+
+def _parse_ids(raw) -> list[int]:
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("Se esperaba una lista de ids.")
+    if len(raw) > BULK_MAX:
+        raise ValueError(f"Máximo {BULK_MAX} elementos por petición.")
+    return list(dict.fromkeys(_parse_id(i) for i in raw))
+
+
+def _missing_ids(ids: list[int]) -> list[int]:
+    found = {i for (i,) in db.session.query(Deposito.id).filter(Deposito.id.in_(ids))}
+    return [i for i in ids if i not in found]
+
+
 @bp.patch("/api/depositos/<int:dep_id>")
 def api_depositos_update(dep_id: int):
     if not _is_authed():
@@ -129,46 +339,91 @@ def api_depositos_update(dep_id: int):
 
     dep = Deposito.query.get_or_404(dep_id)
 
-    editable = {
-        "fecha_operacion", "banco", "forma_pago", "producto",
-        "numero_usuario", "importe", "bbva_tipo", "folio",
-        "autorizacion", "referencia", "requiere_factura",
-        "estatus", "observaciones",
-        # si más adelante permites elegir explícitamente la opción fiscal:
-        # "factura_opcion_id",
-    }
-    if field not in editable:
+    if not isinstance(field, str) or field not in EDITABLE_FIELDS:
         return jsonify({"error": f"Campo no editable: {field}"}), 400
 
     try:
-        # Normalizaciones de tipo
-        if field == "numero_usuario":
-            value = None if value in (None, "", "None") else int(value)
-        elif field == "requiere_factura":
-            value = True if value in (True, "true", "True", "1", 1, "on") else False
-        elif field == "importe":
-            # admite "145,00" o "145.00"
-            s = str(value or "0").replace(",", ".")
-            value = Decimal(s)
-        elif field == "fecha_operacion" and isinstance(value, str) and value:
-            value = date.fromisoformat(value)
-        # elif field == "factura_opcion_id":
-        #     value = None if not value else int(value)
-
+        value = _normalize_field(field, value)
+        antes = resumen.snapshot([dep.id]) if field in RESUMEN_FIELDS else None
         setattr(dep, field, value)
         dep.updated_at = datetime.utcnow()
+        if antes is not None:
+            db.session.flush()
+            resumen.aplicar(resumen.diff(antes, resumen.snapshot([dep.id])))
         db.session.commit()
         # Re-tráelo con join para regresar también la razón social
-        dep_refreshed, fo = (db.session.query(Deposito, FacturaOpcion)
-                             .outerjoin(FacturaOpcion, Deposito.factura_opcion_id == FacturaOpcion.id)
-                             .filter(Deposito.id == dep.id).one())
-        return jsonify(_serialize_dep_row(dep_refreshed, fo))
+        row = _dep_rows_query().filter(Deposito.id == dep.id).one()
+        return jsonify(_serialize_dep_row(row))
 
     except (SQLAlchemyError, ValueError, InvalidOperation) as e:
         db.session.rollback()
         return jsonify({"error": f"No se pudo guardar: {e}"}), 400
 
 
+@bp.post("/api/depositos/bulk_update")
+def api_depositos_bulk_update():
+    """
+    {"changes": [{"id": 1, "field": "estatus", "value": "conciliado"}, ...]}
+    Todo en una transacción: ids con los mismos cambios -> un UPDATE ... WHERE id IN;
+    el resto -> un executemany por PK. Regresa las filas refrescadas (una consulta).
+    """
+    if not _is_authed():
+        return abort(401)
+
+    payload = request.get_json(silent=True) or {}
+    changes = payload.get("changes")
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"error": "Se esperaba 'changes' con al menos un cambio."}), 400
+    if len(changes) > BULK_MAX:
+        return jsonify({"error": f"Máximo {BULK_MAX} cambios por petición."}), 400
+
+    # id -> {campo: valor normalizado}
+    per_id: dict[int, dict] = {}
+    try:
+        for ch in changes:
+            dep_id = _parse_id(ch.get("id"))
+            field = ch.get("field")
+            per_id.setdefault(dep_id, {})[field] = _normalize_field(field, ch.get("value"))
+    except (AttributeError, TypeError, ValueError, InvalidOperation) as e:
+        return jsonify({"error": f"Cambio inválido: {e}"}), 400
+
+    ids = list(per_id)
+    missing = _missing_ids(ids)
+    if missing:
+        return jsonify({"error": "No existen", "ids": missing}), 404
+
+    # Agrupa ids con exactamente los mismos cambios
+    groups: dict[tuple, list[int]] = {}
+    for dep_id, fields in per_id.items():
+        groups.setdefault(tuple(sorted(fields.items(), key=lambda kv: kv[0])), []).append(dep_id)
+
+    now = datetime.utcnow()
+    singles = []
+    toca_resumen = any(RESUMEN_FIELDS.intersection(f) for f in per_id.values())
+    try:
+        antes = resumen.snapshot(ids) if toca_resumen else None
+        for fields, group_ids in groups.items():
+            values = dict(fields, updated_at=now)
+            if len(group_ids) > 1:
+                db.session.execute(
+                    update(Deposito).where(Deposito.id.in_(group_ids)).values(**values),
+                    execution_options={"synchronize_session": False},
+                )
+            else:
+                singles.append(dict(values, id=group_ids[0]))
+        if singles:
+            db.session.execute(update(Deposito), singles)  # executemany por PK
+        if antes is not None:
+            resumen.aplicar(resumen.diff(antes, resumen.snapshot(ids)))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"No se pudo guardar: {e}"}), 400
+
+    rows = _dep_rows_query().filter(Deposito.id.in_(ids)).order_by(Deposito.id.desc())
+    return jsonify([_serialize_dep_row(r) for r in rows])
+
+
 # ---------------------------- API: eliminar (Supr) ----------------------------
 @bp.delete("/api/depositos/<int:dep_id>")
 def api_depositos_delete(dep_id: int):
@@ -176,7 +431,11 @@ def api_depositos_delete(dep_id: int):
         return abort(401)
     dep = Deposito.query.get_or_404(dep_id)
     try:
+        antes = resumen.snapshot([dep.id])
+        duplicados.soltar([dep.id])
         db.session.delete(dep)
+        cambios.registrar_borrados([dep.id])
+        resumen.aplicar(resumen.diff(antes))
         db.session.commit()
         return ("", 204)
     except SQLAlchemyError as e:
@@ -184,24 +443,209 @@ def api_depositos_delete(dep_id: int):
         return jsonify({"error": f"No se pudo eliminar: {e}"}), 400
 
 
+@bp.post("/api/depositos/bulk_delete")
+def api_depositos_bulk_delete():
+    """
+    {"ids": [1, 2, 3]} -> un solo DELETE ... WHERE id IN, en una transacción.
+    Como bulk_update: si algún id no existe no se borra nada (404).
+    """
+    if not _is_authed():
+        return abort(401)
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        ids = _parse_ids(payload.get("ids"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"ids inválidos: {e}"}), 400
+
+    missing = _missing_ids(ids)
+    if missing:
+        return jsonify({"error": "No existen", "ids": missing}), 404
+
+    try:
+        antes = resumen.snapshot(ids)
+        duplicados.soltar(ids)
+        res = db.session.execute(
+            delete(Deposito).where(Deposito.id.in_(ids)),
+            execution_options={"synchronize_session": False},
+        )
+        cambios.registrar_borrados(ids)
+        resumen.aplicar(resumen.diff(antes))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"No se pudo eliminar: {e}"}), 400
+    return jsonify({"deleted": res.rowcount, "ids": ids})
+
+
+# ---------------------------- Resumen / conciliación ----------------------------
+@bp.get("/resumen")
+def resumen_view():
+    if not _is_authed():
+        return redirect(url_for("admin.login"))
+    return render_template("admin/resumen.html", dims=resumen.DIMS)
+
+
+@bp.get("/api/resumen")
+def api_resumen():
+    """Totales (n, importe) desde resumen_diario; ?agrupar=banco,estatus + filtros."""
+    if not _is_authed():
+        return abort(401)
+    agrupar = [d for d in (request.args.get("agrupar") or ",".join(resumen.DIMS)).split(",") if d]
+    invalid = [d for d in agrupar if d not in resumen.DIMS]
+    if invalid:
+        return jsonify({"error": f"No se puede agrupar por: {', '.join(invalid)}"}), 400
+    try:
+        filtros = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+
+    data = []
+    for r in resumen.consultar(filtros, agrupar):
+        item = {d: getattr(r, d) for d in agrupar}
+        if "fecha_operacion" in item:
+            item["fecha_operacion"] = item["fecha_operacion"].isoformat()
+        item["n"] = int(r.n or 0)
+        item["total_importe"] = str(r.total_importe or "0.00")
+        data.append(item)
+    return jsonify(data)
+
+
+@bp.get("/conciliacion")
+def conciliacion_view():
+    if not _is_authed():
+        return redirect(url_for("admin.login"))
+    return render_template("admin/conciliacion.html", bancos=BANCOS,
+                           ventana=current_app.config["CONCILIACION_VENTANA_DIAS"])
+
+
+@bp.post("/api/conciliacion")
+def api_conciliacion():
+    """Estado de cuenta (multipart: banco, archivo, ventana, aplicar=0|1) -> reporte."""
+    if not _is_authed():
+        return abort(401)
+    archivo = request.files.get("archivo")
+    if not archivo or not archivo.filename:
+        return jsonify({"error": "Falta el estado de cuenta."}), 400
+    try:
+        ventana = int(request.form["ventana"]) if request.form.get("ventana") else None
+        reporte = conciliacion.conciliar(request.form.get("banco", ""), archivo.filename,
+                                         archivo.read(), ventana,
+                                         aplicar=request.form.get("aplicar") == "1")
+    except (ValueError, RuntimeError) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError:
+        db.session.rollback()
+        # error de la BD, no del archivo: al log con traceback, sin SQL en la respuesta
+        current_app.logger.exception("Conciliación de %s falló", archivo.filename)
+        return jsonify({"error": "No se pudo conciliar por un error de la base de datos."}), 500
+    return jsonify(reporte)
+
+
 # ---------------------------- Link de comprobante ----------------------------
 @bp.get("/comprobante/<int:comp_id>/link")
 def comprobante_link(comp_id: int):
     if not _is_authed():
         return abort(401)
     comp = Comprobante.query.get_or_404(comp_id)
+    if comp.storage_status in spool.EN_SPOOL:
+        flash("El comprobante aún se está subiendo al almacenamiento; intenta en unos segundos.", "warning")
+        return redirect(url_for("admin.registros"))
+    if comp.storage_status == "faltante":
+        # detectado por `flask storage scan`; no vale la pena preguntar al proveedor
+        flash("El comprobante no se encontró en el almacenamiento.", "danger")
+        return redirect(url_for("admin.registros"))
+    dbpool.soltar_conexion(comp)  # sin conexión retenida mientras responde el proveedor
     try:
-        storage = get_storage()
-        try:
-            url = storage.get_shared_link(comp.storage_path)  # permanente
-        except Exception:
-            url = storage.get_temporary_link(comp.storage_path)  # temporal
+        # shared_url persistido -> link temporal cacheado -> proveedor
+        url = linkcache.resolve_link(comp, get_storage())
         return redirect(url)
     except Exception as e:
         flash(f"No se pudo obtener enlace: {e}", "danger")
         return redirect(url_for("admin.registros"))
 
 
+@bp.get("/comprobante/<int:comp_id>/archivo")
+def comprobante_archivo(comp_id: int):
+    """
+    Bytes del comprobante desde la caché en disco (app/storage/diskcache.py);
+    en fallo se descargan del proveedor y quedan cacheados. Sin caché -> link.
+    """
+    if not _is_authed():
+        return abort(401)
+    comp = Comprobante.query.get_or_404(comp_id)
+    storage = get_storage()
+    if not hasattr(storage, "local_copy"):
+        return redirect(url_for("admin.comprobante_link", comp_id=comp_id))
+    etag = None
+    path = spool.spool_path(spool.spool_key_of(comp)) if comp.storage_status in spool.EN_SPOOL else None
+    if path is None or not os.path.exists(path):
+        if comp.storage_status == "faltante":
+            flash("El comprobante no se encontró en el almacenamiento.", "danger")
+            return redirect(url_for("admin.registros"))
+        dbpool.soltar_conexion(comp)  # sin conexión retenida si hay que ir al proveedor
+        try:
+            path = storage.local_copy(comp.storage_path, **diskcache.esperado(comp))
+        except Exception as e:
+            current_app.logger.warning("Comprobante #%s desde caché falló: %s", comp_id, e)
+            return redirect(url_for("admin.comprobante_link", comp_id=comp_id))
+        etag = os.path.basename(path)  # sha256 de los bytes servidos
+    return send_file(
+        path,
+        mimetype=comp.mime,
+        download_name=comp.file_name,
+        conditional=True,
+        etag=etag or False,
+        max_age=0 if etag is None else 3600,
+    )
+
+
+@bp.get("/comprobante/<int:comp_id>/preview")
+def comprobante_preview(comp_id: int):
+    """Miniatura JPEG para el grid; inmutable por contenido -> caché larga."""
+    if not _is_authed():
+        return abort(401)
+    comp = Comprobante.query.get_or_404(comp_id)
+    path = miniaturas.buscar(comp)  # si falta, se genera en segundo plano
+    if path is None:
+        resp = Response(status=404)
+        resp.headers["Cache-Control"] = "no-store"  # aún se está subiendo o generando, o no hay miniatura
+        return resp
+    resp = send_file(path, mimetype="image/jpeg", conditional=True,
+                     etag=comp.checksum_sha256, max_age=31536000)
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
+
+
+# ---------------------------- Archivos locales (STORAGE_PROVIDER=local) ----------------------------
+@bp.get("/files/<path:storage_path>")
+def storage_file(storage_path: str):
+    """Sirve el comprobante desde disco: Range/206, ETag (la clave) y 304."""
+    if not _is_authed():
+        return abort(401)
+    storage = get_storage()
+    if not getattr(storage, "serves_locally", False):
+        return abort(404)
+    comp = Comprobante.query.filter(Comprobante.storage_path == storage_path).first_or_404()
+    try:
+        path = storage.local_path(storage_path)
+    except ValueError:
+        return abort(404)
+    if not os.path.exists(path):
+        return abort(404)
+    return send_file(
+        path,
+        mimetype=comp.mime,
+        download_name=comp.file_name,
+        conditional=True,
+        # El objeto de una clave no cambia. checksum_sha256 no sirve: en las
+        # fotos es el del archivo recibido, no el de la versión normalizada
+        etag=os.path.basename(storage_path),
+        max_age=3600,
+    )
+
+
 # ---------------------------- Fiscales (gestión de razones sociales) ----------------------------
 @bp.route("/fiscales", methods=["GET", "POST"])
 def fiscales():
@@ -235,6 +679,7 @@ def fiscales():
             fo = FacturaOpcion(numero_usuario=int(nu), titulo=titulo, rfc=rfc, email=email)
             db.session.add(fo)
             db.session.commit()
+            facturas.invalidar(fo.numero_usuario)
             flash("Opción fiscal guardada.", "success")
             return redirect(url_for("admin.fiscales", numero_usuario=nu))
 
@@ -254,6 +699,7 @@ def fiscales_update(oid: int):
         fo.rfc = rfc
     fo.email = (request.form.get("email") or "").strip()
     db.session.commit()
+    facturas.invalidar(fo.numero_usuario)
     flash("Opción actualizada.", "success")
     return redirect(url_for("admin.fiscales", numero_usuario=fo.numero_usuario))
 
@@ -266,6 +712,7 @@ def fiscales_delete(oid: int):
     nu = fo.numero_usuario
     db.session.delete(fo)
     db.session.commit()
+    facturas.invalidar(nu)
     flash("Opción eliminada.", "success")
     return redirect(url_for("admin.fiscales", numero_usuario=nu))
 
@@ -282,3 +729,10 @@ def debug_db():
         "count": db.session.query(Deposito).count()
     }
     return jsonify(info)
+
+
+@bp.get("/debug/pool")
+def debug_pool():
+    if not _is_authed():
+        return abort(401)
+    return jsonify(dbpool.pool_stats(db.engine))
@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from decimal import Decimal
 from datetime import datetime
-import hashlib, os
+from uuid import uuid4
+import os
+
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from ..extensions import db
-from ..models import FacturaOpcion, Deposito, Comprobante, BANCOS, FORMAS, PRODUCTOS
-from ..storage.base import get_storage
+from ..models import Deposito, Comprobante, BANCOS, FORMAS, PRODUCTOS
+from ..storage.base import get_storage, make_storage_name
+from ..storage import spool, cas
+from .. import resumen, duplicados, imagenes, facturas, metricas, miniaturas
 
 bp = Blueprint("public", __name__)
 
@@ -14,7 +19,7 @@ def healthz():
     # no toca DB ni Dropbox; responde instantáneo
     return "ok", 200
 
-def _validate(form, has_file: bool):
+def _validate(form, has_file: bool, opciones: list | None = None):
     errors = []
 
     if form.get("banco") not in BANCOS: errors.append("Banco inválido.")
@@ -56,12 +61,11 @@ def _validate(form, has_file: bool):
     if not has_file:
         errors.append("Comprobante es obligatorio (JPG/PNG/PDF).")
 
-    # lógica de factura:
+    # lógica de factura (opciones ya consultadas por el llamador):
     req = form.get("requiere_factura") == "on"
-    if req and nu.isdigit() and len(nu)==5:
-        count = FacturaOpcion.query.filter_by(numero_usuario=int(nu)).count()
+    if req and opciones is not None:
         # si HAY opciones y no seleccionó una -> error
-        if count>0 and not form.get("factura_opcion_id"):
+        if opciones and not form.get("factura_opcion_id"):
             errors.append("Selecciona una opción de facturación.")
         # si NO hay opciones -> se ignora en el POST (no error)
 
@@ -77,65 +81,133 @@ def registro():
         form = request.form
         file = request.files.get("comprobante")
 
-        errors = _validate(form, has_file=bool(file and file.filename))
+        # Una sola consulta (cacheada) de opciones de factura para validar e insertar
+        nu = (form.get("numero_usuario") or "").strip()
+        opciones = None
+        if form.get("requiere_factura") == "on" and nu.isdigit() and len(nu) == 5:
+            opciones = facturas.opciones(int(nu))
+
+        errors = _validate(form, has_file=bool(file and file.filename), opciones=opciones)
         if errors:
             for e in errors: flash(e, "danger")
             return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS)
 
-        raw = file.read()
-        storage = get_storage()
-        storage_path = storage.upload(file.filename, raw)
+        # El archivo se copia al spool por trozos (hash y validación al vuelo)
+        try:
+            with metricas.medir("recv"):  # copia al spool + SHA-256
+                rec = spool.receive(file.stream)
+        except ValueError as e:
+            flash(str(e), "danger")
+            return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS)
+        try:
+            return _registrar(form, file.filename, rec, opciones)
+        finally:
+            rec.discard()  # no-op si ya se movió a su ruta definitiva
+
+    return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS)
+
+def _registrar(form, filename: str, rec: spool.Received, opciones: list | None):
+    checksum = rec.checksum
+    fecha = datetime.strptime(form["fecha_operacion"], "%Y-%m-%d").date()
+    refs = duplicados.referencias(form)
+
+    # Duplicados: se revisan antes de subir nada al almacenamiento
+    dup_id = duplicados.por_checksum(checksum)
+    if dup_id and current_app.config["DUPLICADOS_RECHAZAR_EXACTOS"]:
+        flash("Este comprobante ya fue registrado anteriormente.", "danger")
+        return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS)
+    dup_id = dup_id or duplicados.por_referencia(form["banco"], fecha, refs)
+
+    # Mismo archivo ya almacenado -> se reutiliza sin volver a subirlo
+    comp = duplicados.comprobante_existente(checksum)
+    storage_status = None
+    if comp is None:
+        # Fotos: se guardan normalizadas (app/imagenes.py); la clave lleva la extensión final
+        mime, size = rec.mime, rec.size
+        normalizar = imagenes.aplica(mime)
+        if normalizar:
+            ext, mime = imagenes.destino()
+            storage_path = make_storage_name(os.path.splitext(filename)[0] + ext, checksum)
+        else:
+            storage_path = make_storage_name(filename, checksum)
+        comp_uuid = uuid4()
+        key = spool.spool_key(comp_uuid, storage_path)
+
+        if cas.is_stored(storage_path):
+            storage_status = "operativo"  # mismo contenido ya en el proveedor
+        elif current_app.config["UPLOAD_ASYNC"]:
+            # Sólo disco local aquí; la cola normaliza y sube al proveedor después del commit
+            spool.commit_received(rec, key, normalizar)
+            storage_status = "pendiente"
+        else:
+            path = spool.commit_received(rec, key, normalizar)
+            if normalizar:
+                mime = spool.preparar(key)
+                path = spool.spool_path(key)
+                size = os.path.getsize(path)
+            try:
+                with open(path, "rb") as fh:
+                    get_storage().put(storage_path, fh)
+                miniaturas.desde_archivo(path, mime, checksum)  # mientras el archivo sigue en disco
+            finally:
+                os.remove(path)
+            storage_status = "operativo"
 
-        sha = hashlib.sha256(); sha.update(raw); checksum = sha.hexdigest()
         comp = Comprobante(
-            uuid=os.path.splitext(storage_path)[0],
-            file_name=file.filename, mime=file.mimetype, size=len(raw),
-            checksum_sha256=checksum, storage_path=storage_path, storage_status="operativo"
+            uuid=comp_uuid,
+            file_name=filename, mime=mime, size=size,
+            checksum_sha256=checksum, storage_path=storage_path, storage_status=storage_status
         )
         db.session.add(comp); db.session.flush()
 
-        # Normalización de factura (ignora si no hay opciones)
-        nu_int = int(form["numero_usuario"])
-        requiere_factura = (form.get("requiere_factura") == "on")
-        factura_opcion_id = int(form["factura_opcion_id"]) if form.get("factura_opcion_id") else None
-        if requiere_factura and not factura_opcion_id:
-            if FacturaOpcion.query.filter_by(numero_usuario=nu_int).count() == 0:
-                requiere_factura = False
-
-        d = Deposito(
-            banco=form["banco"],
-            forma_pago=form["forma_pago"],
-            producto=form["producto"],
-            fecha_operacion=datetime.strptime(form["fecha_operacion"], "%Y-%m-%d").date(),
-            numero_usuario=nu_int,
-            importe=Decimal(form["importe"]),
-            observaciones=(form.get("observaciones") or "").strip(),
-            requiere_factura=requiere_factura,
-            factura_opcion_id=factura_opcion_id if requiere_factura else None,
-            comprobante_id=comp.id,
-            estatus="registrado"
-        )
-
-        if d.banco=="BBVA" and d.forma_pago=="Deposito":
-            t = form["bbva_tipo"]; d.bbva_tipo = t
-            if t=="practicaja":
-                d.folio = form["folio_practicaja"]
-                d.autorizacion = form["autorizacion"]
-            else:
-                d.folio = form["folio_movimiento"]
-        else:
-            d.referencia = form["folio_unico"]
-
-        db.session.add(d); db.session.commit()
-        flash("Registro capturado correctamente.", "success")
-        return redirect(url_for("public.registro"))
+    # Normalización de factura (ignora si no hay opciones)
+    nu_int = int(form["numero_usuario"])
+    requiere_factura = (form.get("requiere_factura") == "on")
+    factura_opcion_id = int(form["factura_opcion_id"]) if form.get("factura_opcion_id") else None
+    if requiere_factura and not factura_opcion_id and not opciones:
+        requiere_factura = False
+
+    d = Deposito(
+        banco=form["banco"],
+        forma_pago=form["forma_pago"],
+        producto=form["producto"],
+        fecha_operacion=fecha,
+        numero_usuario=nu_int,
+        importe=Decimal(form["importe"]),
+        observaciones=(form.get("observaciones") or "").strip(),
+        requiere_factura=requiere_factura,
+        factura_opcion_id=factura_opcion_id if requiere_factura else None,
+        comprobante_id=comp.id,
+        estatus="registrado",
+        duplicado_de_id=dup_id,
+        **refs,
+    )
+
+    db.session.add(d)
+    resumen.aplicar(resumen.diff(despues=[(resumen.key_of(d), d.importe)]))
+    db.session.commit()
+    if storage_status == "pendiente":
+        spool.enqueue(comp.id)
+    flash("Registro capturado correctamente.", "success")
+    return redirect(url_for("public.registro"))
 
-    return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS)
+@bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    # MAX_CONTENT_LENGTH: Werkzeug corta antes de leer el cuerpo
+    if request.endpoint == "public.registro":
+        mb = current_app.config["UPLOAD_MAX_BYTES"] // (1024 * 1024)
+        flash(f"El comprobante excede {mb} MB.", "danger")
+        return render_template("registro.html", bancos=BANCOS, formas=FORMAS, productos=PRODUCTOS), 413
+    return e
 
 @bp.get("/api/opciones_factura")
 def api_opciones_factura():
     nu = request.args.get("numero_usuario", "")
     if not (nu.isdigit() and len(nu)==5):
         return jsonify([])
-    rows = FacturaOpcion.query.filter(FacturaOpcion.numero_usuario==int(nu)).all()
-    return jsonify([{"id":r.id,"titulo":r.titulo,"rfc":r.rfc,"email":r.email} for r in rows])
+    payload = facturas.opciones_json(int(nu))
+    resp = current_app.response_class(payload, mimetype="application/json")
+    # El navegador revalida siempre; si no cambió, 304 sin cuerpo
+    resp.set_etag(facturas.etag(payload))
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
@@ -0,0 +1,176 @@
+# app/search.py
+"""
+Filtros del grid de depósitos (y de todo lo que reutiliza sus criterios).
+
+Cada filtro se traduce a un predicado que puede resolver un índice:
+  numero_usuario  5 dígitos -> igualdad; 1-4 dígitos -> rango del prefijo
+                  ("12" -> 12000..12999), nunca LIKE sobre el entero
+  fecha_desde/hasta  rango sobre fecha_operacion
+  estatus         igualdad (idx_depositos_estado_fecha)
+  importe_min/max rango sobre importe
+  q               prefijo sobre referencia o folio (índices *_pattern_ops)
+  banco/forma_pago igualdad (idx_depositos_banco_forma)
+  producto        igualdad (idx_depositos_producto_fecha)
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import or_, text
+
+from .extensions import db
+from .models import Deposito
+
+USUARIO_DIGITS = 5
+
+
+def usuario_range(prefix: str) -> tuple[int, int]:
+    """Rango [lo, hi] de números de 5 dígitos que empiezan con `prefix`."""
+    scale = 10 ** (USUARIO_DIGITS - len(prefix))
+    lo = int(prefix) * scale
+    return lo, lo + scale - 1
+
+
+def _like_prefix(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _decimal(value: str) -> Decimal:
+    return Decimal(value.replace(",", "."))
+
+
+def parse_filters(args) -> dict:
+    """request.args (o dict) -> filtros normalizados. ValueError si algo es inválido."""
+    get = lambda k: (args.get(k) or "").strip()  # noqa: E731
+    f = {}
+
+    if get("banco"):
+        f["banco"] = get("banco")
+    if get("forma_pago"):
+        f["forma_pago"] = get("forma_pago")
+    if get("producto"):
+        f["producto"] = get("producto")
+    if get("estatus"):
+        f["estatus"] = get("estatus")
+
+    nu = get("numero_usuario")
+    if nu:
+        if not (nu.isdigit() and len(nu) <= USUARIO_DIGITS):
+            raise ValueError("numero_usuario: hasta 5 dígitos.")
+        f["numero_usuario"] = nu
+
+    try:
+        if get("fecha_desde"):
+            f["fecha_desde"] = date.fromisoformat(get("fecha_desde"))
+        if get("fecha_hasta"):
+            f["fecha_hasta"] = date.fromisoformat(get("fecha_hasta"))
+    except ValueError:
+        raise ValueError("Fecha inválida (YYYY-MM-DD).")
+
+    try:
+        if get("importe_min"):
+            f["importe_min"] = _decimal(get("importe_min"))
+        if get("importe_max"):
+            f["importe_max"] = _decimal(get("importe_max"))
+    except InvalidOperation:
+        raise ValueError("Importe inválido.")
+
+    if get("q"):
+        f["q"] = get("q")
+    return f
+
+
+def apply_filters(query, f: dict, modelo=Deposito):
+    """Agrega a `query` los predicados de `f` (sobre `modelo`: Deposito o DepositoArchivo)."""
+    if "banco" in f:
+        query = query.filter(modelo.banco == f["banco"])
+    if "forma_pago" in f:
+        query = query.filter(modelo.forma_pago == f["forma_pago"])
+    if "producto" in f:
+        query = query.filter(modelo.producto == f["producto"])
+    if "estatus" in f:
+        query = query.filter(modelo.estatus == f["estatus"])
+
+    nu = f.get("numero_usuario")
+    if nu:
+        if len(nu) == USUARIO_DIGITS:
+            query = query.filter(modelo.numero_usuario == int(nu))
+        else:
+            lo, hi = usuario_range(nu)
+            query = query.filter(modelo.numero_usuario.between(lo, hi))
+
+    if "fecha_desde" in f:
+        query = query.filter(modelo.fecha_operacion >= f["fecha_desde"])
+    if "fecha_hasta" in f:
+        query = query.filter(modelo.fecha_operacion <= f["fecha_hasta"])
+    if "importe_min" in f:
+        query = query.filter(modelo.importe >= f["importe_min"])
+    if "importe_max" in f:
+        query = query.filter(modelo.importe <= f["importe_max"])
+
+    if f.get("q"):
+        pattern = _like_prefix(f["q"])
+        query = query.filter(or_(modelo.referencia.like(pattern, escape="\\"),
+                                 modelo.folio.like(pattern, escape="\\")))
+    return query
+
+
+# ---------------------------- CLI: EXPLAIN ----------------------------
+cli = AppGroup("search", help="Herramientas del buscador de depósitos.")
+
+# Un caso por ruta de filtrado; todos deben resolverse con índice.
+# (En SQLite el LIKE no distingue mayúsculas y no usa el índice de `q`;
+#  la verificación que importa es contra Postgres.)
+EXPLAIN_CASES = {
+    "usuario_exacto": {"numero_usuario": "12345"},
+    "usuario_prefijo": {"numero_usuario": "12"},
+    "fecha_rango": {"fecha_desde": "2024-01-01", "fecha_hasta": "2024-01-31"},
+    "estatus": {"estatus": "registrado"},
+    "importe_rango": {"importe_min": "100", "importe_max": "200"},
+    "texto_referencia_folio": {"q": "ABC"},
+    "banco_forma": {"banco": "BBVA", "forma_pago": "Deposito"},
+    "producto": {"producto": "TAE"},
+}
+
+
+def explain_plan(query) -> str:
+    """Plan de ejecución (texto) de una consulta ORM en el dialecto actual."""
+    stmt = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == "postgresql":
+            # Sin seq scan "gratis": si no hay índice aplicable el plan lo delata
+            conn.execute(text("SET enable_seqscan = off"))
+            rows = conn.execute(text(f"EXPLAIN {stmt}")).all()
+            return "\n".join(r[0] for r in rows)
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {stmt}")).all()
+        return "\n".join(str(r[-1]) for r in rows)
+
+
+def plan_uses_index(plan: str) -> bool:
+    # PG: "Index Cond" (index/bitmap scan guiado por el filtro);
+    # SQLite: "SEARCH ... USING INDEX" (un SCAN completo no cuenta)
+    return "Index Cond" in plan or ("SEARCH" in plan and "INDEX" in plan)
+
+
+@cli.command("explain")
+@click.option("--verbose", "-v", is_flag=True, help="Imprime el plan completo.")
+def explain_cmd(verbose: bool):
+    """Verifica con EXPLAIN que cada filtro del grid usa un índice."""
+    failed = []
+    for name, args in EXPLAIN_CASES.items():
+        q = apply_filters(db.session.query(Deposito.id), parse_filters(args))
+        plan = explain_plan(q)
+        ok = plan_uses_index(plan)
+        click.echo(f"{'OK ' if ok else 'SEQ'} {name}")
+        if verbose or not ok:
+            click.echo("    " + plan.replace("\n", "\n    "))
+        if not ok:
+            failed.append(name)
+    if failed:
+        raise click.ClickException(f"Filtros sin índice: {', '.join(failed)}")
+
+
+def init_app(app):
+    app.cli.add_command(cli)
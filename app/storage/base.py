@@ -1,14 +1,50 @@
 import os
+import threading
+import uuid
 from flask import current_app
 
+_lock = threading.Lock()
+
+
+def make_storage_name(filename: str, checksum: str | None = None) -> str:
+    """
+    Nombre/clave nuevo para un comprobante:
+      - direccionado por contenido (STORAGE_CONTENT_ADDRESSED): sha256/ab/<sha256><ext>,
+        con el sha256 del archivo RECIBIDO (para fotos normalizadas no es el de
+        lo guardado; `ext` sí es la final)
+      - si no: <uuid4><ext>
+    """
+    ext = os.path.splitext(filename)[1] or ".bin"
+    if checksum and current_app.config.get("STORAGE_CONTENT_ADDRESSED"):
+        return f"sha256/{checksum[:2]}/{checksum}{ext.lower()}"
+    return f"{uuid.uuid4()}{ext}"
+
+
 def get_storage():
-    provider = current_app.config.get("STORAGE_PROVIDER", "dropbox")
+    """Proveedor compartido por app (thread-safe); se construye una sola vez."""
+    app = current_app._get_current_object()
+    provider = app.extensions.get("storage")
+    if provider is None:
+        with _lock:
+            provider = app.extensions.get("storage")
+            if provider is None:
+                provider = app.extensions["storage"] = _build_provider(app)
+    return provider
+
+
+def _build_provider(app):
+    from ..metricas import instrumentar
+    from .diskcache import envolver
+
+    provider = app.config.get("STORAGE_PROVIDER", "dropbox")
     if provider == "dropbox":
         from . import dropboxfs as mod
-        return mod.Provider(current_app)
     elif provider == "local":
-        # Si luego agregas un localfs.py, cámbialo aquí.
-        from . import dropboxfs as mod
-        return mod.Provider(current_app)
+        from . import localfs as mod
+    elif provider == "memory":
+        from . import memfs as mod  # benchmarks/pruebas
     else:
         raise RuntimeError(f"Proveedor no soportado: {provider}")
+    # Proxy con tiempos/errores por operación (ver app/metricas.py); la caché en
+    # disco va por fuera para que storage_calls_total cuente sólo lo que sale a la red
+    return envolver(instrumentar(mod.Provider(app), provider), app)
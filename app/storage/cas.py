@@ -0,0 +1,118 @@
+# app/storage/cas.py
+"""
+Almacenamiento direccionado por contenido (STORAGE_CONTENT_ADDRESSED).
+
+La clave de cada objeto es el SHA-256 del archivo recibido más la extensión
+final (ver base.make_storage_name), así que varias filas de Comprobante pueden
+apuntar al mismo objeto. Ojo: en las fotos normalizadas (app/imagenes.py) no
+es el hash de los bytes guardados. La normalización es determinista para una
+misma config, y el scan (content_hash) y la caché en disco verifican el
+objeto real. El conteo de
+referencias se obtiene de la BD (idx_comprobantes_storage_path):
+  - antes de transferir: si ya hay un Comprobante operativo con esa clave, no se sube;
+  - `flask storage gc`: borra comprobantes sin depósito (ni en archivo.depositos)
+    y, de los objetos que quedan sin ninguna referencia, el archivo en el
+    proveedor y en el spool.
+"""
+import os
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from .. import particiones
+from ..extensions import db
+from ..models import Comprobante, Deposito
+
+
+def is_stored(storage_path: str) -> bool:
+    """
+    ¿Ya hay un objeto operativo con esta clave? (consulta local, sin API).
+    Sólo "operativo": un "pendiente" aún no llega al proveedor y un "faltante"
+    ya no está, así que en ambos casos hay que subirlo.
+    """
+    return db.session.query(
+        db.session.query(Comprobante.id)
+        .filter(Comprobante.storage_path == storage_path,
+                Comprobante.storage_status == "operativo")
+        .exists()
+    ).scalar()
+
+
+def ref_counts(paths) -> dict[str, int]:
+    """storage_path -> número de comprobantes que lo referencian."""
+    if not paths:
+        return {}
+    rows = (db.session.query(Comprobante.storage_path, func.count(Comprobante.id))
+            .filter(Comprobante.storage_path.in_(list(paths)))
+            .group_by(Comprobante.storage_path))
+    return dict(rows.all())
+
+
+def orphan_comprobantes(limit: int):
+    """Comprobantes que ya no usa ningún depósito (y que no están a media subida)."""
+    sin_deposito = ~db.session.query(Deposito.id).filter(Deposito.comprobante_id == Comprobante.id).exists()
+    q = Comprobante.query.filter(sin_deposito, Comprobante.storage_status.notin_(("pendiente", "subiendo")))
+    if particiones.hay_archivo():
+        arch = particiones.DepositoArchivo
+        q = q.filter(~db.session.query(arch.id).filter(arch.comprobante_id == Comprobante.id).exists())
+    return (q
+            .order_by(Comprobante.id)
+            .limit(limit)
+            .all())
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("storage", help="Mantenimiento del almacenamiento de comprobantes.")
+
+
+@cli.command("gc")
+@click.option("--dry-run", is_flag=True, help="Sólo muestra lo que se borraría.")
+@click.option("--batch", default=500, show_default=True, help="Comprobantes por lote.")
+def gc_cmd(dry_run: bool, batch: int):
+    """Borra comprobantes huérfanos y los objetos que quedan sin referencias."""
+    from .base import get_storage
+    from .spool import original_path, spool_key_of, spool_path
+
+    storage = None
+    total_rows = total_objs = 0
+    while True:
+        comps = orphan_comprobantes(batch)
+        if not comps:
+            break
+        paths = {c.storage_path for c in comps}
+        total_rows += len(comps)
+        if dry_run:
+            for c in comps:
+                click.echo(f"comprobante #{c.id} {c.storage_path}")
+            break
+
+        # Spool de cada fila ("error" conserva su archivo); nombrado por uuid
+        keys = [spool_key_of(c) for c in comps]
+        for c in comps:
+            db.session.delete(c)
+        db.session.flush()
+
+        # Objetos que ya no referencia nadie; se borran después del commit
+        # (si algo falla queda un objeto huérfano, nunca una fila sin objeto)
+        quedan = ref_counts(paths)
+        sin_refs = sorted(p for p in paths if not quedan.get(p))
+        db.session.commit()
+        for key in keys:
+            for p in (spool_path(key), original_path(key)):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+        for path in sin_refs:
+            storage = storage or get_storage()
+            storage.delete(path)
+            total_objs += 1
+
+    verb = "se borrarían" if dry_run else "borrados"
+    click.echo(f"OK: {total_rows} comprobantes {verb}; {total_objs} objetos eliminados del proveedor.")
+
+
+def init_app(app):
+    from . import integridad  # noqa: F401  (registra `flask storage scan`)
+    app.cli.add_command(cli)
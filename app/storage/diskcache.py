@@ -0,0 +1,329 @@
+# app/storage/diskcache.py
+"""
+Caché en disco de los bytes de comprobantes, delante de cualquier proveedor.
+
+Con STORAGE_CACHE_MAX_MB > 0 get_storage() envuelve al proveedor (salvo
+STORAGE_PROVIDER=local, que ya está en disco):
+  - write-through: upload/put guardan también la copia local, así que abrir un
+    comprobante recién subido no sale a la red;
+  - download sirve la copia si existe; si no, descarga una vez y la guarda;
+  - delete borra ambas.
+
+Cada entrada vive en STORAGE_CACHE_DIR/<hh>/<h>/<sha256 del contenido>, con
+h = sha256(storage_path). El nombre del archivo es su checksum y cada lectura
+lo verifica: una copia truncada o corrupta se descarta y cuenta como fallo.
+
+Eso sólo prueba que el disco no cambió. Lo que baja del proveedor además se
+compara, antes de guardarlo, con valores que salen de la BD (esperado(comp)):
+el tamaño, el content_hash de Dropbox si el scan ya lo llenó y, si no es una
+foto, comp.checksum_sha256. Las fotos se normalizan antes de subirlas, así que
+su checksum es el del archivo recibido y no el del guardado. Una descarga que
+no coincide no se guarda (ValueError y storage_cache_total{result=corrupt}).
+
+LRU por mtime: cada acierto lo toca; al pasar el tope se borran las entradas
+más viejas hasta quedar en PODA_A del tope. Varios workers pueden compartir el
+directorio: el disco es la fuente de verdad y la poda lo vuelve a escanear.
+
+Métricas: storage_cache_total{result=hit|miss|corrupt},
+storage_cache_evictions_total y el gauge storage_cache_bytes.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import current_app
+
+from ..metricas import registro
+
+CHUNK_SIZE = 256 * 1024
+BLOQUE_DROPBOX = 4 * 1024 * 1024  # content_hash de Dropbox: sha256 por bloque
+PODA_A = 0.9  # tras podar queda ocupado este tanto del tope
+
+
+def activa(app=None) -> bool:
+    app = app or current_app
+    return (app.config.get("STORAGE_CACHE_MAX_MB", 0) > 0
+            and app.config.get("STORAGE_PROVIDER", "dropbox") != "local")
+
+
+def _sha256_file(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _remove(path: str) -> int:
+    """Borra `path` si existe; regresa los bytes liberados."""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
+
+
+def esperado(comp) -> dict:
+    """Valores de la BD contra los que se verifica la descarga de `comp` (ver fill)."""
+    from .. import imagenes
+
+    exp = {"size": comp.size, "content_hash": comp.content_hash}
+    fotos = set(imagenes.MIMES_ENTRADA) | {mime for _, mime in imagenes.FORMATOS.values()}
+    if comp.mime not in fotos:
+        exp["sha256"] = comp.checksum_sha256  # se guardó tal cual se recibió
+    return exp
+
+
+class _Hashing:
+    """Archivo de escritura que calcula SHA-256 y tamaño al vuelo (y el content_hash de Dropbox)."""
+
+    def __init__(self, fh, dropbox: bool = False):
+        self._fh = fh
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self._bloques = [] if dropbox else None
+        self._bloque = hashlib.sha256()
+        self._en_bloque = 0
+
+    def write(self, chunk) -> int:
+        self.sha.update(chunk)
+        self.size += len(chunk)
+        if self._bloques is not None:
+            self._dropbox(memoryview(chunk))
+        return self._fh.write(chunk)
+
+    def _dropbox(self, data: memoryview) -> None:
+        while data:
+            n = min(len(data), BLOQUE_DROPBOX - self._en_bloque)
+            self._bloque.update(data[:n])
+            self._en_bloque += n
+            data = data[n:]
+            if self._en_bloque == BLOQUE_DROPBOX:
+                self._bloques.append(self._bloque.digest())
+                self._bloque, self._en_bloque = hashlib.sha256(), 0
+
+    def content_hash(self) -> str:
+        """sha256 de la concatenación de los sha256 de cada bloque de 4 MiB."""
+        bloques = self._bloques + ([self._bloque.digest()] if self._en_bloque else [])
+        return hashlib.sha256(b"".join(bloques)).hexdigest()
+
+
+class DiskCache:
+    """Directorio de copias verificadas por SHA-256 con tope de tamaño (LRU)."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.dir = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.size_bytes = sum(size for _, size, _ in self._entries())
+
+    # --- entradas ---
+    def _entry_dir(self, key: str) -> str:
+        h = hashlib.sha256(key.lstrip("/").encode()).hexdigest()
+        return os.path.join(self.dir, h[:2], h)
+
+    @staticmethod
+    def _files(entry_dir: str) -> list[str]:
+        try:
+            return [os.path.join(entry_dir, n) for n in os.listdir(entry_dir) if not n.startswith(".")]
+        except FileNotFoundError:
+            return []
+
+    def _entries(self):
+        """(mtime, tamaño, ruta) de cada copia en disco."""
+        for root, _dirs, files in os.walk(self.dir):
+            for n in files:
+                if n.startswith("."):
+                    continue
+                path = os.path.join(root, n)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # la borró otro proceso
+                yield st.st_mtime, st.st_size, path
+
+    # --- lectura ---
+    def path(self, key: str, size: int | None = None, sha256: str | None = None,
+             content_hash: str | None = None) -> str | None:
+        """
+        Ruta de la copia verificada de `key` (la marca como usada) o None.
+        Con `size`/`sha256` se descarta también una copia que no les corresponde
+        (`content_hash` se revisa en fill, al descargar).
+        """
+        for path in self._files(self._entry_dir(key)):
+            try:
+                ok = (_sha256_file(path) == os.path.basename(path)
+                      and sha256 in (None, os.path.basename(path))
+                      and size in (None, os.path.getsize(path)))
+            except FileNotFoundError:
+                continue
+            if not ok:
+                self._liberar(_remove(path))
+                registro.inc("storage_cache_total", {"result": "corrupt"})
+                continue
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            registro.inc("storage_cache_total", {"result": "hit"})
+            return path
+        registro.inc("storage_cache_total", {"result": "miss"})
+        return None
+
+    # --- escritura ---
+    def put_stream(self, key: str, fh) -> str:
+        """Copia `fh` a la caché (tmp + rename); regresa la ruta de la copia."""
+        return self.fill(key, lambda out: shutil.copyfileobj(fh, out, CHUNK_SIZE))
+
+    def fill(self, key: str, writer, size: int | None = None, sha256: str | None = None,
+             content_hash: str | None = None) -> str:
+        """
+        `writer(fh)` escribe el contenido (p.ej. provider.download); se guarda al
+        terminar, sólo si coincide con `size`, `sha256` y `content_hash` (los que
+        vengan). Si no, ValueError y no queda nada en la caché.
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=entry_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                hashing = _Hashing(out, dropbox=content_hash is not None)
+                writer(hashing)
+            sha = hashing.sha.hexdigest()
+            for campo, valor, medido in (("tamaño", size, hashing.size), ("sha256", sha256, sha),
+                                         ("content_hash", content_hash, content_hash and hashing.content_hash())):
+                if valor is not None and valor != medido:
+                    registro.inc("storage_cache_total", {"result": "corrupt"})
+                    raise ValueError(f"La descarga de {key} no coincide ({campo}: {medido} != {valor})")
+            dst = os.path.join(entry_dir, sha)
+            liberados = sum(_remove(p) for p in self._files(entry_dir))
+            os.replace(tmp, dst)
+        except BaseException:
+            _remove(tmp)
+            raise
+        with self._lock:
+            self.size_bytes += hashing.size - liberados
+            lleno = self.size_bytes > self.max_bytes
+        if lleno:
+            self.podar()
+        return dst
+
+    def discard(self, key: str) -> None:
+        entry_dir = self._entry_dir(key)
+        self._liberar(sum(_remove(p) for p in self._files(entry_dir)))
+        try:
+            os.rmdir(entry_dir)
+        except OSError:
+            pass
+
+    def _liberar(self, n: int) -> None:
+        if n:
+            with self._lock:
+                self.size_bytes -= n
+
+    # --- LRU ---
+    def podar(self) -> int:
+        """Borra las copias menos usadas hasta quedar en PODA_A del tope; regresa cuántas."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            borradas = 0
+            if total > self.max_bytes:
+                meta = self.max_bytes * PODA_A
+                for _mtime, size, path in entries:
+                    if total <= meta:
+                        break
+                    if _remove(path):
+                        total -= size
+                        borradas += 1
+                        try:
+                            os.rmdir(os.path.dirname(path))
+                        except OSError:
+                            pass
+            self.size_bytes = total
+        if borradas:
+            registro.inc("storage_cache_evictions_total", value=borradas)
+        return borradas
+
+
+class CachingProvider:
+    """Proveedor con caché en disco; lo que no toca bytes pasa directo al envuelto."""
+
+    def __init__(self, inner, cache: DiskCache, logger=None):
+        self._inner = inner
+        self.cache = cache
+        self._logger = logger
+
+    def __getattr__(self, attr):
+        return getattr(self._inner, attr)
+
+    def _guardar(self, key: str, fh) -> None:
+        # la caché nunca tumba una subida que ya llegó al proveedor
+        try:
+            self.cache.put_stream(key, fh)
+        except OSError as e:
+            if self._logger:
+                self._logger.warning("Caché de comprobantes: no se guardó %s: %s", key, e)
+
+    def upload(self, filename: str, raw_bytes: bytes) -> str:
+        name = self._inner.upload(filename, raw_bytes)
+        self._guardar(name, io.BytesIO(raw_bytes))
+        return name
+
+    def put(self, storage_path: str, data) -> None:
+        self._inner.put(storage_path, data)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self._guardar(storage_path, io.BytesIO(data))
+            return
+        # archivo (p.ej. el del spool): se relee desde disco; otros streams ya
+        # se consumieron y la copia llega con la primera descarga
+        src = getattr(data, "name", None)
+        if isinstance(src, str) and os.path.isfile(src):
+            with open(src, "rb") as fh:
+                self._guardar(storage_path, fh)
+
+    def local_copy(self, storage_path: str, **esperado) -> str:
+        """
+        Ruta de la copia en disco; en fallo la descarga del proveedor una sola
+        vez. `esperado` (size/sha256/content_hash, ver esperado()) la verifica.
+        """
+        path = self.cache.path(storage_path, **esperado)
+        if path is None:
+            path = self.cache.fill(storage_path, lambda out: self._inner.download(storage_path, out),
+                                   **esperado)
+        return path
+
+    def download(self, storage_path: str, fh) -> None:
+        path = self.cache.path(storage_path)
+        if path is None:
+            try:
+                path = self.cache.fill(storage_path, lambda out: self._inner.download(storage_path, out))
+            except FileNotFoundError:
+                raise  # no existe en el proveedor
+            except OSError as e:
+                # disco lleno o sin permisos: se sirve directo del proveedor
+                if self._logger:
+                    self._logger.warning("Caché de comprobantes: %s: %s", storage_path, e)
+                return self._inner.download(storage_path, fh)
+        try:
+            with open(path, "rb") as src:
+                shutil.copyfileobj(src, fh, CHUNK_SIZE)
+        except FileNotFoundError:
+            self._inner.download(storage_path, fh)  # otro worker la podó entre medio
+
+    def delete(self, storage_path: str) -> None:
+        self._inner.delete(storage_path)
+        self.cache.discard(storage_path)
+
+
+def envolver(provider, app):
+    """`provider` con caché si STORAGE_CACHE_MAX_MB > 0 (ver base._build_provider)."""
+    if not activa(app):
+        return provider
+    cache = DiskCache(app.config["STORAGE_CACHE_DIR"], app.config["STORAGE_CACHE_MAX_MB"] * 1024 * 1024)
+    return CachingProvider(provider, cache, app.logger)
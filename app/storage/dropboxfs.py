@@ -1,15 +1,33 @@
 # app/storage/dropboxfs.py
-import os
-import uuid
+import threading
+from flask import current_app
 from dropbox.exceptions import ApiError, AuthError, BadInputError
 from dropbox import files
 from app.extensions import get_dropbox
+from .base import make_storage_name
 
 class Provider:
+    """
+    Una instancia por app (ver storage.base.get_storage), compartida entre hilos.
+    """
     def __init__(self, app=None):
-        # Inicializa el cliente Dropbox usando refresh token
-        self.dbx = get_dropbox()
+        # Cliente Dropbox compartido (pool HTTP + refresh token)
+        self._dbx = get_dropbox(app or current_app)
+        self._token_lock = threading.Lock()
         self.base_dir = "/comprobantes"
+        self.chunk_size = (app or current_app).config.get("DROPBOX_CHUNK_SIZE", 4 * 1024 * 1024)
+
+    @property
+    def dbx(self):
+        # El refresh se serializa: sólo un hilo canjea el refresh token cuando
+        # el access token está por expirar; el resto reutiliza el cacheado.
+        with self._token_lock:
+            self._dbx.check_and_refresh_access_token()
+        return self._dbx
+
+    def warm(self) -> None:
+        """Canjea el refresh token (abre la conexión TLS del pool)."""
+        self.dbx
 
     def _norm_path(self, storage_path: str) -> str:
         if not storage_path:
@@ -17,18 +35,47 @@ class Provider:
         return storage_path if storage_path.startswith("/") else f"{self.base_dir}/{storage_path}"
 
     def upload(self, filename: str, raw_bytes: bytes) -> str:
-        ext = os.path.splitext(filename)[1] or ".bin"
-        name = f"{uuid.uuid4()}{ext}"
-        path = self._norm_path(name)
+        name = make_storage_name(filename)
+        self.put(name, raw_bytes)
+        return name
+
+    def put(self, storage_path: str, data) -> None:
+        """
+        Sube a una clave ya decidida (la usa la cola de subidas).
+        `data`: bytes, o un archivo abierto que se sube por trozos con la API de
+        upload sessions si pasa de DROPBOX_CHUNK_SIZE.
+        """
+        path = self._norm_path(storage_path)
         try:
-            self.dbx.files_upload(raw_bytes, path, mode=files.WriteMode.overwrite)
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                self.dbx.files_upload(bytes(data), path, mode=files.WriteMode.overwrite)
+            else:
+                self._put_stream(data, path)
         except BadInputError as e:
             raise RuntimeError("Dropbox: falta scope 'files.content.write'.") from e
         except AuthError as e:
             raise RuntimeError("Dropbox: refresh token inválido o credenciales incorrectas.") from e
         except ApiError as e:
             raise RuntimeError(f"Dropbox upload error: {str(e)}") from e
-        return name
+
+    def _put_stream(self, fh, path: str) -> None:
+        size = self.chunk_size
+        chunk = fh.read(size)
+        nxt = fh.read(size) if len(chunk) == size else b""
+        if not nxt:
+            self.dbx.files_upload(chunk, path, mode=files.WriteMode.overwrite)
+            return
+
+        # upload session: start + append* + finish (el último trozo va en finish)
+        start = self.dbx.files_upload_session_start(chunk)
+        cursor = files.UploadSessionCursor(session_id=start.session_id, offset=len(chunk))
+        chunk = nxt
+        while nxt := fh.read(size):
+            self.dbx.files_upload_session_append_v2(chunk, cursor)
+            cursor.offset += len(chunk)
+            chunk = nxt
+        commit = files.CommitInfo(path=path, mode=files.WriteMode.overwrite)
+        self.dbx.files_upload_session_finish(chunk, cursor, commit)
 
     def get_shared_link(self, storage_path: str) -> str:
         path = self._norm_path(storage_path)
@@ -52,6 +99,64 @@ class Provider:
                 raise FileNotFoundError("Archivo eliminado/no encontrado en Dropbox") from e
             raise RuntimeError(f"Dropbox API error al obtener link temporal: {str(e)}") from e
 
+    def download(self, storage_path: str, fh) -> None:
+        """Escribe el contenido en `fh` por trozos (sin cargarlo completo)."""
+        path = self._norm_path(storage_path)
+        try:
+            _, resp = self.dbx.files_download(path)
+        except ApiError as e:
+            if "not_found" in str(e).lower():
+                raise FileNotFoundError("Archivo eliminado/no encontrado en Dropbox") from e
+            raise RuntimeError(f"Dropbox API error al descargar: {str(e)}") from e
+        with resp:
+            for chunk in resp.iter_content(chunk_size=256 * 1024):
+                fh.write(chunk)
+
+    def list_changes(self, cursor: str | None = None):
+        """
+        Recorre /comprobantes (recursivo) por páginas: genera (entradas, cursor).
+        Sin cursor lista todo; con cursor, sólo lo cambiado desde entonces.
+        Entrada: (storage_path, size, content_hash), o (storage_path, None, None)
+        si se borró. ValueError si Dropbox invalidó el cursor (listar completo).
+        """
+        try:
+            if cursor:
+                res = self.dbx.files_list_folder_continue(cursor)
+            else:
+                res = self.dbx.files_list_folder(self.base_dir, recursive=True, limit=2000)
+        except ApiError as e:
+            err = getattr(e, "error", None)
+            if cursor and getattr(err, "is_reset", lambda: False)():
+                raise ValueError("Dropbox invalidó el cursor de listado") from e
+            if not cursor and "not_found" in str(e).lower():
+                return  # aún no hay carpeta: nada que listar
+            raise RuntimeError(f"Dropbox API error al listar: {str(e)}") from e
+
+        prefix = self.base_dir.rstrip("/") + "/"
+        while True:
+            entries = []
+            for m in res.entries:
+                if not m.path_display.startswith(prefix):
+                    continue
+                key = m.path_display[len(prefix):]
+                if isinstance(m, files.FileMetadata):
+                    entries.append((key, m.size, m.content_hash))
+                elif isinstance(m, files.DeletedMetadata):
+                    entries.append((key, None, None))
+            yield entries, res.cursor
+            if not res.has_more:
+                return
+            res = self.dbx.files_list_folder_continue(res.cursor)
+
+    def delete(self, storage_path: str) -> None:
+        path = self._norm_path(storage_path)
+        try:
+            self.dbx.files_delete_v2(path)
+        except ApiError as e:
+            if "not_found" in str(e).lower():
+                return
+            raise RuntimeError(f"Dropbox API error al borrar: {str(e)}") from e
+
     def stat(self, storage_path: str):
         path = self._norm_path(storage_path)
         return self.dbx.files_get_metadata(path)
@@ -0,0 +1,153 @@
+# app/storage/integridad.py
+"""
+Escáner de integridad: concilia `comprobantes` contra lo que realmente hay en
+el proveedor, sin esperar a que un admin abra un link y reciba not_found.
+
+`flask storage scan` (para cron) lista el proveedor por páginas con
+Provider.list_changes. En Dropbox usa files_list_folder y su
+continuación.
+  - Primera vez (o --full): listado completo. Lo presente queda
+    "operativo" con size y content_hash al día; los operativos que no
+    aparecieron pasan a "faltante" (salvo los que cambiaron después de que
+    empezó el listado: p.ej. una subida que terminó a media corrida).
+  - Después, incremental con el cursor guardado (tabla storage_cursores):
+    sólo se procesan altas/cambios/bajas desde el último scan.
+Las actualizaciones son por lotes (un SELECT con IN por página y UPDATEs por
+PK). Los "pendiente"/"subiendo" no se tocan (los maneja la cola de subidas).
+"""
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import update
+
+from ..extensions import db
+from ..models import Comprobante, StorageCursor
+from . import linkcache
+from .cas import cli
+
+BATCH = 1000
+
+
+def _cursor_name() -> str:
+    return f"{current_app.config.get('STORAGE_PROVIDER', 'dropbox')}:comprobantes"
+
+
+def _load_cursor() -> str | None:
+    row = db.session.get(StorageCursor, _cursor_name())
+    return row.cursor if row else None
+
+
+def _save_cursor(cursor: str | None) -> None:
+    row = db.session.get(StorageCursor, _cursor_name())
+    if row is None:
+        row = StorageCursor(nombre=_cursor_name())
+        db.session.add(row)
+    row.cursor = cursor
+
+
+def _update_by_id(values: list[dict]) -> None:
+    """UPDATE por PK como executemany (un round-trip por lote)."""
+    if values:
+        db.session.execute(update(Comprobante), values)
+
+
+def _marcar_faltantes(rows, stats: Counter) -> None:
+    if not rows:
+        return
+    _update_by_id([{"id": r.id, "storage_status": "faltante", "shared_url": None,
+                    "storage_error": "No se encontró en el proveedor"} for r in rows])
+    for r in rows:
+        linkcache.forget_temp(r)
+    stats["faltantes"] += len(rows)
+
+
+def aplicar_pagina(entries, stats: Counter) -> None:
+    """Concilia una página de (storage_path, size, content_hash|None=borrado)."""
+    if not entries:
+        return
+    por_path = {e[0]: e for e in entries}
+    rows = (db.session.query(Comprobante.id, Comprobante.storage_path, Comprobante.size,
+                             Comprobante.content_hash, Comprobante.storage_status)
+            .filter(Comprobante.storage_path.in_(list(por_path)),
+                    Comprobante.storage_status.notin_(("pendiente", "subiendo")))
+            .all())
+    cambios, faltantes = [], []
+    for r in rows:
+        _, size, content_hash = por_path[r.storage_path]
+        if size is None:
+            if r.storage_status != "faltante":
+                faltantes.append(r)
+            continue
+        if (r.storage_status, r.size, r.content_hash) != ("operativo", size, content_hash):
+            cambios.append({"id": r.id, "storage_status": "operativo", "size": size,
+                            "content_hash": content_hash, "storage_error": None})
+    _update_by_id(cambios)
+    _marcar_faltantes(faltantes, stats)
+    stats["vistos"] += len(entries)
+    stats["actualizados"] += len(cambios)
+
+
+def _marcar_no_vistos(vistos: set, inicio: datetime, stats: Counter) -> None:
+    """
+    Tras un listado completo: operativos que el proveedor no tiene -> faltante.
+    Sólo los que no cambiaron desde `inicio`; lo subido después pudo no salir
+    en el listado.
+    """
+    last_id = 0
+    while True:
+        rows = (db.session.query(Comprobante.id, Comprobante.storage_path)
+                .filter(Comprobante.storage_status == "operativo",
+                        Comprobante.updated_at < inicio,
+                        Comprobante.id > last_id)
+                .order_by(Comprobante.id)
+                .limit(BATCH)
+                .all())
+        if not rows:
+            return
+        last_id = rows[-1].id
+        _marcar_faltantes([r for r in rows if r.storage_path not in vistos], stats)
+
+
+def scan(full: bool = False) -> Counter:
+    """Corre un scan (completo o incremental) y hace commit por página."""
+    from .base import get_storage
+
+    storage = get_storage()
+    cursor = None if full else _load_cursor()
+    stats = Counter(modo="incremental" if cursor else "completo")
+    vistos = set() if cursor is None else None
+    inicio = datetime.utcnow()
+    ultimo = cursor
+    try:
+        for entries, next_cursor in storage.list_changes(cursor):
+            aplicar_pagina(entries, stats)
+            if vistos is not None:
+                vistos.update(e[0] for e in entries if e[1] is not None)
+            else:
+                _save_cursor(next_cursor)  # incremental: se puede reanudar a media corrida
+            ultimo = next_cursor
+            db.session.commit()
+    except ValueError as e:
+        if cursor is None:
+            raise
+        current_app.logger.warning("%s; se hace listado completo.", e)
+        db.session.rollback()
+        return scan(full=True)
+
+    if vistos is not None:
+        _marcar_no_vistos(vistos, inicio, stats)
+        _save_cursor(ultimo)
+        db.session.commit()
+    return stats
+
+
+# ---------------------------- CLI (grupo `flask storage`) ----------------------------
+@cli.command("scan")
+@click.option("--full", is_flag=True, help="Ignora el cursor guardado y lista todo.")
+def scan_cmd(full: bool):
+    """Concilia storage_status/size/content_hash contra el proveedor."""
+    stats = scan(full=full)
+    click.echo(f"OK ({stats['modo']}): {stats['vistos']} entradas, "
+               f"{stats['actualizados']} actualizados, {stats['faltantes']} faltantes.")
@@ -0,0 +1,132 @@
+# app/storage/linkcache.py
+"""
+Resolución cacheada de enlaces a comprobantes.
+
+- Link compartido (permanente): se guarda en Comprobante.shared_url y ya no se
+  vuelve a pedir al proveedor.
+- Link temporal (~4h en Dropbox): se cachea con TTL menor a su expiración en un
+  backend pluggable; por defecto un LRU en memoria del proceso. Con
+  LINK_CACHE_URL=redis://... (y el paquete redis instalado) se comparte entre
+  workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from ..extensions import db
+
+EXT_KEY = "link_cache"
+
+
+class MemoryLRU:
+    """LRU con TTL por entrada; thread-safe."""
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisCache:
+    """Backend compartido entre workers (opcional: requiere `redis`)."""
+
+    def __init__(self, url: str, prefix: str = "multisaldo:link:"):
+        import redis  # type: ignore
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def get(self, key: str) -> str | None:
+        return self._r.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._r.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self._r.delete(self.prefix + key)
+
+
+def init_app(app):
+    url = app.config.get("LINK_CACHE_URL")
+    backend = None
+    if url:
+        try:
+            backend = RedisCache(url)
+        except Exception as e:  # redis no instalado / URL inválida
+            app.logger.warning("LINK_CACHE_URL ignorado (%s); se usa LRU en memoria.", e)
+    app.extensions[EXT_KEY] = backend or MemoryLRU(app.config.get("LINK_CACHE_SIZE", 2048))
+
+
+def get_cache():
+    return current_app.extensions[EXT_KEY]
+
+
+def _temp_key(comp) -> str:
+    return f"tmp:{comp.id}:{comp.storage_path}"
+
+
+def resolve_link(comp, storage) -> str:
+    """
+    URL para abrir el comprobante: shared_url persistido, luego link temporal
+    cacheado y, sólo si no hay nada, llamadas al proveedor.
+    """
+    if comp.shared_url:
+        return comp.shared_url
+
+    cache = get_cache()
+    key = _temp_key(comp)
+    url = cache.get(key)
+    if url:
+        return url
+
+    try:
+        url = storage.get_shared_link(comp.storage_path)  # permanente
+    except Exception:
+        url = storage.get_temporary_link(comp.storage_path)  # temporal
+        cache.set(key, url, current_app.config.get("LINK_CACHE_TEMP_TTL", 13800))
+        return url
+
+    # UPDATE directo: `comp` puede venir fuera de la sesión (dbpool.soltar_conexion)
+    from sqlalchemy import update
+    from sqlalchemy.orm.attributes import set_committed_value
+    from ..models import Comprobante
+
+    db.session.execute(update(Comprobante).where(Comprobante.id == comp.id).values(shared_url=url))
+    db.session.commit()
+    set_committed_value(comp, "shared_url", url)
+    return url
+
+
+def forget(comp) -> None:
+    """Invalida lo cacheado de un comprobante (p.ej. si ya no existe en storage)."""
+    comp.shared_url = None
+    forget_temp(comp)
+
+
+def forget_temp(comp) -> None:
+    """Sólo el link temporal cacheado (`comp` puede ser una fila con id/storage_path)."""
+    get_cache().delete(_temp_key(comp))
@@ -0,0 +1,110 @@
+# app/storage/localfs.py
+"""
+Proveedor de almacenamiento en disco local (STORAGE_PROVIDER=local).
+
+Misma interfaz que dropboxfs.Provider. Las escrituras son atómicas
+(archivo temporal en el mismo directorio + fsync + rename) y se copian por
+trozos; las lecturas las sirve /admin/files/<clave> con send_file (Range,
+ETag y sendfile del kernel vía el file_wrapper de gunicorn).
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import current_app, url_for
+from werkzeug.security import safe_join
+
+from .base import make_storage_name
+
+CHUNK_SIZE = 256 * 1024
+
+
+class Provider:
+    serves_locally = True
+
+    def __init__(self, app=None):
+        app = app or current_app
+        self.base_dir = os.path.abspath(app.config["LOCAL_STORAGE_DIR"])
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def local_path(self, storage_path: str) -> str:
+        if not storage_path:
+            raise ValueError("storage_path vacío")
+        path = safe_join(self.base_dir, storage_path.lstrip("/"))
+        if path is None:
+            raise ValueError(f"storage_path inválido: {storage_path}")
+        return path
+
+    def upload(self, filename: str, raw_bytes: bytes) -> str:
+        name = make_storage_name(filename)
+        self.put(name, raw_bytes)
+        return name
+
+    def put(self, storage_path: str, data) -> None:
+        """`data`: bytes o un objeto con .read() (se copia por trozos)."""
+        path = self.local_path(storage_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                if isinstance(data, (bytes, bytearray, memoryview)):
+                    fh.write(data)
+                else:
+                    shutil.copyfileobj(data, fh, CHUNK_SIZE)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _url(self, storage_path: str) -> str:
+        if not os.path.exists(self.local_path(storage_path)):
+            raise FileNotFoundError("Archivo eliminado/no encontrado en almacenamiento local")
+        return url_for("admin.storage_file", storage_path=storage_path.lstrip("/"))
+
+    def get_shared_link(self, storage_path: str) -> str:
+        return self._url(storage_path)
+
+    def get_temporary_link(self, storage_path: str) -> str:
+        return self._url(storage_path)
+
+    def download(self, storage_path: str, fh) -> None:
+        with open(self.local_path(storage_path), "rb") as src:
+            shutil.copyfileobj(src, fh, CHUNK_SIZE)
+
+    def list_changes(self, cursor: str | None = None, page_size: int = 2000):
+        """Misma interfaz que dropboxfs; en disco siempre es listado completo (cursor None)."""
+        entries = []
+        for root, _dirs, names in os.walk(self.base_dir):
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+                entries.append((key, os.path.getsize(path), None))
+                if len(entries) >= page_size:
+                    yield entries, None
+                    entries = []
+        yield entries, None
+
+    def delete(self, storage_path: str) -> None:
+        try:
+            os.remove(self.local_path(storage_path))
+        except FileNotFoundError:
+            pass
+
+    def stat(self, storage_path: str):
+        path = self.local_path(storage_path)
+        st = os.stat(path)
+        return SimpleNamespace(
+            name=os.path.basename(path),
+            path_display=storage_path,
+            size=st.st_size,
+            client_modified=datetime.utcfromtimestamp(st.st_mtime),
+        )
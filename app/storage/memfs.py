@@ -0,0 +1,96 @@
+# app/storage/memfs.py
+"""
+Proveedor en memoria (STORAGE_PROVIDER=memory) para benchmarks y pruebas.
+
+Misma interfaz que dropboxfs.Provider, sin red: cada operación duerme
+MEMORY_STORAGE_LATENCY_MS (+ hasta MEMORY_STORAGE_JITTER_MS al azar) para
+simular la latencia del proveedor real. Los objetos viven en un dict del
+proceso; con varios workers cada uno tiene el suyo.
+Los links no verifican que el objeto exista (un benchmark contra un servidor
+aparte siembra la BD pero no la memoria de ese proceso).
+"""
+import random
+import shutil
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+from types import SimpleNamespace
+
+from flask import current_app
+
+from .base import make_storage_name
+
+CHUNK_SIZE = 256 * 1024
+
+
+class Provider:
+    def __init__(self, app=None):
+        app = app or current_app
+        self.latency = app.config.get("MEMORY_STORAGE_LATENCY_MS", 0) / 1000
+        self.jitter = app.config.get("MEMORY_STORAGE_JITTER_MS", 0) / 1000
+        self._lock = threading.Lock()
+        self._objs: dict[str, tuple[bytes, datetime]] = {}
+
+    def _wait(self) -> None:
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def upload(self, filename: str, raw_bytes: bytes) -> str:
+        name = make_storage_name(filename)
+        self.put(name, raw_bytes)
+        return name
+
+    def put(self, storage_path: str, data) -> None:
+        """`data`: bytes o un objeto con .read()."""
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            buf = BytesIO()
+            shutil.copyfileobj(data, buf, CHUNK_SIZE)
+            data = buf.getvalue()
+        self._wait()
+        with self._lock:
+            self._objs[storage_path.lstrip("/")] = (bytes(data), datetime.utcnow())
+
+    def _get(self, storage_path: str) -> tuple[bytes, datetime]:
+        with self._lock:
+            obj = self._objs.get(storage_path.lstrip("/"))
+        if obj is None:
+            raise FileNotFoundError("Archivo eliminado/no encontrado en almacenamiento en memoria")
+        return obj
+
+    def get_shared_link(self, storage_path: str) -> str:
+        self._wait()
+        return f"https://memory.invalid/s/{storage_path.lstrip('/')}"
+
+    def get_temporary_link(self, storage_path: str) -> str:
+        self._wait()
+        return f"https://memory.invalid/t/{storage_path.lstrip('/')}?ts={int(time.time())}"
+
+    def download(self, storage_path: str, fh) -> None:
+        self._wait()
+        fh.write(self._get(storage_path)[0])
+
+    def list_changes(self, cursor: str | None = None, page_size: int = 2000):
+        self._wait()
+        with self._lock:
+            entries = [(k, len(v[0]), None) for k, v in self._objs.items()]
+        for i in range(0, len(entries), page_size):
+            yield entries[i:i + page_size], None
+        if not entries:
+            yield [], None
+
+    def delete(self, storage_path: str) -> None:
+        self._wait()
+        with self._lock:
+            self._objs.pop(storage_path.lstrip("/"), None)
+
+    def stat(self, storage_path: str):
+        self._wait()
+        data, modified = self._get(storage_path)
+        return SimpleNamespace(
+            name=storage_path.rsplit("/", 1)[-1],
+            path_display=storage_path,
+            size=len(data),
+            client_modified=modified,
+        )
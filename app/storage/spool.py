@@ -0,0 +1,396 @@
+# app/storage/spool.py
+"""
+Cola de subidas de comprobantes.
+
+El registro escribe los bytes en un spool local y confirma el Comprobante con
+storage_status="pendiente"; un pool de hilos los sube después al proveedor
+(get_storage) con reintentos y backoff exponencial:
+  pendiente -> subiendo   (reclamado con un UPDATE condicional: un solo hilo,
+                           worker o `flask uploads drain` lo sube)
+  subiendo  -> operativo  (subido; se borra del spool)
+  subiendo  -> pendiente  (falló; se reintenta)
+  subiendo  -> error      (agotó UPLOAD_MAX_RETRIES; el archivo queda en spool)
+Un "subiendo" cuyo proceso murió vuelve a "pendiente" pasado UPLOAD_CLAIM_TTL.
+
+Las fotos llegan como "<clave>.orig" y el worker las normaliza (app/imagenes.py)
+justo antes de subirlas.
+
+Ojo: en Railway el disco es efímero; lo pendiente al redeploy se pierde si el
+spool no vive en un volumen. `flask uploads status` lo muestra.
+"""
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import update
+
+from ..extensions import db
+
+EXT_KEY = "upload_queue"
+EN_SPOOL = ("pendiente", "subiendo")  # aún no está (completo) en el proveedor
+
+
+def spool_key(comp_uuid, storage_path: str) -> str:
+    """
+    Nombre en el spool: uuid del comprobante + extensión de la clave. No la
+    clave misma: con almacenamiento por contenido dos registros del mismo
+    archivo en vuelo compartirían el archivo y el primero en subir lo borraría.
+    """
+    return f"{comp_uuid}{os.path.splitext(storage_path)[1]}"
+
+
+def spool_key_of(comp) -> str:
+    """spool_key de `comp`; lo encolado antes de nombrar por uuid sigue con su nombre viejo."""
+    key = spool_key(comp.uuid, comp.storage_path)
+    viejo = os.path.basename(comp.storage_path)
+    if (not any(os.path.exists(p) for p in (spool_path(key), original_path(key)))
+            and any(os.path.exists(p) for p in (spool_path(viejo), original_path(viejo)))):
+        return viejo
+    return key
+
+
+def spool_path(key: str, app=None) -> str:
+    app = app or current_app
+    return os.path.join(app.config["UPLOAD_SPOOL_DIR"], os.path.basename(key))
+
+
+# ---------------------------- Recepción por trozos ----------------------------
+RECV_CHUNK = 64 * 1024
+
+# Firmas (magic bytes) de los tipos aceptados
+MAGIC = (
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+
+def detect_mime(head: bytes) -> str | None:
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    return None
+
+
+class Received:
+    """Archivo recibido en el spool (aún sin clave definitiva)."""
+
+    def __init__(self, tmp_path: str, size: int, checksum: str, mime: str):
+        self.tmp_path = tmp_path
+        self.size = size
+        self.checksum = checksum
+        self.mime = mime
+
+    def open(self):
+        return open(self.tmp_path, "rb")
+
+    def discard(self):
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+def receive(stream, max_bytes: int | None = None) -> Received:
+    """
+    Copia `stream` al spool en trozos de RECV_CHUNK: calcula SHA-256 al vuelo,
+    valida la firma (JPG/PNG/PDF) con el primer trozo y corta en cuanto se pasa
+    de `max_bytes`. La memoria usada no depende del tamaño del archivo.
+    ValueError si el archivo no es válido.
+    """
+    max_bytes = max_bytes or current_app.config["UPLOAD_MAX_BYTES"]
+    spool_dir = current_app.config["UPLOAD_SPOOL_DIR"]
+    os.makedirs(spool_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=spool_dir, prefix=".incoming-")
+    sha = hashlib.sha256()
+    size = 0
+    mime = None
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            while chunk := stream.read(RECV_CHUNK):
+                if mime is None:
+                    mime = detect_mime(chunk)
+                    if mime is None:
+                        raise ValueError("El comprobante debe ser JPG, PNG o PDF.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"El comprobante excede {max_bytes // (1024 * 1024)} MB.")
+                sha.update(chunk)
+                fh.write(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        if size == 0:
+            raise ValueError("El comprobante está vacío.")
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return Received(tmp, size, sha.hexdigest(), mime)
+
+
+def original_path(key: str, app=None) -> str:
+    """Original recibido que aún falta normalizar (ver app/imagenes.py)."""
+    return spool_path(key, app) + ".orig"
+
+
+def commit_received(rec: Received, key: str, normalizar: bool = False) -> str:
+    """
+    Renombra el archivo recibido a su ruta de spool definitiva (atómico).
+    Con `normalizar` queda como original pendiente; lo procesa `preparar`.
+    """
+    path = original_path(key) if normalizar else spool_path(key)
+    os.replace(rec.tmp_path, path)
+    return path
+
+
+def preparar(key: str) -> str | None:
+    """
+    Normaliza el original pendiente de `key` (idempotente: si ya se
+    hizo, no hay original). Regresa el mime de lo que quedó en el spool, o
+    None si no había nada que preparar.
+    """
+    from .. import cooperativo, imagenes
+
+    orig = original_path(key)
+    if not os.path.exists(orig):
+        return None
+    path = spool_path(key)
+    if cooperativo.en_hilo(imagenes.normalizar, orig, path):  # CPU: fuera del hub con gevent
+        os.remove(orig)
+        return imagenes.destino()[1]
+    with open(orig, "rb") as fh:
+        mime = detect_mime(fh.read(16))
+    os.replace(orig, path)
+    return mime
+
+
+def write_spool(key: str, raw_bytes: bytes) -> str:
+    """Escritura atómica (tmp + rename) al spool; regresa la ruta final."""
+    path = spool_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(raw_bytes)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def reclamar(comp_id: int) -> bool:
+    """pendiente -> subiendo en un solo UPDATE; False si otro ya lo tiene (o no está pendiente)."""
+    from ..models import Comprobante
+
+    res = db.session.execute(
+        update(Comprobante)
+        .where(Comprobante.id == comp_id, Comprobante.storage_status == "pendiente")
+        .values(storage_status="subiendo"),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def liberar_vencidos() -> int:
+    """"subiendo" de procesos que murieron a media subida -> "pendiente"."""
+    from ..models import Comprobante
+
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config["UPLOAD_CLAIM_TTL"])
+    res = db.session.execute(
+        update(Comprobante)
+        .where(Comprobante.storage_status == "subiendo", Comprobante.updated_at < limite)
+        .values(storage_status="pendiente"),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return res.rowcount
+
+
+def process(comp_id: int) -> str | None:
+    """
+    Sube un comprobante pendiente. Requiere app context.
+    Regresa el estatus resultante (None si no había nada que hacer o si otro
+    hilo/worker ya lo está subiendo).
+    """
+    from ..models import Comprobante
+    from .base import get_storage
+    from .cas import is_stored
+
+    if not reclamar(comp_id):
+        return None
+    comp = db.session.get(Comprobante, comp_id)
+
+    key = spool_key_of(comp)
+    path = spool_path(key)
+    try:
+        # Direccionado por contenido: si otro comprobante ya subió la clave, no se transfiere
+        if not is_stored(comp.storage_path):
+            mime = preparar(key)
+            if mime:
+                comp.mime, comp.size = mime, os.path.getsize(path)
+            with open(path, "rb") as fh:
+                get_storage().put(comp.storage_path, fh)  # por trozos
+    except FileNotFoundError:
+        # Sin archivo en spool: sólo es error si la clave tampoco llegó al proveedor
+        if not is_stored(comp.storage_path):
+            comp.storage_status = "error"
+            comp.storage_error = f"No existe en spool: {path}"
+            db.session.commit()
+            return comp.storage_status
+    except Exception as e:
+        comp.storage_attempts += 1
+        comp.storage_error = str(e)[:1000]
+        if comp.storage_attempts >= current_app.config["UPLOAD_MAX_RETRIES"]:
+            comp.storage_status = "error"
+        else:
+            comp.storage_status = "pendiente"  # lo vuelve a reclamar el reintento
+        db.session.commit()
+        current_app.logger.warning("Subida %s falló (intento %s): %s",
+                                   comp.storage_path, comp.storage_attempts, e)
+        return comp.storage_status
+
+    comp.storage_status = "operativo"
+    comp.storage_error = None
+    db.session.commit()
+    # Miniatura para el grid con el archivo que ya está en disco (sin descargarlo)
+    from .. import miniaturas
+    miniaturas.desde_archivo(path, comp.mime, comp.checksum_sha256)
+    for p in (path, original_path(key)):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+    return comp.storage_status
+
+
+class UploadQueue:
+    """
+    Pool de hilos daemon. Arranca en cada worker de gunicorn al iniciar
+    (post_worker_init -> arrancar) para recuperar lo pendiente aunque nadie
+    registre nada; fuera de gunicorn, con el primer enqueue.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._q: queue.Queue[int] = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(max(1, self.app.config["UPLOAD_WORKERS"])):
+                t = threading.Thread(target=self._run, name=f"upload-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            # Recupera lo que quedó pendiente de un proceso anterior
+            threading.Thread(target=self._recover, name="upload-recover", daemon=True).start()
+
+    def enqueue(self, comp_id: int, delay: float = 0):
+        self._ensure_started()
+        if delay > 0:
+            timer = threading.Timer(delay, self._q.put, args=(comp_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._q.put(comp_id)
+
+    def _recover(self):
+        from ..models import Comprobante
+        with self.app.app_context():
+            liberar_vencidos()
+            ids = [cid for (cid,) in (db.session.query(Comprobante.id)
+                                      .filter(Comprobante.storage_status == "pendiente")
+                                      .order_by(Comprobante.id))]
+        for cid in ids:
+            self._q.put(cid)
+
+    def _run(self):
+        while True:
+            comp_id = self._q.get()
+            try:
+                with self.app.app_context():
+                    status = process(comp_id)
+                    if status == "pendiente":
+                        from ..models import Comprobante
+                        attempts = db.session.get(Comprobante, comp_id).storage_attempts
+                        backoff = self.app.config["UPLOAD_RETRY_BACKOFF"] * (2 ** (attempts - 1))
+                        self.enqueue(comp_id, delay=backoff)
+            except Exception:
+                self.app.logger.exception("upload-worker: error procesando comprobante %s", comp_id)
+            finally:
+                self._q.task_done()
+
+
+def init_app(app):
+    app.extensions[EXT_KEY] = UploadQueue(app)
+    app.cli.add_command(cli)
+
+
+def arrancar(app) -> None:
+    """Arranca los hilos de la cola y la recuperación de pendientes (idempotente)."""
+    app.extensions[EXT_KEY]._ensure_started()
+
+
+def enqueue(comp_id: int):
+    current_app.extensions[EXT_KEY].enqueue(comp_id)
+
+
+# ---------------------------- CLI ----------------------------
+cli = AppGroup("uploads", help="Cola de subidas de comprobantes (spool local).")
+
+
+@cli.command("status")
+@click.option("--limit", default=20, show_default=True, help="Pendientes/errores a listar.")
+def status_cmd(limit: int):
+    """Conteo por storage_status y detalle de pendientes/errores."""
+    from ..models import Comprobante
+    counts = (db.session.query(Comprobante.storage_status, db.func.count())
+              .group_by(Comprobante.storage_status).all())
+    for st, n in counts:
+        click.echo(f"{st:<12} {n}")
+    rows = (Comprobante.query
+            .filter(Comprobante.storage_status.in_(EN_SPOOL + ("error",)))
+            .order_by(Comprobante.id).limit(limit).all())
+    for c in rows:
+        in_spool = "spool" if os.path.exists(spool_path(spool_key_of(c))) else "SIN SPOOL"
+        click.echo(f"#{c.id} {c.storage_status} intentos={c.storage_attempts} "
+                   f"{c.storage_path} [{in_spool}] {c.storage_error or ''}")
+
+
+@cli.command("drain")
+@click.option("--retry-errors", is_flag=True, help="Reintenta también los que están en 'error'.")
+def drain_cmd(retry_errors: bool):
+    """Sube en primer plano todo lo pendiente (con los mismos reintentos y backoff)."""
+    from ..models import Comprobante
+    if retry_errors:
+        (Comprobante.query.filter(Comprobante.storage_status == "error")
+         .update({"storage_status": "pendiente", "storage_attempts": 0}))
+        db.session.commit()
+
+    liberar_vencidos()
+    ids = [cid for (cid,) in (db.session.query(Comprobante.id)
+                              .filter(Comprobante.storage_status == "pendiente")
+                              .order_by(Comprobante.id))]
+    backoff = current_app.config["UPLOAD_RETRY_BACKOFF"]
+    ok = err = 0
+    for cid in ids:
+        attempt = 0
+        while (status := process(cid)) == "pendiente":
+            time.sleep(backoff * (2 ** attempt))
+            attempt += 1
+        if status == "operativo":
+            ok += 1
+        elif status == "error":
+            err += 1
+    click.echo(f"OK: {ok} subidos, {err} con error.")
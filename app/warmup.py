@@ -0,0 +1,182 @@
+# app/warmup.py
+"""
+Arranque pre-calentado (WARMUP=1) y readiness.
+
+Calentar tiene dos partes:
+  - imports pesados (SDK de Dropbox, Pillow, PyMuPDF). Se hacen en create_app
+    y son seguros antes del fork;
+  - conexiones: WARMUP_DB_CONNECTIONS conexiones al pool de Postgres y el
+    cliente de almacenamiento (refresh del token de Dropbox = TLS abierto).
+
+Con `gunicorn --preload`, create_app corre en el master. Ahí se calienta todo
+(y falla rápido si falta config), pero antes de cada fork se sueltan las
+conexiones y el cliente de storage. Cada worker los vuelve a abrir en un hilo
+propio (os.register_at_fork), porque sockets heredados del master no se pueden
+compartir entre procesos.
+
+/readyz responde 200 sólo cuando el proceso que atiende ya está caliente
+(503 mientras tanto). Si el warmup falló (o no se hizo, WARMUP=0), /readyz lo
+reintenta: uno a la vez y no más de una vez cada WARMUP_RETRY_SECONDS, para
+que los probes concurrentes no abran conexiones cada uno. /healthz sigue sin
+tocar nada.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import click
+from flask import jsonify
+from sqlalchemy import text
+
+from .extensions import db
+
+EXT_KEY = "warmup"
+
+
+class Estado:
+    def __init__(self):
+        self.ready = False
+        self.error: str | None = None
+        self.ms: float | None = None
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.intento: float | None = None  # time.monotonic() del último intento
+
+    def as_dict(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "ms": self.ms, "pid": self.pid}
+
+
+def warm_imports(app) -> None:
+    """Importa de antemano lo que el primer request cargaría perezosamente."""
+    if app.config.get("STORAGE_PROVIDER", "dropbox") == "dropbox":
+        from .storage import dropboxfs  # noqa: F401  (SDK de Dropbox)
+    from . import imagenes
+    imagenes._pil()  # Pillow (opcional)
+    try:
+        import pymupdf  # type: ignore  # noqa: F401  (miniaturas de PDF)
+    except ImportError:
+        pass
+
+
+def warm_connections(app) -> None:
+    """Abre conexiones del pool de BD y el cliente de almacenamiento."""
+    from .storage.base import get_storage
+
+    with app.app_context():
+        conns = []
+        try:
+            for _ in range(max(1, app.config.get("WARMUP_DB_CONNECTIONS", 1))):
+                conn = db.engine.connect()
+                conn.execute(text("SELECT 1"))
+                conns.append(conn)
+        finally:
+            for conn in conns:
+                conn.close()  # regresan al pool, abiertas
+        storage = get_storage()
+        if hasattr(storage, "warm"):
+            storage.warm()
+
+
+def _run(app, estado: Estado) -> None:
+    with estado.lock:
+        _calentar(app, estado)
+
+
+def _calentar(app, estado: Estado) -> None:
+    """Un intento de warmup; quien llama tiene estado.lock."""
+    estado.intento = time.monotonic()
+    t0 = time.perf_counter()
+    try:
+        warm_connections(app)
+        estado.error = None
+        estado.ready = True
+    except Exception as e:
+        estado.error = str(e)[:500]
+        app.logger.error("Warmup falló: %s", e)
+    estado.ms = round((time.perf_counter() - t0) * 1000, 1)
+
+
+def reintentar(app, estado: Estado) -> None:
+    """
+    Desde /readyz: reintenta el warmup si el proceso no está caliente. Si ya
+    hay un intento en curso (otro probe o el hilo del worker) no espera, y
+    entre intentos deja pasar WARMUP_RETRY_SECONDS. El primer intento sin
+    WARMUP (estado.intento None) es inmediato.
+    """
+    if estado.ready or not estado.lock.acquire(blocking=False):
+        return
+    try:
+        espera = app.config.get("WARMUP_RETRY_SECONDS", 5)
+        if not estado.ready and (estado.intento is None or time.monotonic() - estado.intento >= espera):
+            _calentar(app, estado)
+    finally:
+        estado.lock.release()
+
+
+def _release(app) -> None:
+    """Antes del fork (en el master): suelta sockets que no deben heredarse."""
+    app.extensions.pop("storage", None)
+    app.extensions.pop("dropbox", None)
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _rewarm_child(app) -> None:
+    """En el worker recién creado: pool propio y warmup en segundo plano."""
+    with app.app_context():
+        db.engine.dispose(close=False)  # no cerrar lo que (aún) use el master
+    estado = app.extensions[EXT_KEY] = Estado()
+    threading.Thread(target=_run, args=(app, estado), name="warmup", daemon=True).start()
+
+
+def init_app(app):
+    estado = app.extensions[EXT_KEY] = Estado()
+    if app.config.get("WARMUP"):
+        warm_imports(app)
+        _run(app, estado)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(before=lambda: _release(app),
+                                after_in_child=lambda: _rewarm_child(app))
+
+    @app.get("/readyz")
+    def readyz():
+        estado = app.extensions[EXT_KEY]
+        if not estado.ready:
+            reintentar(app, estado)  # sin warmup, o el de arranque falló
+        return jsonify(estado.as_dict()), (200 if estado.ready else 503)
+
+    app.cli.add_command(profile_imports_cmd)
+
+
+# ---------------------------- CLI ----------------------------
+@click.command("profile-imports")
+@click.option("--top", default=25, show_default=True, help="Módulos a mostrar.")
+@click.option("--sort", type=click.Choice(["cumulative", "self"]), default="cumulative", show_default=True)
+def profile_imports_cmd(top: int, sort: str):
+    """Perfil de imports de create_app() (python -X importtime) en un proceso limpio."""
+    code = "from app import create_app; create_app()"
+    env = dict(os.environ, WARMUP="0")  # sólo imports, sin conexiones
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env, cwd=root)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(self_us), int(cum_us), name.rstrip()))
+        except ValueError:
+            continue
+    if proc.returncode != 0:
+        raise click.ClickException(proc.stderr.strip().splitlines()[-1] if proc.stderr else "create_app falló")
+
+    # los de primer nivel (sin sangría) suman el total
+    total = sum(cum for _, cum, name in rows if not name.startswith("  "))
+    key = 1 if sort == "cumulative" else 0
+    click.echo(f"{'self ms':>9} {'cum ms':>9}  módulo")
+    for self_us, cum_us, name in sorted(rows, key=lambda r: r[key], reverse=True)[:top]:
+        click.echo(f"{self_us / 1000:9.1f} {cum_us / 1000:9.1f}  {name.strip()}")
+    click.echo(f"Total imports: {total / 1000:.1f} ms en {len(rows)} módulos.")
@@ -0,0 +1,516 @@
+# bench/run.py
+"""
+Benchmark de carga reproducible.
+
+Arranca create_app() contra una BD local (SQLite por omisión, o Postgres con
+--db), la siembra con depósitos/comprobantes/opciones de factura y sustituye
+Dropbox por el proveedor en memoria (app/storage/memfs.py) con latencia
+inyectable. Luego N hilos mezclan registros, consultas del grid, ediciones y
+links durante --duration segundos y se reporta, por operación y en total:
+p50/p95/p99, throughput, consultas SQL por request (del header
+Server-Timing; en el grid, que responde en streaming, sólo cuentan las
+previas al primer byte) y RSS pico. El resultado es JSON (--out) para comparar
+corridas; --compare muestra el cambio contra una corrida anterior.
+
+    python bench/run.py --rows 20000 --concurrency 16 --duration 30 --out bench.json
+    python bench/run.py --latency-ms 250 --jitter-ms 100 --compare bench.json
+
+Con --url se ataca un servidor ya levantado (p.ej. gunicorn con
+STORAGE_PROVIDER=memory y la misma DATABASE_URL que --db); --server-pid
+permite leer su RSS pico. La siembra BORRA las tablas: sólo se permite con
+SQLite o Postgres en localhost salvo --force-seed. Para Postgres local sin
+TLS agrega ?sslmode=disable a la URL.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from urllib.parse import urlencode, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPS = ("registro", "grid", "update", "link")
+DEFAULT_MIX = "registro=2,grid=5,update=2,link=1"
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark de carga de registro/grid/links.")
+    p.add_argument("--db", default=None,
+                   help="URL de BD (default: SQLite temporal). Se siembra salvo --no-seed.")
+    p.add_argument("--url", default=None, help="Servidor ya levantado (default: en proceso).")
+    p.add_argument("--server-pid", type=int, default=None, help="PID del servidor para RSS pico (con --url).")
+    p.add_argument("--rows", type=int, default=10000, help="Depósitos sembrados.")
+    p.add_argument("--factura-users", type=int, default=500, help="Usuarios con opciones de factura.")
+    p.add_argument("--no-seed", action="store_true", help="Usa los datos que ya tiene la BD.")
+    p.add_argument("--force-seed", action="store_true", help="Permite sembrar una BD que no es local.")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--duration", type=float, default=20.0, help="Segundos medidos.")
+    p.add_argument("--warmup", type=float, default=2.0, help="Segundos iniciales que no se miden.")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"Pesos por operación (default: {DEFAULT_MIX}).")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="Latencia del proveedor simulado.")
+    p.add_argument("--jitter-ms", type=float, default=20.0, help="Jitter aleatorio extra.")
+    p.add_argument("--upload-kb", type=int, default=200, help="Tamaño del comprobante subido.")
+    p.add_argument("--sync-uploads", action="store_true", help="UPLOAD_ASYNC=0 (sube dentro del request).")
+    p.add_argument("--seed", type=int, default=1, help="Semilla de datos y de la mezcla.")
+    p.add_argument("--out", default=None, help="Archivo JSON de salida (default: stdout).")
+    p.add_argument("--compare", default=None, help="JSON de una corrida anterior.")
+    p.add_argument("--max-regression", type=float, default=None,
+                   help="Con --compare: sale con código 1 si algún p95 empeora más de este %%.")
+    return p.parse_args(argv)
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise SystemExit(f"--mix: operación desconocida {name!r} (válidas: {', '.join(OPS)})")
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def _db_is_local(url: str) -> bool:
+    if url.startswith("sqlite"):
+        return True
+    return urlparse(url).hostname in ("localhost", "127.0.0.1", "::1")
+
+
+def configure_env(args, workdir: str) -> None:
+    """La config se lee del entorno al importar app.config: esto va antes."""
+    os.environ.update(
+        DATABASE_URL=args.db,
+        STORAGE_PROVIDER="memory",
+        MEMORY_STORAGE_LATENCY_MS=str(args.latency_ms),
+        MEMORY_STORAGE_JITTER_MS=str(args.jitter_ms),
+        METRICS_SERVER_TIMING="1",
+        UPLOAD_ASYNC="0" if args.sync_uploads else "1",
+        UPLOAD_SPOOL_DIR=os.path.join(workdir, "spool"),
+        THUMB_DIR=os.path.join(workdir, "miniaturas"),
+        STORAGE_CACHE_DIR=os.path.join(workdir, "cache-comprobantes"),
+        WARMUP="0",
+        ADMIN_USER=BENCH_USER,
+        ADMIN_PASSWORD=BENCH_PASSWORD,
+    )
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+
+# ---------------------------- Siembra ----------------------------
+def seed(app, args) -> dict:
+    from sqlalchemy import insert
+
+    from app import resumen
+    from app.extensions import db
+    from app.models import BANCOS, FORMAS, PRODUCTOS, Comprobante, Deposito, FacturaOpcion
+
+    rnd = random.Random(args.seed)
+    batch = 2000
+    hoy = date.today()
+    t0 = time.perf_counter()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        usuarios = rnd.sample(range(10000, 100000), args.factura_users)
+        opciones = []
+        for nu in usuarios:
+            for k in range(rnd.randint(1, 3)):
+                opciones.append({"numero_usuario": nu, "titulo": f"Razón social {nu}-{k}",
+                                 "rfc": f"XAXX{nu:06d}{k:03d}"[:13], "email": f"u{nu}@example.com"})
+        db.session.execute(insert(FacturaOpcion), opciones)
+        opcion_ids = {}
+        for oid, nu in db.session.query(FacturaOpcion.id, FacturaOpcion.numero_usuario):
+            opcion_ids.setdefault(nu, oid)
+
+        for start in range(0, args.rows, batch):
+            n = min(batch, args.rows - start)
+            comps = []
+            for i in range(start, start + n):
+                checksum = uuid.UUID(int=rnd.getrandbits(128)).hex * 2
+                comps.append({"uuid": uuid.uuid4(), "file_name": f"comprobante-{i}.pdf",
+                              "mime": "application/pdf", "size": 1024 * args.upload_kb,
+                              "checksum_sha256": checksum, "storage_status": "operativo",
+                              "storage_path": f"sha256/{checksum[:2]}/{checksum}.pdf"})
+            db.session.execute(insert(Comprobante), comps)
+            first_id = start + 1  # tablas recién creadas: ids consecutivos
+            deps = []
+            for j in range(n):
+                banco, forma = rnd.choice(BANCOS), rnd.choice(FORMAS)
+                nu = rnd.choice(usuarios) if rnd.random() < 0.3 else rnd.randint(10000, 99999)
+                factura = nu in opcion_ids and rnd.random() < 0.5
+                dep = {"banco": banco, "forma_pago": forma, "producto": rnd.choice(PRODUCTOS),
+                       "fecha_operacion": hoy - timedelta(days=rnd.randint(0, 365)),
+                       "numero_usuario": nu,
+                       "importe": Decimal(rnd.randint(100, 500000)) / 100,
+                       "requiere_factura": factura,
+                       "factura_opcion_id": opcion_ids[nu] if factura else None,
+                       "comprobante_id": first_id + j, "estatus": "registrado",
+                       "bbva_tipo": None, "folio": None, "autorizacion": None, "referencia": None}
+                if banco == "BBVA" and forma == "Deposito":
+                    dep.update(bbva_tipo="practicaja", folio=f"{rnd.randint(0, 9999):04d}",
+                               autorizacion=f"{rnd.randint(0, 999999):06d}")
+                else:
+                    dep["referencia"] = f"REF{rnd.getrandbits(40):012d}"
+                deps.append(dep)
+            db.session.execute(insert(Deposito), deps)
+        resumen.rebuild()
+        db.session.commit()
+    return {"rows": args.rows, "factura_opciones": len(opciones),
+            "seconds": round(time.perf_counter() - t0, 2)}
+
+
+# ---------------------------- Clientes ----------------------------
+class InProcessClient:
+    """Flask test client: mide la app (WSGI) sin red ni servidor."""
+
+    def __init__(self, app):
+        self.c = app.test_client()
+
+    def request(self, method, path, form=None, file=None, json_body=None):
+        data = dict(form or {})
+        if file is not None:
+            data[file[0]] = (BytesIO(file[2]), file[1])
+        resp = self.c.open(path, method=method, data=data or None, json=json_body,
+                           content_type="multipart/form-data" if file else None)
+        try:
+            body = resp.get_data()
+        finally:
+            resp.close()  # cierra el stream: suelta contexto y conexión de BD
+        return resp.status_code, resp.headers.get("Server-Timing", ""), len(body)
+
+
+class HttpClient:
+    """HTTP real contra --url (cookies de sesión, sin seguir redirects)."""
+
+    def __init__(self, base_url):
+        import http.cookiejar
+        import urllib.request
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *a, **kw):
+                return None
+
+        self.base = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, method, path, form=None, file=None, json_body=None):
+        import urllib.error
+        import urllib.request
+
+        headers, data = {}, None
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif file is not None:
+            boundary = uuid.uuid4().hex
+            parts = []
+            for k, v in (form or {}).items():
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file[0]}"; '
+                         f'filename="{file[1]}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+            parts += [file[2], f"\r\n--{boundary}--\r\n".encode()]
+            data = b"".join(parts)
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        elif form is not None:
+            data = urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        req = urllib.request.Request(self.base + path, data=data, headers=headers, method=method)
+        try:
+            resp = self.opener.open(req, timeout=120)
+        except urllib.error.HTTPError as e:
+            resp = e
+        body = resp.read()
+        return resp.status, resp.headers.get("Server-Timing", ""), len(body)
+
+
+# ---------------------------- Operaciones ----------------------------
+def _pdf(rnd, size: int) -> bytes:
+    """PDF mínimo de una página (las miniaturas lo abren) relleno con comentarios al azar."""
+    head = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+            b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 300 400]>>endobj\n")
+    tail = b"trailer<</Root 1 0 R>>\n%%EOF\n"
+    pad = rnd.randbytes(max(16, (size - len(head) - len(tail)) // 2)).hex().encode()
+    lines = b"\n".join(b"%" + pad[i:i + 78] for i in range(0, len(pad), 78))
+    return head + lines + b"\n" + tail
+
+
+class Workload:
+    def __init__(self, args, rows: int, usuarios: list[int]):
+        self.args = args
+        self.rows = max(1, rows)
+        self.usuarios = usuarios or [12345]
+        self.hoy = date.today()
+
+    def registro(self, client, rnd):
+        from app.models import BANCOS, FORMAS, PRODUCTOS
+
+        nu = rnd.choice(self.usuarios) if rnd.random() < 0.3 else rnd.randint(10000, 99999)
+        form = {"banco": rnd.choice(BANCOS[1:]), "forma_pago": rnd.choice(FORMAS),
+                "producto": rnd.choice(PRODUCTOS), "numero_usuario": str(nu),
+                "fecha_operacion": (self.hoy - timedelta(days=rnd.randint(0, 30))).isoformat(),
+                "importe": f"{rnd.randint(100, 500000) / 100:.2f}",
+                "folio_unico": f"B{rnd.getrandbits(48):015d}", "observaciones": "bench"}
+        # contenido único por request: los duplicados exactos se rechazan
+        pdf = _pdf(rnd, self.args.upload_kb * 1024)
+        return client.request("POST", "/registro", form=form,
+                              file=("comprobante", "bench.pdf", pdf)), (302,)
+
+    def grid(self, client, rnd):
+        from app.models import BANCOS
+
+        params = {"limit": 100}
+        kind = rnd.random()
+        if kind < 0.3:
+            params["banco"] = rnd.choice(BANCOS)
+        elif kind < 0.5:
+            params["numero_usuario"] = str(rnd.choice(self.usuarios))
+        elif kind < 0.7:
+            desde = self.hoy - timedelta(days=rnd.randint(7, 365))
+            params.update(fecha_desde=desde.isoformat(), fecha_hasta=(desde + timedelta(days=7)).isoformat())
+        elif kind < 0.8:
+            params["after_id"] = rnd.randint(1, self.rows)
+        return client.request("GET", "/admin/api/depositos?" + urlencode(params)), (200,)
+
+    def update(self, client, rnd):
+        dep_id = rnd.randint(1, self.rows)
+        if rnd.random() < 0.5:
+            body = {"field": "importe", "value": f"{rnd.randint(100, 500000) / 100:.2f}"}
+        else:
+            body = {"field": "observaciones", "value": f"bench {rnd.getrandbits(32)}"}
+        return client.request("PATCH", f"/admin/api/depositos/{dep_id}", json_body=body), (200,)
+
+    def link(self, client, rnd):
+        return client.request("GET", f"/admin/comprobante/{rnd.randint(1, self.rows)}/link"), (302,)
+
+
+def _server_timing(header: str) -> tuple[int | None, float | None]:
+    """(consultas, ms de BD) del tramo `db` de Server-Timing."""
+    for part in header.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if fields[0] != "db":
+            continue
+        n = dur = None
+        for f in fields[1:]:
+            if f.startswith("dur="):
+                dur = float(f[4:])
+            elif f.startswith('desc="'):
+                n = int(f[6:].split()[0])
+        return n, dur
+    return 0, 0.0
+
+
+def run_load(make_client, workload: Workload, mix: dict, args) -> tuple[list, float]:
+    """Corre la mezcla en `concurrency` hilos; regresa (muestras, segundos medidos)."""
+    names, weights = zip(*mix.items())
+    samples, lock = [], threading.Lock()
+    t_start = time.perf_counter()
+    t_measure = t_start + args.warmup
+    t_end = t_measure + args.duration
+    errores_login = []
+
+    def worker(idx: int):
+        rnd = random.Random(args.seed * 1000 + idx)
+        client = make_client()
+        status, _, _ = client.request("POST", "/admin/login",
+                                      form={"username": BENCH_USER, "password": BENCH_PASSWORD})
+        if status != 302:
+            errores_login.append(status)
+            return
+        local = []
+        while time.perf_counter() < t_end:
+            op = rnd.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                (status, timing, nbytes), ok_codes = getattr(workload, op)(client, rnd)
+                error = None if status in ok_codes else f"HTTP {status}"
+            except Exception as e:  # el benchmark sigue; se cuenta como error
+                status, timing, error = 0, "", f"{type(e).__name__}: {e}"
+            dt = time.perf_counter() - t0
+            if t0 >= t_measure:
+                queries, db_ms = _server_timing(timing)
+                local.append((op, dt, status, error, queries, db_ms))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errores_login:
+        raise SystemExit(f"No se pudo iniciar sesión como admin (HTTP {errores_login[0]}); "
+                         f"¿ADMIN_USER/ADMIN_PASSWORD del servidor = {BENCH_USER}/{BENCH_PASSWORD}?")
+    return samples, args.duration
+
+
+# ---------------------------- Reporte ----------------------------
+def _pct(sorted_vals: list[float], p: float) -> float | None:
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, int(round(p / 100 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def _stats(samples: list, seconds: float) -> dict:
+    lat = sorted(s[1] * 1000 for s in samples)
+    queries = [s[4] for s in samples if s[4] is not None]
+    db_ms = [s[5] for s in samples if s[5] is not None]
+    errors = defaultdict(int)
+    for s in samples:
+        if s[3]:
+            errors[s[3]] += 1
+    r = lambda v: None if v is None else round(v, 2)  # noqa: E731
+    return {
+        "count": len(samples),
+        "errors": sum(errors.values()),
+        "error_kinds": dict(sorted(errors.items(), key=lambda kv: -kv[1])[:5]),
+        "throughput_rps": round(len(samples) / seconds, 2) if seconds else None,
+        "p50_ms": r(_pct(lat, 50)), "p95_ms": r(_pct(lat, 95)), "p99_ms": r(_pct(lat, 99)),
+        "mean_ms": r(sum(lat) / len(lat)) if lat else None,
+        "max_ms": r(lat[-1]) if lat else None,
+        "queries_mean": r(sum(queries) / len(queries)) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "db_ms_mean": r(sum(db_ms) / len(db_ms)) if db_ms else None,
+    }
+
+
+def _peak_rss_mb(pid: int | None = None) -> float | None:
+    """VmHWM de /proc (Linux); sin /proc, ru_maxrss del propio proceso."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is not None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(actual: dict, anterior: dict, max_regression: float | None) -> bool:
+    """Imprime (stderr) el cambio por operación; False si algún p95 empeoró de más."""
+    ok = True
+    print(f"{'op':<10} {'p95 ms':>18} {'rps':>18} {'queries':>14}", file=sys.stderr)
+    for op in ("total",) + OPS:
+        a = actual["total"] if op == "total" else actual["ops"].get(op)
+        b = anterior["total"] if op == "total" else anterior.get("ops", {}).get(op)
+        if not a or not b:
+            continue
+
+        def delta(key):
+            x, y = a.get(key), b.get(key)
+            if x is None or y is None:
+                return "-", None
+            pct = (x - y) / y * 100 if y else 0.0
+            return f"{y:g}->{x:g} ({pct:+.0f}%)", pct
+
+        p95, p95_pct = delta("p95_ms")
+        rps, _ = delta("throughput_rps")
+        qs, _ = delta("queries_mean")
+        print(f"{op:<10} {p95:>18} {rps:>18} {qs:>14}", file=sys.stderr)
+        if max_regression is not None and p95_pct is not None and p95_pct > max_regression:
+            ok = False
+    return ok
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    workdir = tempfile.mkdtemp(prefix="multisaldo-bench-")
+    if args.db is None:
+        args.db = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if not args.no_seed and not args.force_seed and not _db_is_local(args.db):
+        raise SystemExit("La siembra borra las tablas: usa una BD local, --no-seed o --force-seed.")
+    configure_env(args, workdir)
+
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from app.extensions import db
+    from app.models import Deposito, FacturaOpcion
+
+    app = create_app()
+    seeded = None if args.no_seed else seed(app, args)
+    with app.app_context():
+        rows = db.session.query(db.func.max(Deposito.id)).scalar() or 0
+        usuarios = [nu for (nu,) in db.session.query(FacturaOpcion.numero_usuario).distinct().limit(5000)]
+        dialect = db.engine.dialect.name
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+    else:
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+    samples, seconds = run_load(make_client, Workload(args, rows, usuarios), mix, args)
+
+    por_op = defaultdict(list)
+    for s in samples:
+        por_op[s[0]].append(s)
+    result = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "mode": "http" if args.url else "in-process",
+            "db": dialect,
+            "rows": rows,
+            "seeded": seeded,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "storage_latency_ms": args.latency_ms,
+            "storage_jitter_ms": args.jitter_ms,
+            "upload_kb": args.upload_kb,
+            "upload_async": not args.sync_uploads,
+            "seed": args.seed,
+        },
+        "total": _stats(samples, seconds),
+        "ops": {op: _stats(por_op[op], seconds) for op in OPS if op in mix},
+        "peak_rss_mb": _peak_rss_mb(args.server_pid) if args.url else _peak_rss_mb(),
+    }
+    if not args.url:
+        queue = app.extensions.get("upload_queue")
+        result["upload_queue_depth"] = queue._q.qsize() if queue is not None else None
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            if not compare(result, json.load(fh), args.max_regression):
+                print(f"Regresión: p95 empeoró más de {args.max_regression}%.", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+"""
+Config de gunicorn (ver Procfile); todo sale de variables de entorno.
+
+  GUNICORN_WORKER_CLASS=gthread (default): WEB_CONCURRENCY procesos con
+      GUNICORN_THREADS hilos cada uno. Cada request ocupa un hilo mientras
+      espera a Dropbox o a Postgres.
+  GUNICORN_WORKER_CLASS=gevent: cada proceso atiende hasta
+      GUNICORN_WORKER_CONNECTIONS requests a la vez. Las esperas de red ceden
+      (app/cooperativo.py), así que subidas y links lentos no bloquean al
+      resto ni a /healthz. Las consultas siguen limitadas por el pool de BD
+      (DB_POOL_SIZE + DB_MAX_OVERFLOW): los requests esperan su turno hasta
+      DB_POOL_TIMEOUT.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+if worker_class == "gevent" and preload_app:
+    # Con --preload la app se importa en el master: hay que parchar antes,
+    # o sus locks y sockets quedarían sin parchar en los workers.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+
+def post_worker_init(worker):
+    # create_app ya lo hace; aquí por si la app se cargó antes del parche del worker
+    from app import cooperativo
+    from app.storage import spool
+
+    cooperativo.instalar()
+    # Ya en el proceso del worker (después del fork): la cola de subidas
+    # arranca y recupera lo "pendiente" sin esperar al primer registro
+    spool.arrancar(worker.wsgi)
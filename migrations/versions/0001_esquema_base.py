@@ -0,0 +1,112 @@
+"""esquema base
+
+El esquema de los modelos tal como lo creaba `flask initdb` antes de usar
+migraciones. Una BD que ya tiene esas tablas (creada con aquel initdb) se
+adopta tal cual: esta revisión no toca nada y `flask db upgrade` sigue con
+las siguientes.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 01:05:28.048599
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('depositos'):
+        return  # BD creada con el initdb previo a las migraciones
+
+    op.create_table('comprobantes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uuid', sa.UUID(), nullable=False),
+    sa.Column('file_name', sa.String(length=255), nullable=False),
+    sa.Column('mime', sa.String(length=128), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('checksum_sha256', sa.String(length=64), nullable=False),
+    sa.Column('storage_path', sa.String(length=512), nullable=False),
+    sa.Column('storage_status', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('uuid')
+    )
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.create_index('idx_comprobantes_created_at', ['created_at'], unique=False)
+
+    op.create_table('factura_opciones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('numero_usuario', sa.Integer(), nullable=False),
+    sa.Column('titulo', sa.String(length=128), nullable=False),
+    sa.Column('rfc', sa.String(length=13), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('numero_usuario >= 0 AND numero_usuario <= 99999', name='ck_factura_opciones_numero_usuario_5dig'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('factura_opciones', schema=None) as batch_op:
+        batch_op.create_index('idx_factura_opciones_created_at', ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_factura_opciones_numero_usuario'), ['numero_usuario'], unique=False)
+
+    op.create_table('depositos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('banco', sa.String(length=32), nullable=False),
+    sa.Column('forma_pago', sa.String(length=32), nullable=False),
+    sa.Column('producto', sa.String(length=64), nullable=False),
+    sa.Column('fecha_operacion', sa.Date(), nullable=False),
+    sa.Column('numero_usuario', sa.Integer(), nullable=False),
+    sa.Column('importe', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('bbva_tipo', sa.String(length=32), nullable=True),
+    sa.Column('folio', sa.String(length=32), nullable=True),
+    sa.Column('autorizacion', sa.String(length=16), nullable=True),
+    sa.Column('referencia', sa.String(length=64), nullable=True),
+    sa.Column('requiere_factura', sa.Boolean(), nullable=False),
+    sa.Column('factura_opcion_id', sa.Integer(), nullable=True),
+    sa.Column('comprobante_id', sa.Integer(), nullable=False),
+    sa.Column('estatus', sa.String(length=32), nullable=False),
+    sa.Column('observaciones', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('importe > 0', name='ck_depositos_importe_pos'),
+    sa.CheckConstraint('numero_usuario >= 0 AND numero_usuario <= 99999', name='ck_depositos_numero_usuario_5dig'),
+    sa.ForeignKeyConstraint(['comprobante_id'], ['comprobantes.id'], ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['factura_opcion_id'], ['factura_opciones.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.create_index('idx_depositos_banco_forma', ['banco', 'forma_pago'], unique=False)
+        batch_op.create_index('idx_depositos_estado_fecha', ['estatus', 'fecha_operacion'], unique=False)
+        batch_op.create_index(batch_op.f('ix_depositos_comprobante_id'), ['comprobante_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_depositos_factura_opcion_id'), ['factura_opcion_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_depositos_fecha_operacion'), ['fecha_operacion'], unique=False)
+        batch_op.create_index(batch_op.f('ix_depositos_numero_usuario'), ['numero_usuario'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_depositos_numero_usuario'))
+        batch_op.drop_index(batch_op.f('ix_depositos_fecha_operacion'))
+        batch_op.drop_index(batch_op.f('ix_depositos_factura_opcion_id'))
+        batch_op.drop_index(batch_op.f('ix_depositos_comprobante_id'))
+        batch_op.drop_index('idx_depositos_estado_fecha')
+        batch_op.drop_index('idx_depositos_banco_forma')
+
+    op.drop_table('depositos')
+    with op.batch_alter_table('factura_opciones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_factura_opciones_numero_usuario'))
+        batch_op.drop_index('idx_factura_opciones_created_at')
+
+    op.drop_table('factura_opciones')
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_index('idx_comprobantes_created_at')
+
+    op.drop_table('comprobantes')
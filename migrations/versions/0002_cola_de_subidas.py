@@ -0,0 +1,32 @@
+"""cola de subidas: intentos y error por comprobante
+
+storage_status="pendiente" mientras el spool no lo sube (app/storage/spool.py).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 01:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('storage_attempts', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('storage_error', sa.Text(), nullable=True))
+        batch_op.create_index('idx_comprobantes_storage_status', ['storage_status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_index('idx_comprobantes_storage_status')
+        batch_op.drop_column('storage_error')
+        batch_op.drop_column('storage_attempts')
@@ -0,0 +1,26 @@
+"""link compartido persistido del comprobante
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 01:11:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shared_url', sa.String(length=1024), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_column('shared_url')
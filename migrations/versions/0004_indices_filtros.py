@@ -0,0 +1,34 @@
+"""índices de los filtros del grid (app/search.py)
+
+En una tabla grande CREATE INDEX bloquea escrituras mientras corre.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 01:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.create_index('idx_depositos_importe', ['importe'], unique=False)
+        batch_op.create_index('idx_depositos_referencia_prefix', ['referencia'], unique=False,
+                              postgresql_ops={'referencia': 'varchar_pattern_ops'})
+        batch_op.create_index('idx_depositos_folio_prefix', ['folio'], unique=False,
+                              postgresql_ops={'folio': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.drop_index('idx_depositos_folio_prefix', postgresql_ops={'folio': 'varchar_pattern_ops'})
+        batch_op.drop_index('idx_depositos_referencia_prefix', postgresql_ops={'referencia': 'varchar_pattern_ops'})
+        batch_op.drop_index('idx_depositos_importe')
@@ -0,0 +1,45 @@
+"""resumen_diario materializado (app/resumen.py)
+
+Se llena con el mismo agregado que `flask resumen rebuild`; de ahí en
+adelante la app lo mantiene incrementalmente.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 01:13:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('SET LOCAL statement_timeout = 0')  # el agregado recorre todo depositos
+
+    op.create_table('resumen_diario',
+    sa.Column('fecha_operacion', sa.Date(), nullable=False),
+    sa.Column('banco', sa.String(length=32), nullable=False),
+    sa.Column('forma_pago', sa.String(length=32), nullable=False),
+    sa.Column('producto', sa.String(length=64), nullable=False),
+    sa.Column('estatus', sa.String(length=32), nullable=False),
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.Column('total_importe', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('fecha_operacion', 'banco', 'forma_pago', 'producto', 'estatus')
+    )
+    op.execute(
+        'INSERT INTO resumen_diario '
+        '(fecha_operacion, banco, forma_pago, producto, estatus, n, total_importe) '
+        'SELECT fecha_operacion, banco, forma_pago, producto, estatus, count(id), coalesce(sum(importe), 0) '
+        'FROM depositos GROUP BY fecha_operacion, banco, forma_pago, producto, estatus'
+    )
+
+
+def downgrade():
+    op.drop_table('resumen_diario')
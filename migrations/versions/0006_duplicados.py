@@ -0,0 +1,44 @@
+"""detección de duplicados al registrar (app/duplicados.py)
+
+La FK duplicado_de_id -> depositos.id sólo se crea en Postgres; la quita la
+0010 al particionar (en SQLite la columna queda sin FK, como en el modelo).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 01:14:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.create_index('idx_comprobantes_checksum', ['checksum_sha256'], unique=False)
+
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duplicado_de_id', sa.Integer(), nullable=True))
+        batch_op.create_index('idx_depositos_banco_folio_aut', ['banco', 'folio', 'autorizacion'], unique=False)
+        batch_op.create_index('idx_depositos_banco_ref_fecha', ['banco', 'referencia', 'fecha_operacion'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_foreign_key('depositos_duplicado_de_id_fkey', 'depositos', 'depositos',
+                              ['duplicado_de_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('depositos_duplicado_de_id_fkey', 'depositos', type_='foreignkey')
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.drop_index('idx_depositos_banco_ref_fecha')
+        batch_op.drop_index('idx_depositos_banco_folio_aut')
+        batch_op.drop_column('duplicado_de_id')
+
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_index('idx_comprobantes_checksum')
@@ -0,0 +1,26 @@
+"""conteo de referencias por storage_path (almacenamiento por contenido)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 01:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.create_index('idx_comprobantes_storage_path', ['storage_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_index('idx_comprobantes_storage_path')
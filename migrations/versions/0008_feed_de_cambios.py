@@ -0,0 +1,39 @@
+"""feed de cambios del grid: índice por updated_at y lápidas (app/cambios.py)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 01:16:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.create_index('idx_depositos_updated_at', ['updated_at'], unique=False)
+
+    op.create_table('depositos_borrados',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('deposito_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('depositos_borrados', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_depositos_borrados_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('depositos_borrados', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_depositos_borrados_deleted_at'))
+
+    op.drop_table('depositos_borrados')
+    with op.batch_alter_table('depositos', schema=None) as batch_op:
+        batch_op.drop_index('idx_depositos_updated_at')
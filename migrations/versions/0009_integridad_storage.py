@@ -0,0 +1,34 @@
+"""escáner de integridad: content_hash y cursores (app/storage/integridad.py)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 01:17:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    op.create_table('storage_cursores',
+    sa.Column('nombre', sa.String(length=128), nullable=False),
+    sa.Column('cursor', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('nombre')
+    )
+
+
+def downgrade():
+    op.drop_table('storage_cursores')
+    with op.batch_alter_table('comprobantes', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,128 @@
+"""depositos particionado por mes + esquema archivo
+
+Sólo Postgres (en SQLite la tabla queda igual):
+  - `depositos` pasa a PARTITION BY RANGE (fecha_operacion), una partición por
+    mes (depositos_pAAAA_MM) desde el primer mes con datos hasta 3 meses
+    adelante, más depositos_pdefault para fechas fuera de rango;
+  - la PK es (id, fecha_operacion): Postgres exige la llave de partición en
+    índices únicos. Por lo mismo se quita la FK duplicado_de_id -> depositos.id
+    (la app limpia esas referencias al borrar, ver duplicados.soltar);
+  - `archivo.depositos`: padre particionado (vacío) al que `flask particiones
+    archivar` mueve los meses cerrados.
+La copia (INSERT ... SELECT) bloquea depositos mientras corre.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 01:20:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+MESES_ADELANTE = 3
+
+# (nombre, columnas, postgresql_ops) — los mismos de models.Deposito
+INDICES = [
+    ('idx_depositos_banco_folio_aut', ['banco', 'folio', 'autorizacion'], None),
+    ('idx_depositos_banco_forma', ['banco', 'forma_pago'], None),
+    ('idx_depositos_banco_ref_fecha', ['banco', 'referencia', 'fecha_operacion'], None),
+    ('idx_depositos_estado_fecha', ['estatus', 'fecha_operacion'], None),
+    ('idx_depositos_folio_prefix', ['folio'], {'folio': 'varchar_pattern_ops'}),
+    ('idx_depositos_importe', ['importe'], None),
+    ('idx_depositos_referencia_prefix', ['referencia'], {'referencia': 'varchar_pattern_ops'}),
+    ('idx_depositos_updated_at', ['updated_at'], None),
+    ('ix_depositos_comprobante_id', ['comprobante_id'], None),
+    ('ix_depositos_factura_opcion_id', ['factura_opcion_id'], None),
+    ('ix_depositos_fecha_operacion', ['fecha_operacion'], None),
+    ('ix_depositos_numero_usuario', ['numero_usuario'], None),
+]
+
+
+def _mes_siguiente(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _crear_indices(schema=None):
+    for nombre, cols, ops in INDICES:
+        op.create_index(nombre, 'depositos', cols, unique=False, schema=schema,
+                        postgresql_ops=ops or {})
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    # La copia recorre toda la tabla: sin el statement_timeout de la app (dbpool)
+    op.execute('SET LOCAL statement_timeout = 0')
+
+    op.execute('ALTER TABLE depositos DROP CONSTRAINT IF EXISTS depositos_duplicado_de_id_fkey')
+    op.execute('ALTER TABLE depositos RENAME TO depositos_plano')
+    op.execute('ALTER SEQUENCE depositos_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE depositos (LIKE depositos_plano INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+               'PARTITION BY RANGE (fecha_operacion)')
+
+    primero = bind.execute(sa.text('SELECT min(fecha_operacion) FROM depositos_plano')).scalar()
+    hoy = date.today().replace(day=1)
+    mes = (primero or hoy).replace(day=1)
+    fin = hoy
+    for _ in range(MESES_ADELANTE):
+        fin = _mes_siguiente(fin)
+    while mes <= fin:
+        sig = _mes_siguiente(mes)
+        op.execute(f"CREATE TABLE depositos_p{mes:%Y_%m} PARTITION OF depositos "
+                   f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{sig.isoformat()}')")
+        mes = sig
+    op.execute('CREATE TABLE depositos_pdefault PARTITION OF depositos DEFAULT')
+
+    op.execute('INSERT INTO depositos SELECT * FROM depositos_plano')
+    op.execute('DROP TABLE depositos_plano')
+    op.execute('ALTER SEQUENCE depositos_id_seq OWNED BY depositos.id')
+
+    op.create_primary_key('depositos_pkey', 'depositos', ['id', 'fecha_operacion'])
+    op.create_foreign_key('depositos_comprobante_id_fkey', 'depositos', 'comprobantes',
+                          ['comprobante_id'], ['id'], ondelete='RESTRICT')
+    op.create_foreign_key('depositos_factura_opcion_id_fkey', 'depositos', 'factura_opciones',
+                          ['factura_opcion_id'], ['id'], ondelete='SET NULL')
+    _crear_indices()
+
+    # Archivo: mismas columnas, índices y PK; las particiones llegan con sus FKs
+    op.execute('CREATE SCHEMA IF NOT EXISTS archivo')
+    op.execute('CREATE TABLE archivo.depositos (LIKE public.depositos INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+               'PARTITION BY RANGE (fecha_operacion)')
+    op.create_primary_key('depositos_pkey', 'depositos', ['id', 'fecha_operacion'], schema='archivo')
+    _crear_indices('archivo')
+    op.execute('ANALYZE depositos')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('SET LOCAL statement_timeout = 0')
+
+    op.execute('CREATE TABLE depositos_plano (LIKE depositos INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    op.execute('INSERT INTO depositos_plano SELECT * FROM depositos '
+               'UNION ALL SELECT * FROM archivo.depositos')
+    op.execute('ALTER SEQUENCE depositos_id_seq OWNED BY NONE')
+    op.execute('DROP TABLE depositos')
+    op.execute('DROP SCHEMA archivo CASCADE')
+    op.execute('ALTER TABLE depositos_plano RENAME TO depositos')
+    op.execute('ALTER SEQUENCE depositos_id_seq OWNED BY depositos.id')
+
+    op.create_primary_key('depositos_pkey', 'depositos', ['id'])
+    op.create_foreign_key('depositos_comprobante_id_fkey', 'depositos', 'comprobantes',
+                          ['comprobante_id'], ['id'], ondelete='RESTRICT')
+    op.create_foreign_key('depositos_factura_opcion_id_fkey', 'depositos', 'factura_opciones',
+                          ['factura_opcion_id'], ['id'], ondelete='SET NULL')
+    op.create_foreign_key('depositos_duplicado_de_id_fkey', 'depositos', 'depositos',
+                          ['duplicado_de_id'], ['id'], ondelete='SET NULL')
+    _crear_indices()
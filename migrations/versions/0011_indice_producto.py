@@ -0,0 +1,41 @@
+"""índice del filtro por producto del grid (app/search.py)
+
+En Postgres se crea en el padre particionado `depositos` (y en cada partición)
+y en `archivo.depositos`; CREATE INDEX bloquea escrituras mientras corre.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 02:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+NOMBRE = 'idx_depositos_producto_fecha'
+COLUMNAS = ['producto', 'fecha_operacion']
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('depositos', schema=None) as batch_op:
+            batch_op.create_index(NOMBRE, COLUMNAS, unique=False)
+        return
+    op.execute('SET LOCAL statement_timeout = 0')
+    op.create_index(NOMBRE, 'depositos', COLUMNAS, unique=False)
+    op.create_index(NOMBRE, 'depositos', COLUMNAS, unique=False, schema='archivo')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('depositos', schema=None) as batch_op:
+            batch_op.drop_index(NOMBRE)
+        return
+    op.drop_index(NOMBRE, table_name='depositos', schema='archivo')
+    op.drop_index(NOMBRE, table_name='depositos')
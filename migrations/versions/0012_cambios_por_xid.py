@@ -0,0 +1,74 @@
+"""feed de cambios ordenado por transacción: cambio_xid (app/cambios.py)
+
+Sólo en Postgres la llena la BD:
+  - depositos.cambio_xid: trigger BEFORE INSERT OR UPDATE con
+    pg_current_xact_id() (en el padre particionado: lo heredan las
+    particiones); archivo.depositos recibe la columna para poder colgarle
+    meses, sin trigger (no se edita);
+  - depositos_borrados.cambio_xid: DEFAULT pg_current_xact_id().
+Las filas existentes quedan en NULL: ya las vio cualquier watermark vigente.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 02:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+XID = 'pg_current_xact_id()::text::bigint'
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('depositos', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('cambio_xid', sa.BigInteger(), nullable=True))
+            batch_op.create_index('idx_depositos_cambio_xid', ['cambio_xid'], unique=False)
+        with op.batch_alter_table('depositos_borrados', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('cambio_xid', sa.BigInteger(), nullable=True))
+            batch_op.create_index(batch_op.f('ix_depositos_borrados_cambio_xid'), ['cambio_xid'], unique=False)
+        return
+
+    op.execute('SET LOCAL statement_timeout = 0')
+    for schema in (None, 'archivo'):
+        op.add_column('depositos', sa.Column('cambio_xid', sa.BigInteger(), nullable=True), schema=schema)
+        op.create_index('idx_depositos_cambio_xid', 'depositos', ['cambio_xid'], unique=False, schema=schema)
+    op.execute(f"""
+        CREATE FUNCTION depositos_cambio_xid() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.cambio_xid := {XID};
+            RETURN NEW;
+        END $$
+    """)
+    op.execute('CREATE TRIGGER trg_depositos_cambio_xid BEFORE INSERT OR UPDATE ON depositos '
+               'FOR EACH ROW EXECUTE FUNCTION depositos_cambio_xid()')
+
+    op.add_column('depositos_borrados', sa.Column('cambio_xid', sa.BigInteger(), nullable=True,
+                                                  server_default=sa.text(XID)))
+    op.create_index(op.f('ix_depositos_borrados_cambio_xid'), 'depositos_borrados', ['cambio_xid'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('depositos_borrados', schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_depositos_borrados_cambio_xid'))
+            batch_op.drop_column('cambio_xid')
+        with op.batch_alter_table('depositos', schema=None) as batch_op:
+            batch_op.drop_index('idx_depositos_cambio_xid')
+            batch_op.drop_column('cambio_xid')
+        return
+
+    op.drop_index(op.f('ix_depositos_borrados_cambio_xid'), table_name='depositos_borrados')
+    op.drop_column('depositos_borrados', 'cambio_xid')
+    op.execute('DROP TRIGGER trg_depositos_cambio_xid ON depositos')
+    op.execute('DROP FUNCTION depositos_cambio_xid()')
+    for schema in ('archivo', None):
+        op.drop_index('idx_depositos_cambio_xid', table_name='depositos', schema=schema)
+        op.drop_column('depositos', 'cambio_xid', schema=schema)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+import pytest
+
+# Antes de importar la app: Config lee el entorno al importarse. Nunca la BD
+# de DATABASE_URL (los fixtures la borran): SQLite en un directorio temporal.
+_TMP = tempfile.mkdtemp(prefix="multisaldo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["STORAGE_PROVIDER"] = "memory"
+os.environ["UPLOAD_SPOOL_DIR"] = os.path.join(_TMP, "spool")
+os.environ["THUMB_DIR"] = os.path.join(_TMP, "miniaturas")
+os.environ["STORAGE_CACHE_MAX_MB"] = "0"
+os.environ["WARMUP"] = "0"
+
+# Pruebas que sólo valen en Postgres (pg_app). BD desechable: se borra y se
+# migra desde cero (flask db upgrade, con las particiones de 0010).
+PG_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture
+def app():
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_authed"] = True
+    return client
+
+
+@pytest.fixture(scope="session")
+def pg_app():
+    if not PG_URL:
+        pytest.skip("sin TEST_POSTGRES_URL")
+    from flask_migrate import upgrade
+    from sqlalchemy import text
+
+    from app import create_app
+    from app.config import get_config
+    from app.extensions import db
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(get_config(), "SQLALCHEMY_DATABASE_URI", PG_URL)
+        app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA IF EXISTS archivo CASCADE"))
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+        upgrade()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,60 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.extensions import db
+from app.models import Comprobante, Deposito, DepositoBorrado
+
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        comp = Comprobante(file_name="a.pdf", mime="application/pdf", size=9,
+                           checksum_sha256="a" * 64, storage_path="a.pdf")
+        db.session.add(comp)
+        db.session.flush()
+        deps = [Deposito(banco="BBVA", forma_pago="Transferencia", producto="TAE",
+                         fecha_operacion=date(2024, 1, 5), numero_usuario=12345,
+                         importe=Decimal("100.00"), referencia=f"R{i}", comprobante_id=comp.id)
+                for i in range(3)]
+        db.session.add_all(deps)
+        db.session.commit()
+        return [d.id for d in deps]
+
+
+def lapidas():
+    return sorted(i for (i,) in db.session.query(DepositoBorrado.deposito_id))
+
+
+def test_bulk_delete(app, admin_client, ids):
+    r = admin_client.post("/admin/api/depositos/bulk_delete", json={"ids": ids[:2]})
+    assert r.status_code == 200 and r.get_json()["deleted"] == 2
+    with app.app_context():
+        assert [i for (i,) in db.session.query(Deposito.id)] == ids[2:]
+        assert lapidas() == ids[:2]
+
+
+def test_bulk_delete_id_inexistente_no_borra_nada(app, admin_client, ids):
+    r = admin_client.post("/admin/api/depositos/bulk_delete", json={"ids": [ids[0], 999]})
+    assert r.status_code == 404 and r.get_json()["ids"] == [999]
+    with app.app_context():
+        assert db.session.query(Deposito).count() == 3
+        assert lapidas() == []
+
+
+@pytest.mark.parametrize("malo", [1.9, 1.0, True, "1.5", None, [1]])
+def test_ids_no_enteros_son_400(app, admin_client, ids, malo):
+    r = admin_client.post("/admin/api/depositos/bulk_delete", json={"ids": [ids[0], malo]})
+    assert r.status_code == 400
+    r = admin_client.post("/admin/api/depositos/bulk_update",
+                          json={"changes": [{"id": malo, "field": "estatus", "value": "conciliado"}]})
+    assert r.status_code == 400
+    with app.app_context():
+        assert db.session.query(Deposito).count() == 3
+
+
+def test_ids_como_texto(app, admin_client, ids):
+    r = admin_client.post("/admin/api/depositos/bulk_update",
+                          json={"changes": [{"id": str(ids[0]), "field": "estatus", "value": "conciliado"}]})
+    assert r.status_code == 200 and r.get_json()[0]["estatus"] == "conciliado"
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, insert, update
+
+from app import cambios
+from app.extensions import db
+from app.models import Comprobante, Deposito, DepositoBorrado
+
+
+def depositos(n):
+    comp = Comprobante(file_name="a.pdf", mime="application/pdf", size=9,
+                       checksum_sha256="a" * 64, storage_path="a.pdf")
+    db.session.add(comp)
+    db.session.flush()
+    deps = [Deposito(banco="BBVA", forma_pago="Transferencia", producto="TAE",
+                     fecha_operacion=date.today(), numero_usuario=12345,
+                     importe=Decimal("100.00"), referencia=f"R{i}", comprobante_id=comp.id)
+            for i in range(n)]
+    db.session.add_all(deps)
+    db.session.commit()
+    return [d.id for d in deps]
+
+
+@pytest.mark.parametrize("raw, esperado", [
+    ("2024-01-05T10:00:00", cambios.Watermark(datetime(2024, 1, 5, 10), None)),
+    ("2024-01-05T10:00:00Z/812", cambios.Watermark(datetime(2024, 1, 5, 10), 812)),
+])
+def test_parse_since(raw, esperado):
+    assert cambios.parse_since(raw) == esperado
+    assert cambios.parse_since(str(esperado)) == esperado
+
+
+@pytest.mark.parametrize("raw", ["", "ayer", "2024-01-05T10:00:00/-1", "2024-01-05T10:00:00/x"])
+def test_parse_since_invalido(raw):
+    with pytest.raises(ValueError):
+        cambios.parse_since(raw)
+
+
+def test_poll_del_grid(app, admin_client):
+    with app.app_context():
+        ids = depositos(2)
+    wm = admin_client.get("/admin/api/depositos").headers["X-Watermark"]
+    admin_client.patch(f"/admin/api/depositos/{ids[0]}", json={"field": "estatus", "value": "conciliado"})
+    admin_client.delete(f"/admin/api/depositos/{ids[1]}")
+
+    data = admin_client.get("/admin/api/depositos/changes", query_string={"since": wm}).get_json()
+    assert [r["id"] for r in data["rows"]] == [ids[0]]
+    assert data["removed"] == [ids[1]]
+
+
+def test_commit_tardio_no_se_pierde(pg_app):
+    """
+    Una transacción abierta durante un poll hace commit después con un
+    updated_at viejo: el siguiente poll la ve igual (cambio_xid >= xmin).
+    """
+    with pg_app.app_context():
+        editado, borrado = depositos(2)
+        wm0 = cambios.watermark()
+
+        larga = db.engine.connect()
+        tx = larga.begin()
+        larga.execute(update(Deposito).where(Deposito.id == editado)
+                      .values(estatus="conciliado", updated_at=datetime.utcnow() - timedelta(hours=1)))
+        larga.execute(delete(Deposito).where(Deposito.id == borrado))
+        larga.execute(insert(DepositoBorrado).values(deposito_id=borrado,
+                                                     deleted_at=datetime.utcnow() - timedelta(hours=1)))
+
+        wm1 = cambios.watermark()  # el grid toma el watermark antes de consultar
+        res = cambios.delta(db.session.query(Deposito), wm0, {})
+        assert (res["rows"], res["removed"]) == ([], [])
+        db.session.rollback()
+
+        tx.commit()
+        larga.close()
+        res = cambios.delta(db.session.query(Deposito), wm1, {})
+        assert [(d.id, d.estatus) for d in res["rows"]] == [(editado, "conciliado")]
+        assert res["removed"] == [borrado]
@@ -0,0 +1,161 @@
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.conciliacion import _cents, _parse_fecha, emparejar, leer
+
+
+def dep(id, fecha, importe, referencia=None, folio=None, autorizacion=None):
+    return SimpleNamespace(id=id, fecha_operacion=fecha, importe=Decimal(importe),
+                           referencia=referencia, folio=folio, autorizacion=autorizacion)
+
+
+def movs(csv: str):
+    return leer("e.csv", csv.encode()).movimientos
+
+
+# ---------------------------- _cents / _parse_fecha ----------------------------
+@pytest.mark.parametrize("value, esperado", [
+    ("1,234.50", 123450),
+    ("$ 1,234.50", 123450),
+    ("(12.00)", -1200),
+    ("-12", -1200),
+    (100, 10000),
+    (99.99, 9999),
+    (Decimal("0.10"), 10),
+    ("", None),
+    ("   ", None),
+    (None, None),
+])
+def test_cents(value, esperado):
+    assert _cents(value) == esperado
+
+
+def test_cents_invalido():
+    with pytest.raises(ValueError):
+        _cents("doce pesos")
+
+
+@pytest.mark.parametrize("value, esperado", [
+    ("05/01/2024", date(2024, 1, 5)),
+    ("05/01/24", date(2024, 1, 5)),
+    ("2024-01-05", date(2024, 1, 5)),
+    ("2024-01-05T10:30:00", date(2024, 1, 5)),
+    ("05-01-2024 10:30", date(2024, 1, 5)),
+    ("05.01.2024", date(2024, 1, 5)),
+    ("05-ENE-2024", date(2024, 1, 5)),
+    ("5/Dic/23", date(2023, 12, 5)),
+    ("20240105", date(2024, 1, 5)),
+    (date(2024, 1, 5), date(2024, 1, 5)),
+])
+def test_parse_fecha(value, esperado):
+    assert _parse_fecha(value) == esperado
+
+
+@pytest.mark.parametrize("value", ["", "xx/yy", "31/02/2024", "05-XYZ-2024"])
+def test_parse_fecha_invalida(value):
+    with pytest.raises(ValueError):
+        _parse_fecha(value)
+
+
+# ---------------------------- Lectura ----------------------------
+def test_csv_con_preambulo_y_punto_y_coma():
+    lector = leer("estado.csv", (
+        "Cuenta BBVA 0123, Sucursal 45\n"
+        "\n"
+        "Fecha;Concepto;Referencia;Cargo;Abono;Saldo\n"
+        "05/01/2024;DEP EFECTIVO;REF-00123;;1,500.00;9000\n"
+        "06/01/2024;COMISION;;15.00;;8985\n"
+        ";SALDO FINAL;;;;8985\n"
+        "xx/yy;MAL;;;1.00;1\n"
+    ).encode("latin-1"))
+    assert [(m.linea, m.fecha, m.cents) for m in lector.movimientos] == [(4, date(2024, 1, 5), 150000)]
+    m = lector.movimientos[0]
+    assert m.referencia == "REF-00123" and m.concepto == "DEP EFECTIVO"
+    assert m.tokens == {"123", "REF00123"}
+    assert lector.ignorados == 2  # cargo y saldo
+    assert lector.n_errores == 1 and lector.errores == ["línea 7: fecha inválida 'xx/yy'"]
+
+
+def test_csv_sin_encabezado():
+    with pytest.raises(ValueError):
+        leer("e.csv", b"hola\nmundo\n")
+
+
+def test_ofx():
+    lector = leer("e.ofx", (
+        "OFXHEADER:100\n<OFX><BANKTRANLIST>\n"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240105120000<TRNAMT>250.00<FITID>1"
+        "<REFNUM>778899<MEMO>DEP SUC 12\n"
+        "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240106<TRNAMT>-50.00<FITID>2\n"
+        "</BANKTRANLIST></OFX>"
+    ).encode())
+    assert [(m.fecha, m.cents, m.referencia) for m in lector.movimientos] == [(date(2024, 1, 5), 25000, "778899")]
+    assert lector.ignorados == 1
+
+
+def test_ofx_sin_movimientos():
+    with pytest.raises(ValueError):
+        leer("e.ofx", b"<OFX><BANKTRANLIST></BANKTRANLIST></OFX>")
+
+
+# ---------------------------- Emparejamiento ----------------------------
+def test_por_referencia_fecha_mas_cercana():
+    deps = [dep(1, date(2024, 1, 1), "100.00", referencia="555123"),
+            dep(2, date(2024, 1, 4), "100.00", folio="555123"),
+            dep(3, date(2024, 1, 5), "100.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe,Concepto\n05/01/2024,100.00,DEP 555123\n"), deps, ventana=5)
+    assert [(i, metodo) for _, i, metodo in pares] == [(1, "referencia")]
+    assert sugerencias == [] and sin_deposito == []
+
+
+def test_por_referencia_requiere_mismo_importe():
+    deps = [dep(1, date(2024, 1, 5), "100.00", referencia="555123")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe,Referencia\n05/01/2024,100.01,555123\n"), deps, ventana=3)
+    assert pares == [] and sugerencias == [] and len(sin_deposito) == 1
+
+
+def test_por_importe_unico():
+    deps = [dep(1, date(2024, 1, 3), "100.00"), dep(2, date(2024, 1, 5), "200.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe\n05/01/2024,100.00\n05/01/2024,300.00\n"), deps, ventana=3)
+    assert [(i, metodo) for _, i, metodo in pares] == [(0, "importe")]
+    assert sugerencias == []
+    assert [m.cents for m in sin_deposito] == [30000]
+
+
+def test_por_importe_fuera_de_ventana():
+    deps = [dep(1, date(2024, 1, 1), "100.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe\n05/01/2024,100.00\n"), deps, ventana=3)
+    assert pares == [] and sugerencias == [] and len(sin_deposito) == 1
+
+
+def test_por_importe_ambiguo_es_sugerencia():
+    # dos depósitos de $100 el mismo día y un abono "DEP EFECTIVO 100.00": no se adivina
+    deps = [dep(1, date(2024, 1, 5), "100.00"), dep(2, date(2024, 1, 5), "100.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Concepto,Abono\n05/01/2024,DEP EFECTIVO,100.00\n"), deps, ventana=3)
+    assert pares == [] and sin_deposito == []
+    assert [(m.cents, cand) for m, cand in sugerencias] == [(10000, [0, 1])]
+
+
+def test_por_importe_deposito_reclamado_por_dos_abonos():
+    deps = [dep(1, date(2024, 1, 5), "100.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe\n05/01/2024,100.00\n06/01/2024,100.00\n"), deps, ventana=3)
+    assert pares == [] and sin_deposito == []
+    assert [cand for _, cand in sugerencias] == [[0], [0]]
+
+
+def test_referencia_libera_la_ambiguedad():
+    # la pasada 1 toma el depósito con referencia; el otro queda único para la 2
+    deps = [dep(1, date(2024, 1, 5), "100.00", referencia="777001"), dep(2, date(2024, 1, 5), "100.00")]
+    pares, sugerencias, sin_deposito = emparejar(
+        movs("Fecha,Importe,Referencia\n05/01/2024,100.00,777001\n05/01/2024,100.00,\n"), deps, ventana=3)
+    assert sorted((i, metodo) for _, i, metodo in pares) == [(0, "referencia"), (1, "importe")]
+    assert sugerencias == [] and sin_deposito == []
@@ -0,0 +1,47 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app import duplicados, particiones
+from app.extensions import db
+from app.models import Comprobante, Deposito
+
+
+def deposito(fecha, checksum="d" * 64, **kw):
+    comp = Comprobante(file_name="a.pdf", mime="application/pdf", size=9,
+                       checksum_sha256=checksum, storage_path=f"{checksum}.pdf")
+    db.session.add(comp)
+    db.session.flush()
+    dep = Deposito(banco="Banorte", forma_pago="Transferencia", producto="TAE", fecha_operacion=fecha,
+                   numero_usuario=12345, importe=Decimal("100.00"), comprobante_id=comp.id, **kw)
+    db.session.add(dep)
+    db.session.commit()
+    return dep.id
+
+
+def test_por_checksum_y_referencia(app):
+    with app.app_context():
+        fecha = date(2024, 3, 5)
+        primero = deposito(fecha, referencia="R1")
+        deposito(fecha, referencia="R1")
+        assert duplicados.por_checksum("d" * 64) == primero
+        assert duplicados.por_checksum("e" * 64) is None
+        assert duplicados.por_referencia("Banorte", fecha, {"referencia": "R1"}) == primero
+        assert duplicados.por_referencia("Banorte", date(2024, 3, 6), {"referencia": "R1"}) is None
+        assert duplicados.por_referencia("BBVA", fecha, {"referencia": "R1"}) is None
+        assert duplicados.por_referencia("Banorte", fecha, {}) is None
+
+
+def test_duplicado_de_un_mes_archivado(pg_app):
+    mes = date(2023, 2, 1)
+    with pg_app.app_context():
+        db.session.execute(text(f"CREATE TABLE {particiones.nombre(mes)} PARTITION OF depositos "
+                                f"FOR VALUES {particiones._rango(mes)}"))
+        db.session.commit()
+        archivado = deposito(date(2023, 2, 10), checksum="f" * 64, referencia="ARCH-1")
+        particiones.archivar_mes(mes)
+        assert db.session.get(Deposito, archivado) is None  # ya no está en los meses calientes
+
+        assert duplicados.por_checksum("f" * 64) == archivado
+        assert duplicados.por_referencia("Banorte", date(2023, 2, 10), {"referencia": "ARCH-1"}) == archivado
@@ -0,0 +1,7 @@
+from flask_migrate import check
+
+
+def test_modelos_y_migraciones_coinciden(pg_app):
+    # Las particiones mensuales (0010) no cuentan como diferencias
+    with pg_app.app_context():
+        check()  # AutogenerateDiffsDetected si falta una migración
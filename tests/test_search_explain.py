@@ -0,0 +1,26 @@
+"""
+EXPLAIN de cada filtro del grid (search.EXPLAIN_CASES) contra Postgres; en
+SQLite el LIKE de `q` no usa índice, así que sólo cuenta Postgres (pg_app se
+salta sin TEST_POSTGRES_URL).
+"""
+import pytest
+
+from app.search import EXPLAIN_CASES, apply_filters, explain_plan, parse_filters, plan_uses_index
+
+
+def test_casos_cubren_todos_los_filtros():
+    usados = {k for args in EXPLAIN_CASES.values() for k in args}
+    # fecha_hasta/importe_max van en el mismo caso que su par
+    assert usados >= {"numero_usuario", "fecha_desde", "estatus", "importe_min", "q",
+                      "banco", "forma_pago", "producto"}
+
+
+@pytest.mark.parametrize("caso", sorted(EXPLAIN_CASES))
+def test_filtro_usa_indice(pg_app, caso):
+    from app.extensions import db
+    from app.models import Deposito
+
+    with pg_app.app_context():
+        q = apply_filters(db.session.query(Deposito.id), parse_filters(EXPLAIN_CASES[caso]))
+        plan = explain_plan(q)
+        assert plan_uses_index(plan), plan
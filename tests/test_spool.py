@@ -0,0 +1,114 @@
+import io
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import Comprobante
+from app.storage import spool
+from app.storage.base import get_storage
+
+
+def comprobante(storage_path="sha256/ab/abc.pdf", status="pendiente", **kw):
+    comp = Comprobante(file_name="a.pdf", mime="application/pdf", size=9, checksum_sha256="a" * 64,
+                       storage_path=storage_path, storage_status=status, **kw)
+    db.session.add(comp)
+    db.session.commit()
+    return comp
+
+
+def en_proveedor(storage_path) -> bytes:
+    buf = io.BytesIO()
+    get_storage().download(storage_path, buf)
+    return buf.getvalue()
+
+
+def test_process_concurrente_sube_una_vez(app):
+    app.config["MEMORY_STORAGE_LATENCY_MS"] = 100  # ventana amplia entre reclamar y terminar
+    with app.app_context():
+        comp = comprobante()
+        spool.write_spool(spool.spool_key_of(comp), b"%PDF-uno")
+        cid = comp.id
+
+    barrera = threading.Barrier(2)
+    resultados = []
+
+    def subir():
+        with app.app_context():
+            barrera.wait()
+            resultados.append(spool.process(cid))
+
+    hilos = [threading.Thread(target=subir) for _ in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert sorted(resultados, key=str) == [None, "operativo"]
+    with app.app_context():
+        comp = db.session.get(Comprobante, cid)
+        assert (comp.storage_status, comp.storage_error) == ("operativo", None)
+        assert en_proveedor(comp.storage_path) == b"%PDF-uno"
+        assert spool.process(cid) is None  # ya no está pendiente
+
+
+def test_sin_spool_pero_ya_subido_no_es_error(app):
+    with app.app_context():
+        get_storage().put("sha256/ab/abc.pdf", b"%PDF-uno")
+        comprobante(status="operativo")
+        comp = comprobante()  # misma clave; su archivo ya no está en el spool
+        assert spool.process(comp.id) == "operativo"
+        assert db.session.get(Comprobante, comp.id).storage_error is None
+
+
+def test_mismo_archivo_en_vuelo_no_comparte_spool(app):
+    with app.app_context():
+        a, b = comprobante(), comprobante()  # dos envíos idénticos, ambos en la cola
+        spool.write_spool(spool.spool_key_of(a), b"%PDF-uno")
+        spool.write_spool(spool.spool_key_of(b), b"%PDF-uno")
+        assert spool.spool_key_of(a) != spool.spool_key_of(b)
+        assert spool.process(a.id) == "operativo"
+        assert os.path.exists(spool.spool_path(spool.spool_key_of(b)))
+        assert spool.process(b.id) == "operativo"
+        assert not os.listdir(app.config["UPLOAD_SPOOL_DIR"])
+
+
+def test_spool_con_nombre_viejo(app):
+    with app.app_context():
+        comp = comprobante()
+        spool.write_spool(comp.storage_path, b"%PDF-uno")  # encolado antes de nombrar por uuid
+        assert spool.process(comp.id) == "operativo"
+        assert en_proveedor(comp.storage_path) == b"%PDF-uno"
+
+
+def test_sin_spool_ni_proveedor_es_error(app):
+    with app.app_context():
+        comp = comprobante()
+        assert spool.process(comp.id) == "error"
+        assert "No existe en spool" in db.session.get(Comprobante, comp.id).storage_error
+
+
+def test_fallo_regresa_a_pendiente(app, monkeypatch):
+    with app.app_context():
+        comp = comprobante()
+        spool.write_spool(spool.spool_key_of(comp), b"%PDF-uno")
+
+        def falla(*a, **kw):
+            raise OSError("proveedor caído")
+        monkeypatch.setattr(get_storage(), "put", falla)
+        assert spool.process(comp.id) == "pendiente"
+        comp = db.session.get(Comprobante, comp.id)
+        assert (comp.storage_attempts, comp.storage_error) == (1, "proveedor caído")
+        assert os.path.exists(spool.spool_path(spool.spool_key_of(comp)))
+
+
+def test_reclamo_vencido_se_libera(app):
+    with app.app_context():
+        viejo = comprobante(status="subiendo")
+        reciente = comprobante(storage_path="sha256/cd/cde.pdf", status="subiendo")
+        db.session.execute(db.update(Comprobante).where(Comprobante.id == viejo.id)
+                           .values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+        assert spool.liberar_vencidos() == 1
+        assert db.session.get(Comprobante, viejo.id).storage_status == "pendiente"
+        assert db.session.get(Comprobante, reciente.id).storage_status == "subiendo"
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from app import warmup
+
+
+def fallar_warmup(monkeypatch, veces, pausa=0.0):
+    """warm_connections falla las primeras `veces` llamadas; regresa la lista de llamadas."""
+    llamadas = []
+
+    def warm(app):
+        llamadas.append(1)
+        time.sleep(pausa)
+        if len(llamadas) <= veces:
+            raise OSError("BD no disponible")
+    monkeypatch.setattr(warmup, "warm_connections", warm)
+    return llamadas
+
+
+def test_readyz_reintenta_tras_fallo(app, monkeypatch):
+    app.config["WARMUP_RETRY_SECONDS"] = 60
+    llamadas = fallar_warmup(monkeypatch, veces=1)
+    client = app.test_client()
+
+    r = client.get("/readyz")
+    assert r.status_code == 503 and r.get_json()["error"] == "BD no disponible"
+    assert client.get("/readyz").status_code == 503
+    assert len(llamadas) == 1  # dentro del intervalo no se reintenta
+
+    app.config["WARMUP_RETRY_SECONDS"] = 0
+    r = client.get("/readyz")
+    assert r.status_code == 200 and r.get_json()["error"] is None
+    assert client.get("/readyz").status_code == 200
+    assert len(llamadas) == 2
+
+
+def test_readyz_reintenta_con_warmup_de_arranque(app, monkeypatch):
+    # WARMUP=1: el warmup de arranque ya falló; /readyz no debe quedarse en 503
+    app.config.update(WARMUP=True, WARMUP_RETRY_SECONDS=0)
+    llamadas = fallar_warmup(monkeypatch, veces=1)
+    warmup._run(app, app.extensions[warmup.EXT_KEY])
+    assert len(llamadas) == 1
+    assert app.test_client().get("/readyz").status_code == 200
+    assert len(llamadas) == 2
+
+
+def test_readyz_probes_concurrentes_un_intento(app, monkeypatch):
+    app.config["WARMUP_RETRY_SECONDS"] = 0
+    llamadas = fallar_warmup(monkeypatch, veces=100, pausa=0.2)
+    barrera = threading.Barrier(5)
+    codigos = []
+
+    def probe():
+        barrera.wait()
+        codigos.append(app.test_client().get("/readyz").status_code)
+
+    hilos = [threading.Thread(target=probe) for _ in range(5)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert codigos == [503] * 5
+    assert len(llamadas) == 1